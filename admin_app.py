@@ -180,7 +180,8 @@ def upload_all_textbooks(admin, files_config):
             'Subject': str(config['subject']),
             'Language': str(LANGUAGE_OPTIONS[config['language']]['name']),
             'Status': 'Success' if success else 'Failed',
-            'Message': str(message)
+            'Message': str(message),
+            'Throughput': admin.last_ingest_report.summary() if success and admin.last_ingest_report else ''
         })
         
         # Update progress
@@ -204,6 +205,8 @@ def upload_all_textbooks(admin, files_config):
                 st.write(f"**Status:** {row['Status']}")
             with col2:
                 st.write(f"**Details:** {row['Message']}")
+                if row['Throughput']:
+                    st.caption(f"⚡ {row['Throughput']}")
     
     # Summary
     success_count = sum(1 for r in results if r['Status'] == 'Success')
@@ -251,7 +254,8 @@ def upload_with_auto_detection(admin, uploaded_files):
             'Detected Language': str(LANGUAGE_OPTIONS[detected_lang]['name']),
             'Confidence': f"{confidence:.1%}",
             'Status': 'Success' if success else 'Failed',
-            'Message': str(message)
+            'Message': str(message),
+            'Throughput': admin.last_ingest_report.summary() if success and admin.last_ingest_report else ''
         })
         
         progress_bar.progress((i + 1) / len(uploaded_files))
@@ -271,6 +275,8 @@ def upload_with_auto_detection(admin, uploaded_files):
                 st.write(f"**Status:** {result['Status']}")
             with col2:
                 st.write(f"**Details:** {result['Message']}")
+                if result['Throughput']:
+                    st.caption(f"⚡ {result['Throughput']}")
     
     success_count = sum(1 for r in results if r['Status'] == 'Success')
     if success_count == len(results):
@@ -312,6 +318,21 @@ def show_manage_interface(admin):
                         st.markdown(f"**Method:** {'Auto-detected' if info.get('auto_detected', False) else 'Manual'}")
                         st.markdown(f"**Status:** {info['status'].title()}")
                         
+                        # Incremental update - only changed pages are re-embedded
+                        new_edition = st.file_uploader(
+                            "📤 Upload corrected edition",
+                            type="pdf",
+                            key=f"update_file_{subject}",
+                            help="Only pages that changed since the last upload are re-processed"
+                        )
+                        if new_edition is not None and st.button("🔄 Update", key=f"update_{subject}"):
+                            with st.spinner(f"🔄 Updating {subject}..."):
+                                success, message = admin.update_textbook(new_edition, subject)
+                            if success:
+                                st.success(message)
+                            else:
+                                st.error(message)
+                        
                         # Individual remove button with confirmation
                         if st.button(f"🗑️ Remove", key=f"remove_{subject}", type="secondary"):
                             # Use session state to handle confirmation
@@ -400,7 +421,56 @@ def show_settings_interface(admin):
                         st.success("✅ Database reloaded successfully!")
                     except Exception as e:
                         st.error(f"❌ Failed to reload database: {e}")
-        
+            
+            if st.button("🧹 Compact Database", help="Drop deleted/orphaned vectors and reclaim disk space"):
+                with st.spinner("🧹 Compacting database..."):
+                    try:
+                        result = admin.compact_vectorstore()
+                        st.success(f"✅ Removed {result['removed_vectors']} vectors, freed {result['bytes_freed'] / 1024 / 1024:.1f} MB")
+                    except Exception as e:
+                        st.error(f"❌ Compaction failed: {e}")
+
+            layouts = {
+                'global': "Single collection (filter by subject)",
+                'partitioned': "One collection per textbook"
+            }
+            current_layout = admin.vectorstore.layout
+            new_layout = st.selectbox(
+                "🗂️ Storage Layout",
+                list(layouts),
+                index=list(layouts).index(current_layout),
+                format_func=lambda layout: layouts[layout],
+                help="Per-textbook collections keep search fast as the library grows: only the selected subjects are searched"
+            )
+            if new_layout != current_layout and st.button("🔀 Apply Layout", help="Moves existing vectors without re-embedding"):
+                with st.spinner("🔀 Moving vectors..."):
+                    success, message = admin.set_vector_layout(new_layout)
+                    if success:
+                        st.success(message)
+                    else:
+                        st.error(message)
+
+            st.markdown("**📦 Read-only Student Index**")
+            manifest = admin.get_system_stats().get('read_only_index')
+            if manifest:
+                kind = f"IVF ({manifest['nlist']} lists)" if manifest['ivf'] else "flat"
+                st.caption(f"Exported {manifest['count']} vectors as {manifest['dtype']}, {kind} - refreshed automatically when textbooks change")
+            else:
+                st.caption("Not exported - student apps search the Chroma database")
+            export_dtype = st.selectbox(
+                "Vector precision",
+                ['float32', 'float16', 'int8'],
+                help="int8/float16 shrink the index; results are re-ranked with float32 vectors"
+            )
+            export_ivf = st.checkbox("Inverted lists (IVF)", value=False, help="Scan only the nearest clusters - for very large libraries")
+            if st.button("📦 Export Index", help="Memory-mapped index that student apps open without Chroma"):
+                with st.spinner("📦 Exporting index..."):
+                    success, message = admin.export_read_only_index(export_dtype, True if export_ivf else None)
+                    if success:
+                        st.success(message)
+                    else:
+                        st.error(message)
+
         with col2:
             st.warning("⚠️ Danger Zone")
             if st.button("🗑️ Clear All Data", help="This will delete all textbooks and the database"):
@@ -451,6 +521,10 @@ def show_settings_interface(admin):
         else:
             st.error("❌ Ollama Not Running")
             st.markdown("Make sure Ollama is installed and running:\n``````")
+        
+        ollama_stats = stats.get('ollama_stats')
+        if ollama_stats:
+            st.caption(f"🔌 {ollama_stats['host']} | {ollama_stats['requests']} requests, {ollama_stats['avg_latency_ms']} ms avg | {ollama_stats['errors']} errors, {ollama_stats['retries']} retries")
     
     with col2:
         st.markdown("#### 📊 Database Stats")
@@ -460,9 +534,23 @@ def show_settings_interface(admin):
         
         if stats['vectorstore_ready']:
             st.success("✅ Database Ready")
+            st.caption(f"🗂️ Layout: {stats.get('vector_layout', 'global')}")
         else:
             st.error("❌ Database Not Ready")
-    
+        
+        embed_stats = stats.get('embedding_stats')
+        if embed_stats:
+            st.markdown("#### 🧠 Embedding Engine")
+            st.metric("Chunks / sec", embed_stats['chunks_per_sec'])
+            st.caption(f"{embed_stats['chunks_embedded']} chunks embedded | batch {embed_stats['batch_size']} | {embed_stats['threads']} threads")
+            if embed_stats.get('cache'):
+                cache = embed_stats['cache']
+                st.caption(f"💾 Cache: {cache['entries']}/{cache['max_entries']} vectors | hit rate {cache['hit_rate']:.0%}")
+
+        lexical_stats = stats.get('lexical_stats')
+        if lexical_stats:
+            st.caption(f"🔤 Keyword index: {lexical_stats['subjects']} textbooks | {lexical_stats['chunks']} chunks | {lexical_stats['terms']} terms")
+
     # Language breakdown
     if stats['languages']:
         st.markdown("#### 🌍 Languages")
@@ -474,17 +562,11 @@ def clear_all_data(admin):
     """Clear all data (for testing/reset purposes)"""
     with st.spinner("🗑️ Clearing all data..."):
         try:
-            # Clear metadata
-            admin.textbooks = {}
-            admin.save_metadata()
-            
-            # Note: Vector database clearing would need additional implementation
-            st.warning("⚠️ Metadata cleared. Vector database may need manual cleanup.")
-            st.info("🔄 Please restart the application for full cleanup.")
+            result = admin.clear_all_data()
+            st.success(f"✅ Removed {result['removed_vectors']} vectors, freed {result['bytes_freed'] / 1024 / 1024:.1f} MB")
             
         except Exception as e:
             st.error(f"❌ Error clearing data: {e}")
 
-
 if __name__ == "__main__":
     main()
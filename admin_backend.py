@@ -1,20 +1,42 @@
 import os
 import json
 import warnings
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
+import sqlite3
+import time
+import shutil
 from langdetect import detect
 import requests
+from ollama_client import get_client
+from ingestion_pipeline import IngestionPipeline
+from pdf_extraction import PDFExtraction
+from embedding_service import EmbeddingService, EMBEDDING_MODEL, EMBEDDINGS_DIR
+from embedding_cache import EmbeddingCache
+from lexical_index import LexicalIndex
+from vector_store import TextbookVectorStore, VECTORSTORE_DIR, read_layout, write_layout
+from mmap_index import export_index, read_manifest, INDEX_DIR
 
 warnings.filterwarnings('ignore')
 
+
+def directory_size(path):
+    """Total size in bytes of all files under a directory"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
 class AITextbookAdminBackendOffline:
     def __init__(self):
         print("🚀 Initializing Offline Admin Backend...")
         self.textbooks = {}
         self.vectorstore = None
+        self.last_ingest_report = None
+        self.extractions = {}  # Open PDF extractions shared by detection and ingestion
+        self.lexical_index = LexicalIndex()
         self.setup_embeddings_offline()
         self.check_llama_offline()
         self.load_existing_data()
@@ -25,20 +47,19 @@ class AITextbookAdminBackendOffline:
         print("🧠 Setting up offline embeddings...")
         try:
             # Create models directory if it doesn't exist
-            os.makedirs("./models/embeddings", exist_ok=True)
+            os.makedirs(EMBEDDINGS_DIR, exist_ok=True)
             
             # Set offline environment variables
             os.environ['HF_HUB_OFFLINE'] = '1'
             os.environ['TRANSFORMERS_OFFLINE'] = '1'
             
             try:
-                # Try to load in offline mode first
-                self.embeddings = HuggingFaceEmbeddings(
-                    model_name="sentence-transformers/all-MiniLM-L6-v2",
-                    model_kwargs={'device': 'cpu', 'local_files_only': True},
-                    cache_folder="./models/embeddings"
+                # Try to load in offline mode first (batched, multi-threaded engine)
+                self.embeddings = EmbeddingService(
+                    local_files_only=True,
+                    cache=EmbeddingCache(model_name=EMBEDDING_MODEL)  # Re-ingests skip unchanged chunks
                 )
-                print("✅ Offline embeddings loaded from cache!")
+                print(f"✅ Offline embeddings loaded from cache! ({self.embeddings.num_threads} threads, batch {self.embeddings.batch_size})")
                 
             except Exception as offline_error:
                 print(f"⚠️ Offline mode failed: {offline_error}")
@@ -60,26 +81,15 @@ class AITextbookAdminBackendOffline:
     def check_llama_offline(self):
         """Check Ollama availability with offline fallback"""
         print("🤖 Checking local AI availability...")
+        self.model_name = ""
         try:
             # This is localhost communication, not internet
-            response = requests.get("http://localhost:11434/api/tags", timeout=3)
-            if response.status_code == 200:
-                models = response.json().get('models', [])
-                self.llm_available = len(models) > 0
-                if models:
-                    model_names = [model['name'] for model in models]
-                    if any('llama3.2' in name for name in model_names):
-                        self.model_name = "llama3.2"
-                    else:
-                        self.model_name = model_names[0].split(':')[0]
-                    print(f"✅ Local AI ready: {self.model_name}")
-                else:
-                    self.model_name = ""
-                    self.llm_available = False
-                    print("⚠️ Ollama running but no models found")
+            self.model_name = get_client().detect_model()
+            self.llm_available = bool(self.model_name)
+            if self.llm_available:
+                print(f"✅ Local AI ready: {self.model_name}")
             else:
-                self.llm_available = False
-                print("⚠️ Ollama not responding properly")
+                print("⚠️ Ollama running but no models found")
         except requests.exceptions.ConnectionError:
             self.llm_available = False
             print("⚠️ Ollama not running - Admin functions will work without AI")
@@ -96,13 +106,15 @@ class AITextbookAdminBackendOffline:
             print(f"📚 Loaded metadata for {len(self.textbooks)} textbooks")
         
         # Load existing vectorstore (fully offline)
-        if os.path.exists("./ai_tutor_db"):
+        if os.path.exists(VECTORSTORE_DIR):
             try:
-                self.vectorstore = Chroma(
-                    persist_directory="./ai_tutor_db",
-                    embedding_function=self.embeddings
-                )
-                print("✅ Existing vector database loaded!")
+                self.vectorstore = TextbookVectorStore(self.embeddings, subjects=self.textbooks)
+                print(f"✅ Existing vector database loaded! ({self.vectorstore.layout} layout)")
+                
+                # Libraries ingested before keyword search existed get their indexes now
+                for subject_name in self.textbooks:
+                    if subject_name not in self.lexical_index.subjects:
+                        self.rebuild_lexical_index(subject_name)
             except Exception as e:
                 print(f"⚠️ Could not load existing database: {e}")
                 self.vectorstore = None
@@ -115,24 +127,37 @@ class AITextbookAdminBackendOffline:
             json.dump(self.textbooks, f, indent=2, ensure_ascii=False)
         print("💾 Metadata saved locally")
     
-    def detect_pdf_language_offline(self, pdf_file):
+    def open_extraction(self, pdf_file):
+        """Get the (lazy) page extraction for an upload, reusing an open one"""
+        extraction = PDFExtraction(pdf_file)  # Only hashes the upload until pages are read
+        if extraction.digest in self.extractions:
+            return self.extractions[extraction.digest]
+        
+        # Keep only a few uploads parsed at once
+        while len(self.extractions) >= 4:
+            oldest = next(iter(self.extractions))
+            self.extractions.pop(oldest).close()
+        
+        self.extractions[extraction.digest] = extraction
+        return extraction
+    
+    def close_extraction(self, extraction):
+        """Release an extraction once its upload is fully processed"""
+        self.extractions.pop(extraction.digest, None)
+        extraction.close()
+    
+    def detect_pdf_language_offline(self, pdf_file, sample_pages=3):
         """Offline language detection from PDF content"""
-        temp_path = "temp_detect.pdf"
         try:
             print("🔍 Detecting language offline...")
-            # Save file temporarily
-            with open(temp_path, "wb") as f:
-                f.write(pdf_file.getvalue())
-            
-            # Extract text from first few pages (offline)
-            loader = PyPDFLoader(temp_path)
-            pages = loader.load()
+            # Extract text from first few pages only (kept for ingestion)
+            extraction = self.open_extraction(pdf_file)
             
             # Get sample text from first 3 pages
             sample_text = ""
-            for i, page in enumerate(pages[:3]):
-                if len(page.page_content.strip()) > 50:
-                    sample_text += page.page_content[:1000] + " "
+            for page_no, text in extraction.iter_pages(limit=sample_pages):
+                if len(text.strip()) > 50:
+                    sample_text += text[:1000] + " "
                     if len(sample_text) > 2000:
                         break
             
@@ -160,80 +185,123 @@ class AITextbookAdminBackendOffline:
             print(f"❌ Language detection failed: {e}")
             print("💡 Defaulting to English")
             return "english", 0.5  # Default fallback
-        
-        finally:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
     
     def add_textbook_offline(self, pdf_file, subject_name: str, language: str, auto_detected=False):
         """Add textbook with specified language (fully offline processing)"""
-        temp_path = f"temp_{subject_name.replace(' ', '_')}.pdf"
+        return self._ingest_textbook(pdf_file, subject_name, language, auto_detected, incremental=False)
+    
+    def update_textbook_offline(self, pdf_file, subject_name: str, language: str = None, auto_detected=None):
+        """Update an existing textbook, re-embedding only the pages that changed"""
+        if subject_name not in self.textbooks or self.vectorstore is None:
+            return self.add_textbook_offline(pdf_file, subject_name, language or 'english', bool(auto_detected))
+        
+        info = self.textbooks[subject_name]
+        return self._ingest_textbook(
+            pdf_file,
+            subject_name,
+            language or info['language'],
+            info.get('auto_detected', False) if auto_detected is None else auto_detected,
+            incremental=True
+        )
+    
+    def existing_page_index(self, subject_name: str):
+        """Page fingerprints and chunk IDs already stored in Chroma for a subject"""
+        records = self.vectorstore.subject_records(subject_name)
+        pages = {}
+        for stored_id, metadata in zip(records['ids'], records['metadatas']):
+            page = pages.setdefault(metadata.get('page'), {'hash': metadata.get('page_hash'), 'ids': []})
+            page['ids'].append(stored_id)
+        return pages
+    
+    def count_subject_chunks(self, subject_name: str):
+        """Number of vectors stored for a subject"""
+        return self.vectorstore.count_subject(subject_name)
+    
+    def rebuild_lexical_index(self, subject_name: str):
+        """Rebuild a subject's keyword index from the chunks stored in Chroma"""
+        records = self.vectorstore.subject_records(subject_name, include=("documents", "metadatas"))
+        if not records['ids']:
+            self.lexical_index.remove_subject(subject_name)
+            return 0
+        self.lexical_index.build_subject(subject_name, records['ids'], records['documents'], records['metadatas'])
+        print(f"🔤 Keyword index built for {subject_name} ({len(records['ids'])} chunks)")
+        return len(records['ids'])
+    
+    def _ingest_textbook(self, pdf_file, subject_name, language, auto_detected, incremental):
+        """Run the ingestion pipeline for one upload (full add or incremental update)"""
+        extraction = None
         
         try:
-            print(f"📖 Processing {subject_name} ({language}) offline...")
+            action = "Updating" if incremental else "Processing"
+            print(f"📖 {action} {subject_name} ({language}) offline...")
             
-            # Save uploaded file temporarily
-            with open(temp_path, "wb") as f:
-                f.write(pdf_file.getvalue())
+            # Continue from language detection's extraction if there was one
+            extraction = self.open_extraction(pdf_file)
             
-            # Load PDF (offline)
-            loader = PyPDFLoader(temp_path)
-            pages = loader.load()
-            
-            if not pages:
-                return False, "❌ Could not read PDF file"
+            # Open the vector store up front so the pipeline can stream writes into it
+            if self.vectorstore is None:
+                print("🔍 Creating new offline vector database...")
+                layout = read_layout()
+                write_layout(layout)  # Student apps read the layout from disk
+                self.vectorstore = TextbookVectorStore(self.embeddings, layout=layout, subjects=self.textbooks)
+            else:
+                print("📚 Adding to existing offline database...")
             
-            print(f"📄 Loaded {len(pages)} pages")
+            # Fingerprints of what's already stored, so unchanged pages cost nothing
+            existing_pages = self.existing_page_index(subject_name) if incremental else None
             
-            # Add metadata to each page
-            for page in pages:
-                page.metadata['subject'] = subject_name
-                page.metadata['language'] = language
-                page.metadata['auto_detected'] = auto_detected
+            # Extract -> split -> embed -> write, all stages running concurrently
+            pipeline = IngestionPipeline(self.embeddings, self.vectorstore.store_for(subject_name))
+            report = pipeline.run(extraction, {
+                'subject': subject_name,
+                'language': language,
+                'auto_detected': auto_detected
+            }, existing_pages=existing_pages)
+            self.last_ingest_report = report
             
-            # Split text into chunks (offline)
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200
-            )
+            if report.total_pages == 0:
+                return False, "❌ Could not read PDF file"
             
-            # Filter out pages with minimal content
-            text_pages = [page for page in pages if len(page.page_content.strip()) > 100]
+            print(f"📄 Loaded {report.total_pages} pages")
             
-            if not text_pages:
+            if report.text_pages == 0:
                 return False, "❌ No readable content found in PDF"
             
-            chunks = text_splitter.split_documents(text_pages)
-            print(f"✂️ Created {len(chunks)} chunks")
+            print(f"✂️ Created {report.chunks} chunks")
+            total_chunks = self.count_subject_chunks(subject_name) if incremental else report.chunks
+            
+            # Keyword index mirrors exactly what's stored for the subject
+            self.rebuild_lexical_index(subject_name)
             
             # Store metadata
             self.textbooks[subject_name] = {
-                'pages': len(text_pages),
-                'chunks': len(chunks),
+                'pages': report.text_pages,
+                'chunks': total_chunks,
                 'language': language,
                 'status': 'processed',
                 'auto_detected': auto_detected,
                 'file_name': pdf_file.name,
-                'processed_offline': True  # Mark as offline processed
+                'processed_offline': True,  # Mark as offline processed
+                'ingest_seconds': round(report.elapsed, 1),
+                'updated_at': time.time()  # Revision used to invalidate cached student answers
             }
             
-            # Add to vector store (offline)
-            if self.vectorstore is None:
-                print("🔍 Creating new offline vector database...")
-                self.vectorstore = Chroma.from_documents(
-                    documents=chunks,
-                    embedding=self.embeddings,
-                    persist_directory="./ai_tutor_db"
-                )
-            else:
-                print("📚 Adding to existing offline database...")
-                self.vectorstore.add_documents(chunks)
+            # Exported student index must include the new vectors before metadata announces them
+            self.refresh_read_only_index()
             
             # Save metadata (offline)
             self.save_metadata()
             
+            if incremental:
+                print(f"✅ {subject_name} updated offline successfully!")
+                return True, (
+                    f"✅ {subject_name} updated offline! ({report.changed_pages} changed, {report.new_pages} new, "
+                    f"{report.removed_pages} removed, {len(report.unchanged_pages)} unchanged pages; "
+                    f"{report.chunks} chunks re-embedded, {report.elapsed:.1f}s)"
+                )
+            
             print(f"✅ {subject_name} processed offline successfully!")
-            return True, f"✅ {subject_name} successfully processed offline! ({len(chunks)} chunks, {language})"
+            return True, f"✅ {subject_name} successfully processed offline! ({report.chunks} chunks, {language}, {report.elapsed:.1f}s)"
         
         except Exception as e:
             print(f"❌ Error processing {subject_name}: {str(e)}")
@@ -241,19 +309,113 @@ class AITextbookAdminBackendOffline:
         
         finally:
             # Clean up temporary file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+            if extraction is not None:
+                self.close_extraction(extraction)
     
     def remove_textbook(self, subject_name: str):
-        """Remove a textbook from the system (offline)"""
-        if subject_name in self.textbooks:
-            del self.textbooks[subject_name]
+        """Remove a textbook and all of its vectors from the system (offline)"""
+        removed_vectors = 0
+        if self.vectorstore is not None:
+            removed_vectors = self.vectorstore.delete_subject(subject_name)
+        self.lexical_index.remove_subject(subject_name)
+        
+        if subject_name in self.textbooks or removed_vectors:
+            self.textbooks.pop(subject_name, None)
+            self.refresh_read_only_index()
             self.save_metadata()
-            print(f"🗑️ Removed {subject_name} from offline storage")
-            # Note: Removing from vectorstore is complex, would need to rebuild
-            return True, f"✅ {subject_name} removed from metadata"
+            print(f"🗑️ Removed {subject_name} ({removed_vectors} vectors) from offline storage")
+            return True, f"✅ {subject_name} removed ({removed_vectors} vectors deleted)"
         return False, f"❌ {subject_name} not found"
     
+    def compact_vectorstore(self):
+        """Rebuild the Chroma collections without deleted/orphaned vectors and reclaim disk space
+        
+        Chroma only marks deleted vectors in its HNSW index, so the index keeps
+        growing. Compaction streams every live record into a fresh collection,
+        swaps it in once the copy is verified, drops records whose subject no
+        longer exists and VACUUMs the SQLite file.
+        """
+        if self.vectorstore is None:
+            return {'removed_vectors': 0, 'kept_vectors': 0, 'bytes_freed': 0}
+        
+        print("🧹 Compacting vector database...")
+        size_before = directory_size(VECTORSTORE_DIR)
+        removed_vectors, kept_vectors = self.vectorstore.compact(self.textbooks)
+        self.save_metadata()  # Collections were swapped for copies - student apps must reopen the store
+        
+        self.vacuum_sqlite()
+        bytes_freed = max(size_before - directory_size(VECTORSTORE_DIR), 0)
+        print(f"✅ Compaction done: {removed_vectors} vectors removed, {bytes_freed / 1024 / 1024:.1f} MB freed")
+        return {'removed_vectors': removed_vectors, 'kept_vectors': kept_vectors, 'bytes_freed': bytes_freed}
+    
+    def set_vector_layout(self, layout: str):
+        """Switch between one global collection and one collection per textbook"""
+        if self.vectorstore is None:
+            write_layout(layout)  # Applies when the first textbook is added
+            return True, f"✅ New database will use the {layout} layout"
+        if layout == self.vectorstore.layout:
+            return True, f"✅ Already using the {layout} layout"
+        try:
+            self.vectorstore = self.vectorstore.migrate(layout)
+            self.save_metadata()  # Touch metadata so student apps reopen the store
+            return True, f"✅ Switched to the {layout} layout ({self.vectorstore.count()} vectors)"
+        except Exception as e:
+            return False, f"❌ Layout change failed: {e}"
+    
+    def export_read_only_index(self, dtype: str = 'float32', ivf=None):
+        """Write the memory-mapped index that student nodes search without Chroma"""
+        if self.vectorstore is None or not self.textbooks:
+            return False, "❌ No textbooks to export"
+        try:
+            print(f"📦 Exporting read-only index ({dtype})...")
+            manifest = export_index(self.vectorstore, dtype=dtype, ivf=ivf)
+            kind = f"IVF, {manifest['nlist']} lists" if manifest['ivf'] else "flat"
+            print(f"✅ Exported {manifest['count']} vectors in {manifest['export_seconds']}s")
+            return True, f"✅ Exported {manifest['count']} vectors ({dtype}, {kind}) in {manifest['export_seconds']}s"
+        except Exception as e:
+            print(f"❌ Index export failed: {e}")
+            return False, f"❌ Index export failed: {e}"
+    
+    def refresh_read_only_index(self):
+        """Re-export with the previous settings after the library changed (if an export exists)"""
+        manifest = read_manifest()
+        if manifest is None:
+            return
+        if not self.textbooks:
+            shutil.rmtree(INDEX_DIR, ignore_errors=True)
+            return
+        self.export_read_only_index(manifest['dtype'], manifest.get('ivf_setting'))
+    
+    def vacuum_sqlite(self):
+        """Run VACUUM on Chroma's SQLite file so freed pages go back to the OS"""
+        db_path = os.path.join(VECTORSTORE_DIR, "chroma.sqlite3")
+        if not os.path.exists(db_path):
+            return
+        try:
+            conn = sqlite3.connect(db_path)
+            conn.execute("VACUUM")
+            conn.close()
+        except Exception as e:
+            print(f"⚠️ SQLite VACUUM skipped: {e}")
+    
+    def clear_all_data(self):
+        """Delete every textbook and vector and reclaim the disk space"""
+        size_before = directory_size(VECTORSTORE_DIR)
+        removed_vectors = 0
+        if self.vectorstore is not None:
+            removed_vectors = self.vectorstore.delete_all()
+            self.vectorstore = None
+        
+        self.lexical_index.clear()
+        shutil.rmtree(INDEX_DIR, ignore_errors=True)
+        self.textbooks = {}
+        self.save_metadata()
+        self.vacuum_sqlite()
+        
+        bytes_freed = max(size_before - directory_size(VECTORSTORE_DIR), 0)
+        print(f"🗑️ Cleared all data: {removed_vectors} vectors, {bytes_freed / 1024 / 1024:.1f} MB freed")
+        return {'removed_vectors': removed_vectors, 'bytes_freed': bytes_freed}
+    
     def get_system_stats(self):
         """Get system statistics (fully offline)"""
         if not self.textbooks:
@@ -281,13 +443,21 @@ class AITextbookAdminBackendOffline:
             'total_chunks': total_chunks,
             'languages': language_count,
             'vectorstore_ready': self.vectorstore is not None,
+            'vector_layout': self.vectorstore.layout if self.vectorstore is not None else read_layout(),
+            'read_only_index': read_manifest(),
             'offline_mode': True,
-            'ai_available': self.llm_available
+            'ai_available': self.llm_available,
+            'embedding_stats': self.embeddings.get_stats(),
+            'lexical_stats': self.lexical_index.get_stats(),
+            'ollama_stats': get_client().get_stats()
         }
 
     # Wrapper methods for compatibility with existing admin_fixed.py
-    def detect_pdf_language(self, pdf_file):
-        return self.detect_pdf_language_offline(pdf_file)
+    def detect_pdf_language(self, pdf_file, sample_pages=3):
+        return self.detect_pdf_language_offline(pdf_file, sample_pages)
     
     def add_textbook(self, pdf_file, subject_name: str, language: str, auto_detected=False):
         return self.add_textbook_offline(pdf_file, subject_name, language, auto_detected)
+    
+    def update_textbook(self, pdf_file, subject_name: str, language: str = None, auto_detected=None):
+        return self.update_textbook_offline(pdf_file, subject_name, language, auto_detected)
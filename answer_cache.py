@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import threading
+import numpy as np
+
+CACHE_PATH = "./ai_tutor_db/answer_cache.json"
+
+
+class AnswerCache:
+    """Semantic cache of tutor answers for near-identical student questions
+
+    Entries are grouped by (language, selected subjects) and matched on the
+    cosine similarity of the question embedding. Each entry remembers the
+    revision of every textbook in scope when it was answered, so re-ingesting
+    or removing one of those books invalidates it. Entries expire after
+    `ttl_seconds`, the least recently used are evicted past `max_entries`,
+    and the cache is persisted to disk across restarts.
+    """
+    def __init__(self, path=CACHE_PATH, threshold=0.92, ttl_seconds=7 * 24 * 3600,
+                 max_entries=1000, save_interval=10.0):
+        self.path = path
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.save_interval = save_interval
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = {}   # scope key -> list of entries
+        self._matrices = {}  # scope key -> stacked normalized embeddings
+        self._last_save = 0.0
+        self._dirty = False
+        self.load()
+
+    @staticmethod
+    def scope_key(language, subjects):
+        return f"{language}|{'|'.join(sorted(subjects)) if subjects else '*'}"
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, language, subjects, embedding, revisions):
+        """Return a cached {'response', 'sources', 'similarity'} or None"""
+        key = self.scope_key(language, subjects)
+        now = time.time()
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                self.misses += 1
+                return None
+
+            # Drop entries that expired or whose textbooks changed
+            valid = [e for e in entries if now - e['created'] < self.ttl_seconds and e['revisions'] == revisions]
+            if len(valid) != len(entries):
+                self._set_scope(key, valid)
+                self._dirty = True
+            if not valid:
+                self.misses += 1
+                return None
+
+            similarities = self._matrices[key] @ self._normalize(embedding)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            entry = valid[best]
+            entry['last_used'] = now
+            self.hits += 1
+            return {
+                'response': entry['response'],
+                'sources': list(entry['sources']),
+                'similarity': float(similarities[best]),
+                'question': entry['question']
+            }
+
+    def store(self, language, subjects, question, embedding, response, sources, revisions):
+        key = self.scope_key(language, subjects)
+        now = time.time()
+        entry = {
+            'question': question,
+            'embedding': self._normalize(embedding).tolist(),
+            'response': response,
+            'sources': list(sources),
+            'revisions': revisions,
+            'created': now,
+            'last_used': now
+        }
+        with self._lock:
+            self._set_scope(key, self._entries.get(key, []) + [entry])
+            self._evict()
+            self._dirty = True
+            if now - self._last_save >= self.save_interval:
+                self._save_locked()
+
+    def _set_scope(self, key, entries):
+        if entries:
+            self._entries[key] = entries
+            self._matrices[key] = np.asarray([e['embedding'] for e in entries], dtype=np.float32)
+        else:
+            self._entries.pop(key, None)
+            self._matrices.pop(key, None)
+
+    def _evict(self):
+        total = sum(len(entries) for entries in self._entries.values())
+        if total <= self.max_entries:
+            return
+        ranked = sorted(
+            ((e['last_used'], key, id(e)) for key, entries in self._entries.items() for e in entries)
+        )
+        doomed = {(key, entry_id) for _, key, entry_id in ranked[:total - self.max_entries]}
+        for key, entries in list(self._entries.items()):
+            self._set_scope(key, [e for e in entries if (key, id(e)) not in doomed])
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            with self._lock:
+                for key, entries in data.items():
+                    self._set_scope(key, entries)
+            print(f"💾 Loaded {sum(len(e) for e in data.values())} cached answers")
+        except Exception as e:
+            print(f"⚠️ Could not load answer cache: {e}")
+
+    def save(self):
+        with self._lock:
+            self._save_locked()
+
+    def _save_locked(self):
+        if not self._dirty:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+        self._last_save = time.time()
+        self._dirty = False
+
+    def get_stats(self):
+        with self._lock:
+            entries = sum(len(e) for e in self._entries.values())
+        lookups = self.hits + self.misses
+        return {
+            'entries': entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+        }
@@ -0,0 +1,238 @@
+import io
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import faster_whisper
+
+SAMPLE_RATE = 16000  # What Whisper expects
+CPU_COUNT = os.cpu_count() or 2
+# Concurrent transcriptions; each gets an equal share of the cores unless TUTOR_ASR_THREADS says otherwise
+DEFAULT_ASR_WORKERS = int(os.environ.get('TUTOR_ASR_WORKERS', max(1, CPU_COUNT // 2)))
+ASR_THREADS = int(os.environ.get('TUTOR_ASR_THREADS', 0))
+DEFAULT_ASR_QUEUE = 16
+# Telugu fine-tune of Whisper base, converted for faster-whisper with:
+#   ct2-transformers-converter --model vasista22/whisper-telugu-base --output_dir ./models/whisper/whisper-telugu-base-ct2 --quantization int8
+TELUGU_MODEL = os.environ.get('TUTOR_ASR_TELUGU_MODEL', './models/whisper/whisper-telugu-base-ct2')
+
+
+class ASRProfile:
+    """One way of running Whisper: which model, how it's quantized, how hard it searches
+
+    `fallback` names the cheaper profile to use when the queue backs up.
+    """
+    def __init__(self, name, model, compute_type='int8', beam_size=5, cpu_threads=None, fallback=None):
+        self.name = name
+        self.model = model
+        self.compute_type = compute_type
+        self.beam_size = beam_size
+        self.cpu_threads = cpu_threads  # None: the pool's share of the cores
+        self.fallback = fallback
+
+    def options(self):
+        """transcribe() keyword arguments"""
+        return {'beam_size': self.beam_size, 'temperature': 0.0}
+
+    def as_dict(self):
+        return {'name': self.name, 'model': self.model, 'compute_type': self.compute_type,
+                'beam_size': self.beam_size, 'cpu_threads': self.cpu_threads}
+
+
+ASR_PROFILES = {
+    'telugu': ASRProfile('telugu', TELUGU_MODEL, 'int8', beam_size=5, fallback='telugu_fast'),
+    'telugu_fast': ASRProfile('telugu_fast', TELUGU_MODEL, 'int8', beam_size=1, fallback='fastest'),
+    'accurate': ASRProfile('accurate', 'small', 'int8', beam_size=5, fallback='balanced'),
+    'balanced': ASRProfile('balanced', 'base', 'int8', beam_size=5, fallback='fast'),
+    'fast': ASRProfile('fast', 'base', 'int8', beam_size=1, fallback='fastest'),
+    'fastest': ASRProfile('fastest', 'tiny', 'int8', beam_size=1)
+}
+DEFAULT_ASR_PROFILE = os.environ.get('TUTOR_ASR_PROFILE', 'balanced')
+
+
+def profile_chain(name=DEFAULT_ASR_PROFILE):
+    """The named profile followed by its fallbacks, cheapest last"""
+    chain = []
+    while name and name not in [profile.name for profile in chain]:
+        chain.append(ASR_PROFILES[name])
+        name = ASR_PROFILES[name].fallback
+    return chain
+
+
+class ASRBusy(Exception):
+    """Raised instead of queueing when too many recordings are waiting"""
+    def __init__(self, queue_depth):
+        super().__init__(f"Speech recognition queue full ({queue_depth} waiting)")
+        self.queue_depth = queue_depth
+
+
+def decode_audio(data):
+    """Recording bytes (WAV/MP3/OGG...) -> mono float32 samples at 16 kHz, without temp files"""
+    return faster_whisper.decode_audio(io.BytesIO(data), sampling_rate=SAMPLE_RATE)
+
+
+class TranscriptionResult:
+    def __init__(self, text, language, audio_seconds, processing_seconds, queued_seconds, profile=None):
+        self.text = text
+        self.profile = profile
+        self.language = language
+        self.audio_seconds = audio_seconds
+        self.processing_seconds = processing_seconds
+        self.queued_seconds = queued_seconds
+
+    @property
+    def rtf(self):
+        """Real-time factor: processing time per second of audio (below 1 is faster than real time)"""
+        return self.processing_seconds / self.audio_seconds if self.audio_seconds else 0.0
+
+
+class ASRService:
+    """Whisper transcription on a bounded pool of worker threads
+
+    Recordings are decoded in memory and transcribed by up to `workers`
+    threads sharing the loaded faster-whisper models (loaded with
+    num_workers set to match, so CTranslate2 runs them in parallel rather
+    than one after another). `profiles` is a chain from the preferred
+    profile to the cheapest; each recording uses the profile one step down
+    the chain per `downgrade_step` recordings already waiting, so a backed
+    up queue drains faster at some cost in accuracy. At most `max_queue`
+    recordings wait; beyond that a new one raises ASRBusy so a class full of
+    students gets a quick "try again" instead of an ever-growing wait.
+
+    A recording streamed in segments is admitted once with start_recording():
+    all its segments use the profile chosen then, and it counts as one
+    recording towards the queue however many segments it has.
+    """
+    def __init__(self, model_factory, profiles=None, workers=DEFAULT_ASR_WORKERS, max_queue=DEFAULT_ASR_QUEUE,
+                 downgrade_step=None):
+        self.workers = max(1, workers)
+        self.cpu_threads = ASR_THREADS or max(1, CPU_COUNT // self.workers)
+        self.models = {}
+        self.profiles = []
+        # Every profile is loaded up front - a downgrade is meant for when there's no time to load a model
+        for profile in profiles or profile_chain():
+            try:
+                self._load(model_factory, profile)
+                self.profiles.append(profile)
+            except Exception as e:
+                print(f"⚠️ ASR profile '{profile.name}' unavailable ({profile.model}): {e}")
+        if not self.profiles:
+            raise RuntimeError("No speech recognition model could be loaded")
+        self.model = self.models[self._model_key(self.profiles[0])]
+        self.downgrade_step = downgrade_step or 2 * self.workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='asr')
+        self._lock = threading.Lock()
+        self.queued = 0       # Segments or recordings waiting for a worker
+        self.recordings = 0   # Recordings admitted and not finished yet
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.audio_seconds = 0.0
+        self.processing_seconds = 0.0
+        self.queued_seconds = 0.0
+        self.last_rtf = None
+        self.profile_counts = {}
+
+    def _model_key(self, profile):
+        return profile.model, profile.compute_type, profile.cpu_threads or self.cpu_threads
+
+    def _load(self, model_factory, profile):
+        key = self._model_key(profile)
+        if key not in self.models:
+            self.models[key] = model_factory(profile, num_workers=self.workers, cpu_threads=key[2])
+
+    def select_profile(self, queue_depth):
+        """Profile for a recording submitted with `queue_depth` others waiting"""
+        return self.profiles[min(queue_depth // self.downgrade_step, len(self.profiles) - 1)]
+
+    def _waiting_recordings(self):
+        # Recordings beyond those the workers can take right now
+        return max(self.recordings - self.workers, 0)
+
+    def start_recording(self):
+        """Admit one recording - returns the profile for all of it, or raises ASRBusy"""
+        with self._lock:
+            waiting = self._waiting_recordings()
+            if waiting >= self.max_queue:
+                self.rejected += 1
+                raise ASRBusy(waiting)
+            self.recordings += 1
+            return self.select_profile(waiting)
+
+    def end_recording(self):
+        with self._lock:
+            self.recordings -= 1
+
+    def submit(self, audio, language=None, profile=None, **options):
+        """Queue audio (bytes or 16 kHz float32 samples) - returns a Future of TranscriptionResult
+
+        Without `profile` the audio is a whole recording and is admitted on
+        its own; with one it is a segment of a recording already admitted
+        by start_recording(). `options` override the profile's transcribe()
+        arguments.
+        """
+        whole_recording = profile is None
+        if whole_recording:
+            profile = self.start_recording()
+        with self._lock:
+            self.queued += 1
+        future = self._pool.submit(self._transcribe, audio, language, profile, options, time.perf_counter())
+        if whole_recording:
+            future.add_done_callback(lambda _: self.end_recording())
+        return future
+
+    def transcribe(self, audio, language=None, **options):
+        """Blocking transcription of one recording"""
+        return self.submit(audio, language, **options).result()
+
+    def _transcribe(self, audio, language, profile, options, submitted):
+        started = time.perf_counter()
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            samples = decode_audio(audio) if isinstance(audio, (bytes, bytearray)) else audio
+            model = self.models[self._model_key(profile)]
+            segments, info = model.transcribe(samples, language=language, task="transcribe", **{**profile.options(), **options})
+            text = " ".join(segment.text.strip() for segment in segments).strip()
+        except Exception:
+            with self._lock:
+                self.running -= 1
+                self.failed += 1
+            raise
+
+        result = TranscriptionResult(text, getattr(info, 'language', language), len(samples) / SAMPLE_RATE,
+                                     time.perf_counter() - started, started - submitted, profile.name)
+        with self._lock:
+            self.running -= 1
+            self.completed += 1
+            self.audio_seconds += result.audio_seconds
+            self.processing_seconds += result.processing_seconds
+            self.queued_seconds += result.queued_seconds
+            self.last_rtf = result.rtf
+            self.profile_counts[profile.name] = self.profile_counts.get(profile.name, 0) + 1
+        return result
+
+    def queue_depth(self):
+        with self._lock:
+            return self.queued
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'cpu_threads': self.cpu_threads,
+                'queued': self.queued,
+                'recordings': self.recordings,
+                'running': self.running,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'avg_rtf': round(self.processing_seconds / self.audio_seconds, 3) if self.audio_seconds else None,
+                'last_rtf': round(self.last_rtf, 3) if self.last_rtf is not None else None,
+                'avg_queue_wait_seconds': round(self.queued_seconds / self.completed, 2) if self.completed else 0.0,
+                'profiles': [profile.name for profile in self.profiles],
+                'current_profile': self.select_profile(self._waiting_recordings()).name,
+                'profile_counts': dict(self.profile_counts)
+            }
@@ -0,0 +1,121 @@
+# benchmark_asr.py
+import os
+import argparse
+from lexical_index import TOKEN_PATTERN
+from asr_service import ASRService, ASR_PROFILES, DEFAULT_ASR_PROFILE, profile_chain
+from tutor_backend_multilingual import AITextbookTutorMultilingualBackendOffline
+
+FIXTURES_DIR = "./asr_fixtures"
+AUDIO_EXTENSIONS = ('.wav', '.flac', '.ogg', '.mp3')
+
+
+def load_fixtures(fixtures_dir=FIXTURES_DIR):
+    """[(name, audio bytes, reference text)] - each recording needs a .txt transcript next to it"""
+    fixtures = []
+    for filename in sorted(os.listdir(fixtures_dir)):
+        stem, extension = os.path.splitext(filename)
+        reference_path = os.path.join(fixtures_dir, stem + ".txt")
+        if extension.lower() not in AUDIO_EXTENSIONS or not os.path.exists(reference_path):
+            continue
+        with open(os.path.join(fixtures_dir, filename), 'rb') as f:
+            audio = f.read()
+        with open(reference_path, 'r', encoding='utf-8') as f:
+            fixtures.append((filename, audio, f.read().strip()))
+    return fixtures
+
+
+def edit_distance(reference, hypothesis):
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_item in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_item in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_item != hyp_item)))
+        previous = current
+    return previous[-1]
+
+
+def error_counts(reference, hypothesis):
+    """(word errors, reference words, character errors, reference characters), ignoring case and punctuation"""
+    ref_words = TOKEN_PATTERN.findall(reference.lower())
+    hyp_words = TOKEN_PATTERN.findall(hypothesis.lower())
+    ref_chars, hyp_chars = "".join(ref_words), "".join(hyp_words)
+    return edit_distance(ref_words, hyp_words), len(ref_words), edit_distance(ref_chars, hyp_chars), len(ref_chars)
+
+
+def score(results, fixtures):
+    """Error rates over the whole run (as if one long recording) and latency per recording"""
+    totals = [0, 0, 0, 0]
+    for result, (_, _, reference) in zip(results, fixtures):
+        totals = [total + count for total, count in zip(totals, error_counts(reference, result.text))]
+    word_errors, words, char_errors, chars = totals
+    latencies = [r.processing_seconds + r.queued_seconds for r in results]
+    return {
+        'wer': word_errors / max(words, 1),
+        'cer': char_errors / max(chars, 1),
+        'avg_latency': sum(latencies) / len(latencies),
+        'max_latency': max(latencies),
+        'rtf': sum(r.processing_seconds for r in results) / max(sum(r.audio_seconds for r in results), 1e-9)
+    }
+
+
+def run_profile(profile, fixtures, language):
+    """One recording at a time, so latency is pure transcription time"""
+    service = ASRService(AITextbookTutorMultilingualBackendOffline.load_whisper_model, [profile], workers=1)
+    service.transcribe(fixtures[0][1], language)  # Warm-up
+    return score([service.transcribe(audio, language) for _, audio, _ in fixtures], fixtures)
+
+
+def run_under_load(fixtures, language, chain, concurrent):
+    """Every fixture submitted `concurrent` times at once, with and without downgrading"""
+    rows = {}
+    for label, profiles in (('fixed', chain[:1]), ('adaptive', chain)):
+        service = ASRService(AITextbookTutorMultilingualBackendOffline.load_whisper_model, profiles, max_queue=len(fixtures) * concurrent)
+        futures = [service.submit(audio, language) for _ in range(concurrent) for _, audio, _ in fixtures]
+        results = [future.result() for future in futures]
+        row = score(results, fixtures * concurrent)
+        row['profiles'] = service.get_stats()['profile_counts']
+        rows[label] = row
+    return rows
+
+
+def run_benchmark(fixtures_dir=FIXTURES_DIR, profile_names=None, language="te", concurrent=0):
+    if not os.path.isdir(fixtures_dir):
+        print(f"❌ No fixtures at {fixtures_dir} - add recordings with same-name .txt transcripts")
+        return None
+    fixtures = load_fixtures(fixtures_dir)
+    if not fixtures:
+        print(f"❌ No recordings with .txt transcripts in {fixtures_dir}")
+        return None
+
+    print(f"\n🎧 {len(fixtures)} recordings from {fixtures_dir} ({language})")
+    print(f"{'profile':<12} {'model':<24} {'compute':<8} {'beam':>4} {'WER':>7} {'CER':>7} {'avg s':>7} {'max s':>7} {'RTF':>6}")
+    results = {}
+    for name in profile_names or ASR_PROFILES:
+        profile = ASR_PROFILES[name]
+        try:
+            row = run_profile(profile, fixtures, language)
+        except Exception as e:
+            print(f"{name:<12} ⚠️ skipped: {e}")
+            continue
+        results[name] = row
+        print(f"{name:<12} {os.path.basename(profile.model):<24} {profile.compute_type:<8} {profile.beam_size:>4} "
+              f"{row['wer']:>7.3f} {row['cer']:>7.3f} {row['avg_latency']:>7.2f} {row['max_latency']:>7.2f} {row['rtf']:>6.2f}")
+
+    if concurrent:
+        chain = profile_chain(DEFAULT_ASR_PROFILE)
+        print(f"\n🚦 {concurrent} students at once, chain {' → '.join(p.name for p in chain)}")
+        print(f"{'mode':<12} {'WER':>7} {'avg s':>7} {'max s':>7}  profiles used")
+        for label, row in run_under_load(fixtures, language, chain, concurrent).items():
+            print(f"{label:<12} {row['wer']:>7.3f} {row['avg_latency']:>7.2f} {row['max_latency']:>7.2f}  {row['profiles']}")
+            results[f'load_{label}'] = row
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Word error rate vs latency of each ASR profile")
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="Folder of recordings, each with a same-name .txt transcript")
+    parser.add_argument("--profile", action="append", choices=list(ASR_PROFILES), help="Profile to measure (repeatable, default: all)")
+    parser.add_argument("--language", default="te", help="Whisper language code")
+    parser.add_argument("--concurrent", type=int, default=0, help="Also submit every recording this many times at once, fixed vs adaptive profile")
+    args = parser.parse_args()
+    run_benchmark(args.fixtures, args.profile, args.language, args.concurrent)
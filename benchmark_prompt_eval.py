@@ -0,0 +1,95 @@
+# benchmark_prompt_eval.py
+import argparse
+from ollama_client import get_client
+from context_builder import context_window
+from tutor_backend_multilingual import AITextbookTutorMultilingualBackendOffline, KEEP_ALIVE, NUM_PREDICT
+
+SAMPLE_QUESTIONS = {
+    'english': [
+        "What is photosynthesis?",
+        "Why do plants need sunlight for it?",
+        "What happens to the oxygen produced?",
+        "Can you give another example?"
+    ],
+    'telugu': [
+        "కిరణజన్య సంయోగక్రియ అంటే ఏమిటి?",
+        "మొక్కలకు సూర్యరశ్మి ఎందుకు అవసరం?",
+        "ఉత్పత్తి అయిన ఆక్సిజన్ ఏమవుతుంది?",
+        "మరొక ఉదాహరణ ఇవ్వగలరా?"
+    ]
+}
+
+
+def generate(tutor, prompt, **extra):
+    response = get_client().generate(
+        tutor.model_name,
+        prompt,
+        options={"temperature": 0.7, "top_p": 0.9, "num_predict": NUM_PREDICT, "num_ctx": context_window(tutor.model_name)},
+        timeout=300,
+        **extra
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def run_mode(tutor, mode, prompts):
+    """Prompt-eval tokens and ms per question for one prompt layout
+
+    legacy:        instructions after the question and textbook text (the old
+                   template layout) - nothing shared between requests
+    stable_prefix: fixed per-language system prompt first, kept loaded
+    chat_context:  stable prefix, and follow-ups continue from the previous
+                   answer's context instead of re-sending it
+    """
+    rows = []
+    context = None
+    for prompt in prompts:
+        if mode == 'legacy':
+            data = generate(tutor, f"{prompt}\n\n{tutor.system_prompt}")
+        elif mode == 'stable_prefix':
+            data = generate(tutor, prompt, system=tutor.system_prompt, keep_alive=KEEP_ALIVE)
+        else:
+            extra = {'context': context} if context else {'system': tutor.system_prompt}
+            data = generate(tutor, prompt, keep_alive=KEEP_ALIVE, **extra)
+            context = data.get('context')
+        rows.append((data.get('prompt_eval_count', 0), data.get('prompt_eval_duration', 0) / 1e6))
+    return rows
+
+
+def run_benchmark(language='english', questions_file=None, subjects=None):
+    tutor = AITextbookTutorMultilingualBackendOffline(language)
+    if not tutor.llm_available:
+        print("❌ Ollama isn't running or has no models - start it and try again")
+        return None
+
+    if questions_file:
+        with open(questions_file, 'r', encoding='utf-8') as f:
+            questions = [line.strip() for line in f if line.strip()]
+    else:
+        questions = SAMPLE_QUESTIONS.get(language, SAMPLE_QUESTIONS['english'])
+
+    # Real prompts: same retrieval and context packing as the app
+    prompts = []
+    for question in questions:
+        prepared = tutor.prepare_response(question, subjects)
+        prompts.append(prepared.prompt or question)
+
+    print(f"\n🤖 {tutor.model_name}, {len(prompts)} questions in one chat ({language})")
+    print(f"{'layout':<15} {'first q tokens':>15} {'first q ms':>11} {'follow-up tokens':>17} {'follow-up ms':>13}")
+    results = {}
+    for mode in ('legacy', 'stable_prefix', 'chat_context'):
+        rows = run_mode(tutor, mode, prompts)
+        follow_ups = rows[1:] or rows
+        results[mode] = rows
+        print(f"{mode:<15} {rows[0][0]:>15} {rows[0][1]:>11.0f} "
+              f"{sum(r[0] for r in follow_ups) / len(follow_ups):>17.0f} {sum(r[1] for r in follow_ups) / len(follow_ups):>13.0f}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ollama prompt-eval time with and without prefix/context reuse")
+    parser.add_argument("--language", default="english", choices=["english", "telugu"])
+    parser.add_argument("--questions", help="Text file with one question per line, asked as one conversation")
+    parser.add_argument("--subject", action="append", help="Limit retrieval to a textbook (repeatable)")
+    args = parser.parse_args()
+    run_benchmark(args.language, args.questions, args.subject)
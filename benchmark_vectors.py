@@ -0,0 +1,54 @@
+# benchmark_vectors.py
+import os
+import random
+import argparse
+from embedding_service import EmbeddingService
+from vector_store import TextbookVectorStore, VECTORSTORE_DIR, read_records
+from quantized_index import quantization_report, VECTOR_DTYPES
+
+
+def sample_queries(vectorstore, count, seed=0):
+    """Use the opening words of random stored chunks as stand-in student questions"""
+    texts = []
+    for store in vectorstore.collections():
+        for page in read_records(store._collection):
+            texts.extend(page['documents'])
+    random.Random(seed).shuffle(texts)
+    return [" ".join(text.split()[:12]) for text in texts[:count] if text.strip()]
+
+
+def run_benchmark(queries_file=None, count=200, k=3):
+    """Compare float32/float16/int8 storage against the Chroma store"""
+    if not os.path.exists(VECTORSTORE_DIR):
+        print("❌ No vector database found - add textbooks in the admin panel first")
+        return None
+
+    os.environ['HF_HUB_OFFLINE'] = '1'
+    os.environ['TRANSFORMERS_OFFLINE'] = '1'
+    embeddings = EmbeddingService(local_files_only=True)
+    vectorstore = TextbookVectorStore(embeddings)
+    print(f"📚 {vectorstore.count()} vectors ({vectorstore.layout} layout)")
+
+    if queries_file:
+        with open(queries_file, 'r', encoding='utf-8') as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = sample_queries(vectorstore, count)
+    print(f"❓ Embedding {len(queries)} queries...")
+    query_vectors = embeddings.embed_documents(queries)
+
+    rows = quantization_report(vectorstore, query_vectors, k=k, dtypes=VECTOR_DTYPES)
+    print(f"\n{'storage':<18} {'memory MB':>10} {'RSS MB':>10} {'+RSS MB':>10} {'search ms':>10} {f'recall@{k}':>10}")
+    for row in rows:
+        memory, rss, delta = (f"{row[key]:.1f}" if row[key] is not None else "-" for key in ('memory_mb', 'process_rss_mb', 'rss_delta_mb'))
+        print(f"{row['dtype']:<18} {memory:>10} {rss:>10} {delta:>10} {row['avg_search_ms']:>10.2f} {row['recall_at_k']:>10.3f}")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory and recall@k of quantized textbook vectors")
+    parser.add_argument("--queries", help="Text file with one question per line (default: sampled from the textbooks)")
+    parser.add_argument("--count", type=int, default=200, help="Number of sampled queries")
+    parser.add_argument("-k", type=int, default=3, help="Results per query")
+    args = parser.parse_args()
+    run_benchmark(args.queries, args.count, args.k)
@@ -0,0 +1,36 @@
+# calibrate_reranker.py
+import argparse
+from langchain_core.documents import Document
+from reranker import CrossEncoderReranker, CALIBRATION_FIXTURE, CALIBRATION_PATH, load_labelled_pairs
+
+
+def calibrate(fixture=CALIBRATION_FIXTURE, threshold=0.5):
+    """Fit the re-ranker's Platt scaling on labelled pairs and save it for the tutor"""
+    examples = load_labelled_pairs(fixture)
+    positives = sum(1 for _, _, relevant in examples if relevant)
+    print(f"🏷️ {len(examples)} labelled pairs from {fixture} ({positives} relevant)")
+    if not positives or positives == len(examples):
+        print("❌ Need both relevant and irrelevant pairs")
+        return None
+
+    reranker = CrossEncoderReranker()
+    a, b = reranker.calibrate(examples)
+    print(f"✅ Platt scaling for {reranker.model_name}: a={a:.3f}, b={b:.3f} (saved to {CALIBRATION_PATH})")
+
+    # How the routing threshold splits the labelled pairs with the fitted scores
+    hits = {(True, True): 0, (True, False): 0, (False, True): 0, (False, False): 0}
+    for question, passage, relevant in examples:
+        relevance = reranker.rerank(question, [Document(page_content=passage)], budget_ms=float('inf')).ranked[0][1]
+        hits[(relevance >= threshold, relevant)] += 1
+    predicted = hits[(True, True)] + hits[(True, False)]
+    print(f"🎯 At threshold {threshold}: accuracy {(hits[(True, True)] + hits[(False, False)]) / len(examples):.2f}, "
+          f"precision {hits[(True, True)] / max(predicted, 1):.2f}, recall {hits[(True, True)] / positives:.2f}")
+    return a, b
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrate cross-encoder relevance scores on labelled question/passage pairs")
+    parser.add_argument("--fixture", default=CALIBRATION_FIXTURE, help="JSON lines with question, passage and relevant (true/false)")
+    parser.add_argument("--threshold", type=float, default=0.5, help="Routing threshold to evaluate (TUTOR_RELEVANCE_THRESHOLD)")
+    args = parser.parse_args()
+    calibrate(args.fixture, args.threshold)
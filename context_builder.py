@@ -0,0 +1,218 @@
+import os
+import re
+import math
+
+# Ollama context window (num_ctx) per model family - passed explicitly so the
+# server never silently truncates a prompt at its smaller default
+CONTEXT_WINDOWS = {
+    'llama3.2': 4096,
+    'llama3.1': 4096,
+    'llama3': 4096,
+    'qwen2.5': 4096,
+    'gemma2': 4096,
+    'mistral': 4096,
+    'phi3': 4096,
+}
+DEFAULT_CONTEXT_WINDOW = 2048
+# Upper bound on textbook tokens in a prompt: on CPU every prompt token costs eval time
+MAX_CONTEXT_TOKENS = int(os.environ.get('TUTOR_CONTEXT_TOKENS', 1200))
+ADJACENT_GAP = 5         # Chunks this close on a page are merged (the splitter strips whitespace)
+MIN_OVERLAP_CHARS = 20   # Shortest textual overlap trusted when offsets are missing
+MIN_PARTIAL_TOKENS = 40  # Don't squeeze in a truncated span smaller than this
+
+SENTENCE_END = re.compile(r'[.!?।\n]\s')
+
+
+def estimate_tokens(text):
+    """Rough token count for Llama-style BPE tokenizers
+
+    Latin text averages about 4 characters per token; Telugu and other
+    non-Latin scripts fall back to much shorter byte-level pieces.
+    """
+    if not text:
+        return 0
+    latin = sum(1 for ch in text if ord(ch) < 0x250)
+    return math.ceil(latin / 4.0 + (len(text) - latin) / 1.5)
+
+
+def context_window(model_name):
+    """num_ctx for the active Ollama model (TUTOR_NUM_CTX overrides)"""
+    if os.environ.get('TUTOR_NUM_CTX'):
+        return int(os.environ['TUTOR_NUM_CTX'])
+    base = (model_name or '').split(':')[0]
+    return CONTEXT_WINDOWS.get(base, DEFAULT_CONTEXT_WINDOW)
+
+
+def _text_overlap(left, right, limit=400):
+    """Length of the longest suffix of `left` that is a prefix of `right`"""
+    for size in range(min(limit, len(left), len(right)), MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+class ContextSpan:
+    """A contiguous piece of one textbook page, built from one or more chunks"""
+    def __init__(self, doc, rank):
+        self.subject = doc.metadata.get('subject', 'Unknown')
+        self.page = doc.metadata.get('page', 'Unknown')
+        start = doc.metadata.get('start_index')
+        self.start = start if isinstance(start, int) and start >= 0 else None
+        self.text = doc.page_content
+        self.rank = rank  # Best retrieval rank among the merged chunks
+        self.focus = 0    # Where the best-ranked chunk starts in `text` - kept if the span is cut
+        self.chunks = 1
+
+    @property
+    def end(self):
+        return self.start + len(self.text) if self.start is not None else None
+
+    def absorb(self, doc, rank):
+        """Merge the next chunk of the same page into this span - returns False if they aren't contiguous"""
+        other = ContextSpan(doc, rank)
+        if self.start is not None and other.start is not None:
+            if other.start < self.start or other.start > self.end + ADJACENT_GAP:
+                return False
+            position = other.start - self.start
+            if other.end <= self.end:
+                pass  # Fully contained
+            elif other.start >= self.end:
+                if other.start > self.end:
+                    self.text += " "
+                    position = len(self.text)
+                self.text += other.text
+            else:
+                overlap = self.end - other.start
+                if not self.text.endswith(other.text[:overlap]):
+                    return False
+                self.text += other.text[overlap:]
+        else:
+            if other.text in self.text:
+                position = self.text.index(other.text)
+            else:
+                overlap = _text_overlap(self.text, other.text)
+                if not overlap:
+                    return False
+                position = len(self.text) - overlap
+                self.text += other.text[overlap:]
+                self.start = None
+        if rank < self.rank:
+            self.rank, self.focus = rank, position
+        self.chunks += 1
+        return True
+
+
+class PackedContext:
+    """Textbook context ready for the prompt, with the token accounting behind it"""
+    def __init__(self, text, spans, raw_tokens, merged_tokens, budget_tokens, truncated):
+        self.text = text
+        self.spans = spans
+        self.raw_tokens = raw_tokens        # Chunks simply concatenated
+        self.merged_tokens = merged_tokens  # After stitching overlaps, before the budget cut
+        self.tokens = estimate_tokens(text)
+        self.budget_tokens = budget_tokens
+        self.truncated = truncated
+
+    @property
+    def tokens_deduplicated(self):
+        """Repeated overlap text no longer sent - nothing is lost"""
+        return max(self.raw_tokens - self.merged_tokens, 0)
+
+    @property
+    def tokens_cut(self):
+        """Textbook text dropped to fit the budget"""
+        return max(self.merged_tokens - self.tokens, 0)
+
+    def sources(self, page_text="Page"):
+        return [f"{span.subject} - {page_text} {span.page}" for span in self.spans]
+
+    def as_dict(self):
+        return {
+            'raw_tokens': self.raw_tokens,
+            'context_tokens': self.tokens,
+            'tokens_deduplicated': self.tokens_deduplicated,
+            'tokens_cut': self.tokens_cut,
+            'budget_tokens': self.budget_tokens,
+            'spans': len(self.spans),
+            'truncated': self.truncated
+        }
+
+
+def _longest_within(text, max_tokens, from_end=False):
+    """Length of the longest prefix (or suffix) of `text` within `max_tokens`"""
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[len(text) - middle:] if from_end else text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _truncate(text, max_tokens, focus=0):
+    """Cut `text` to roughly `max_tokens`, keeping what follows `focus` and preferably ending at a sentence end
+
+    The window starts at `focus` (the best-ranked chunk) and only reaches
+    back before it if the rest of the text is too short to fill the budget.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    max_tokens -= estimate_tokens("… …")  # Room for the ellipses
+    start = focus
+    end = start + _longest_within(text[start:], max_tokens)
+    if end == len(text):
+        start = len(text) - _longest_within(text, max_tokens, from_end=True)
+    cut = text[start:end]
+    if end < len(text):
+        ends = [m.end() for m in SENTENCE_END.finditer(cut)]
+        if ends and ends[-1] > len(cut) // 2:
+            cut = cut[:ends[-1]]
+    cut = cut.strip()
+    return ("… " if start else "") + cut + (" …" if end < len(text) else "")
+
+
+def pack_context(docs, budget_tokens, separator="\n\n"):
+    """Build the prompt context from retrieved chunks (best first)
+
+    Overlapping chunks of the same page (the splitter repeats 200 characters
+    between neighbours) are stitched into one span so the overlap is sent
+    once, contiguous chunks are merged, and spans are then added in
+    retrieval order until `budget_tokens` is used up; the last one may be
+    cut, keeping the text of its best-ranked chunk.
+    """
+    raw_tokens = estimate_tokens(separator.join(doc.page_content for doc in docs))
+
+    by_page = {}
+    for rank, doc in enumerate(docs):
+        by_page.setdefault((doc.metadata.get('subject'), doc.metadata.get('page')), []).append((rank, doc))
+
+    spans = []
+    for page_docs in by_page.values():
+        page_docs.sort(key=lambda item: (item[1].metadata.get('start_index') is None,
+                                         item[1].metadata.get('start_index') or 0))
+        page_spans = []
+        for rank, doc in page_docs:
+            if not any(span.absorb(doc, rank) for span in page_spans[-1:]):
+                page_spans.append(ContextSpan(doc, rank))
+        spans.extend(page_spans)
+    spans.sort(key=lambda span: span.rank)
+    merged_tokens = estimate_tokens(separator.join(span.text for span in spans))
+
+    packed, used, truncated = [], 0, False
+    separator_tokens = estimate_tokens(separator)
+    for span in spans:
+        remaining = budget_tokens - used - (separator_tokens if packed else 0)
+        span_tokens = estimate_tokens(span.text)
+        if span_tokens > remaining:
+            truncated = True
+            if remaining < MIN_PARTIAL_TOKENS:
+                break
+            span.text = _truncate(span.text, remaining, span.focus)
+            span_tokens = estimate_tokens(span.text)
+        packed.append(span)
+        used += span_tokens + (separator_tokens if len(packed) > 1 else 0)
+        if truncated:
+            break
+
+    return PackedContext(separator.join(span.text for span in packed), packed, raw_tokens, merged_tokens, budget_tokens, truncated)
@@ -0,0 +1,166 @@
+import numpy as np
+from lexical_index import tokenize, TOKEN_PATTERN
+from context_builder import estimate_tokens
+
+MEMORY_TOKENS = 600    # Cap on the history block added to a prompt
+SUMMARY_TOKENS = 150   # Part of the cap kept for the summary of older turns
+WINDOW_TURNS = 3       # Recent turns kept word for word
+ANSWER_CHARS = 600     # Long answers are clipped in the window - the gist is enough
+TOPIC_TERMS = 8        # Terms carried over from the topic question into a follow-up
+FOLLOW_UP_SIMILARITY = 0.4   # Below this cosine to the topic question, a pronoun starts a new topic
+FOLLOW_UP_LEAD_WORDS = 4     # The pronoun must be this close to the start ("why is it green?")
+
+# Subject/object pronouns that point back at what was said before. Relative
+# and possessive words ("that", "its", "their"...) also start standalone
+# questions ("the force that moves tides"), so they are left out.
+FOLLOW_UP_WORDS = {
+    'it', 'this', 'these', 'those', 'they', 'them', 'he', 'she', 'him',
+    'అది', 'ఇది', 'అవి', 'ఇవి', 'అతను', 'ఆమె'
+}
+
+
+def _clip(text, chars):
+    text = " ".join(text.split())
+    return text if len(text) <= chars else text[:chars].rstrip() + " …"
+
+
+class ConversationMemory:
+    """Bounded history of one chat: recent turns verbatim plus a summary of older ones
+
+    When the window outgrows WINDOW_TURNS or its token share, the oldest
+    turns are folded into the summary. `summarizer(summary, turns)` may
+    return a scheduler ticket for an LLM summary; until it finishes (or if
+    there is no LLM) a short extractive summary of the questions stands in.
+    """
+    def __init__(self, summarizer=None, max_tokens=MEMORY_TOKENS, summary_tokens=SUMMARY_TOKENS,
+                 window_turns=WINDOW_TURNS):
+        self.summarizer = summarizer
+        self.max_tokens = max_tokens
+        self.summary_tokens = summary_tokens
+        self.window_turns = window_turns
+        self.turns = []  # [(question, answer)], oldest first
+        self.summary = ""
+        self.topic_question = None  # Last question asked without leaning on an earlier one, as asked
+        self._topic_embedding = None
+        self._asked = []        # Older questions, for the extractive summary
+        self._evicted = []
+        self._pending = None    # Ticket of a running LLM summary
+        self.summaries = 0
+
+    def __len__(self):
+        return len(self.turns)
+
+    def clear(self):
+        self.turns = []
+        self.summary = ""
+        self.topic_question = None
+        self._topic_embedding = None
+        self._asked = []
+        self._evicted = []
+        self._pending = None
+
+    def add_turn(self, question, answer):
+        self.turns.append((question, _clip(answer, ANSWER_CHARS)))
+        window_budget = self.max_tokens - self.summary_tokens
+        while len(self.turns) > 1 and (len(self.turns) > self.window_turns or self._window_tokens() > window_budget):
+            self._evicted.append(self.turns.pop(0))
+        self._fold_evicted()
+
+    def _window_tokens(self):
+        return sum(estimate_tokens(q) + estimate_tokens(a) for q, a in self.turns)
+
+    def _extractive_summary(self, turns):
+        self._asked.extend(_clip(q, 120) for q, _ in turns)
+        while len(self._asked) > 1 and estimate_tokens("; ".join(self._asked)) > self.summary_tokens:
+            self._asked.pop(0)  # Oldest questions go first
+        return f"Earlier the student asked: {'; '.join(self._asked)}."
+
+    def _fold_evicted(self):
+        self._apply_pending()
+        if not self._evicted or self._pending is not None:
+            return  # Folded in once the running summary is done
+        turns, self._evicted = self._evicted, []
+        previous = self.summary
+        self.summary = self._extractive_summary(turns)
+        if self.summarizer is not None:
+            self._pending = self.summarizer(previous, turns)
+
+    def _apply_pending(self):
+        ticket = self._pending
+        if ticket is None or not ticket.finished:
+            return
+        self._pending = None
+        text = "".join(ticket.tokens).strip()
+        if ticket.error is None and text and not text.startswith("❌"):
+            self.summary = _clip(text, 4 * self.summary_tokens)
+            self.summaries += 1
+
+    def render(self, labels=("Student", "Tutor"), heading="Conversation so far"):
+        """History block for the prompt, or "" for a new chat"""
+        self._apply_pending()
+        if not self.turns and not self.summary:
+            return ""
+        lines = [f"{heading}:"]
+        if self.summary:
+            lines.append(self.summary)
+        for question, answer in self.turns:
+            lines.append(f"{labels[0]}: {question}")
+            lines.append(f"{labels[1]}: {answer}")
+        return "\n".join(lines)
+
+    def is_follow_up(self, question, embed=None):
+        """Whether `question` leans on the topic question
+
+        A question with no search terms of its own ("why?") always does.
+        Otherwise it needs a pronoun near its start ("why is it green?")
+        and, checked with `embed` (text -> embedding), to be close to the
+        topic question; without an embedding model it stands alone.
+        """
+        if not self.topic_question:
+            return False
+        words = TOKEN_PATTERN.findall(question.lower())
+        if not tokenize(question):
+            return True
+        if embed is None or not any(word in FOLLOW_UP_WORDS for word in words[:FOLLOW_UP_LEAD_WORDS]):
+            return False
+        if self._topic_embedding is None:
+            self._topic_embedding = np.asarray(embed(self.topic_question), dtype=np.float32)
+        embedding = np.asarray(embed(question), dtype=np.float32)
+        norms = float(np.linalg.norm(embedding) * np.linalg.norm(self._topic_embedding)) or 1.0
+        return float(embedding @ self._topic_embedding) / norms >= FOLLOW_UP_SIMILARITY
+
+    def rewrite(self, question, embed=None):
+        """`question` with the topic question's terms added when it reads as a follow-up
+
+        "Why is it green?" after "What is chlorophyll?" retrieves (and is
+        cached) as "Why is it green? chlorophyll". Terms only ever come from
+        the topic question as the student asked it, so earlier topics don't
+        pile up.
+        """
+        return self._with_topic(question) if self.is_follow_up(question, embed) else question
+
+    def _with_topic(self, question):
+        present = set(tokenize(question))
+        carried = []
+        for term in tokenize(self.topic_question):
+            if term not in present and term not in carried:
+                carried.append(term)
+        if not carried:
+            return question
+        return f"{question} {' '.join(carried[:TOPIC_TERMS])}"
+
+    def standalone_query(self, question, embed=None):
+        """rewrite() the question; one that isn't a follow-up becomes the topic for the next ones"""
+        if self.is_follow_up(question, embed):
+            return self._with_topic(question)
+        self.topic_question = question
+        self._topic_embedding = None
+        return question
+
+    def get_stats(self):
+        return {
+            'turns': len(self.turns),
+            'summary_tokens': estimate_tokens(self.summary),
+            'memory_tokens': estimate_tokens(self.render()),
+            'llm_summaries': self.summaries
+        }
@@ -27,6 +27,40 @@ def download_all_models():
         print(f"❌ Failed to download embedding model: {e}")
         return False
     
+    # Download re-ranking model
+    print("📥 Downloading re-ranking model...")
+    try:
+        from reranker import CrossEncoderReranker
+        reranker = CrossEncoderReranker()
+        reranker.model.predict([("test", "test")])
+        print(f"✅ Re-ranking model downloaded! ({reranker.model_name})")
+        if not reranker.is_calibrated:
+            from calibrate_reranker import calibrate
+            calibrate()
+        
+    except Exception as e:
+        # Optional - the tutor falls back to retrieval scores without it
+        print(f"⚠️ Failed to download re-ranking model: {e}")
+    
+    # Download speech recognition models for the configured ASR profile and its fallbacks
+    print("📥 Downloading speech recognition models...")
+    try:
+        from faster_whisper import WhisperModel
+        from asr_service import profile_chain, TELUGU_MODEL
+        os.makedirs("./models/whisper", exist_ok=True)
+        for model_name in dict.fromkeys(profile.model for profile in profile_chain()):
+            if model_name == TELUGU_MODEL:
+                if not os.path.isdir(TELUGU_MODEL):
+                    print(f"⚠️ Telugu Whisper not found at {TELUGU_MODEL} - convert it with:")
+                    print(f"   ct2-transformers-converter --model vasista22/whisper-telugu-base --output_dir {TELUGU_MODEL} --quantization int8")
+                continue
+            WhisperModel(model_name, device="cpu", compute_type="int8", download_root="./models/whisper")
+            print(f"✅ Whisper {model_name} downloaded!")
+        
+    except Exception as e:
+        # Optional - voice input is disabled without it
+        print(f"⚠️ Failed to download speech recognition models: {e}")
+    
     print("🎉 All models downloaded successfully!")
     print("🔒 You can now disconnect from internet and run offline!")
     return True
@@ -0,0 +1,106 @@
+import os
+import time
+import threading
+import torch
+from langchain_core.embeddings import Embeddings
+from langchain_community.embeddings import HuggingFaceEmbeddings
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDINGS_DIR = "./models/embeddings"
+DEFAULT_BATCH_SIZE = 32
+
+
+class EmbeddingService(Embeddings):
+    """CPU embedding engine shared by admin ingestion and student queries
+
+    Wraps the MiniLM SentenceTransformer with an explicit batch size and
+    torch thread count. Documents are sorted by length before batching so
+    each batch pads to similar lengths; vectors are returned in input order.
+    With an EmbeddingCache attached, only chunks not seen before are encoded.
+    Drop-in replacement for HuggingFaceEmbeddings (Chroma accepts it as
+    embedding_function).
+    """
+    def __init__(self, model_name=EMBEDDING_MODEL, batch_size=DEFAULT_BATCH_SIZE,
+                 num_threads=None, cache_folder=EMBEDDINGS_DIR, local_files_only=True,
+                 cache=None):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.cache = cache  # Optional EmbeddingCache for document chunks
+        self.num_threads = num_threads or os.cpu_count() or 1
+        torch.set_num_threads(self.num_threads)
+
+        model_kwargs = {'device': 'cpu'}
+        if local_files_only:
+            model_kwargs['local_files_only'] = True
+        self.embeddings = HuggingFaceEmbeddings(
+            model_name=model_name,
+            model_kwargs=model_kwargs,
+            cache_folder=cache_folder
+        )
+        self.model = self.embeddings.client  # Underlying SentenceTransformer
+
+        self._lock = threading.Lock()
+        self.chunks_embedded = 0
+        self.document_seconds = 0.0
+        self.queries_embedded = 0
+        self.query_seconds = 0.0
+
+    def _encode(self, texts):
+        return self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            show_progress_bar=False,
+            convert_to_numpy=True
+        )
+
+    def embed_documents(self, texts):
+        """Embed chunks, batching by length to cut padding waste"""
+        if not texts:
+            return []
+        results = [None] * len(texts)
+
+        # Reuse cached vectors for chunks we've embedded before
+        if self.cache is not None:
+            for index, vector in self.cache.get_many(texts).items():
+                results[index] = vector
+        missing = [i for i, vector in enumerate(results) if vector is None]
+        if not missing:
+            return results
+
+        started = time.perf_counter()
+        order = sorted(missing, key=lambda i: len(texts[i]))
+        vectors = self._encode([texts[i] for i in order])
+        for position, index in enumerate(order):
+            results[index] = vectors[position].tolist()
+
+        with self._lock:
+            self.chunks_embedded += len(order)
+            self.document_seconds += time.perf_counter() - started
+
+        if self.cache is not None:
+            self.cache.put_many([texts[i] for i in order], [results[i] for i in order])
+        return results
+
+    def embed_query(self, text):
+        """Embed a single student question"""
+        started = time.perf_counter()
+        vector = self._encode([text])[0].tolist()
+        with self._lock:
+            self.queries_embedded += 1
+            self.query_seconds += time.perf_counter() - started
+        return vector
+
+    def get_stats(self):
+        """Throughput metrics since startup"""
+        cache_stats = self.cache.get_stats() if self.cache is not None else None
+        with self._lock:
+            return {
+                'model': self.model_name,
+                'batch_size': self.batch_size,
+                'threads': self.num_threads,
+                'chunks_embedded': self.chunks_embedded,
+                'chunks_per_sec': round(self.chunks_embedded / self.document_seconds, 1) if self.document_seconds else 0.0,
+                'queries_embedded': self.queries_embedded,
+                'avg_query_ms': round(1000 * self.query_seconds / self.queries_embedded, 1) if self.queries_embedded else 0.0,
+                'cache': cache_stats
+            }
@@ -0,0 +1,327 @@
+import os
+import time
+import hashlib
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from pdf_extraction import extract_pages
+
+# Pipeline tuning (CPU-only admin machines)
+PAGES_PER_TASK = 8        # Pages handed to one extraction worker at a time
+EMBED_BATCH_SIZE = 256    # Chunks per embedding call (the service length-sorts within it)
+WRITE_BATCH_SIZE = 512    # Vectors per Chroma write
+QUEUE_SIZE = 8            # Bounded queue depth between stages
+MIN_PAGE_CHARS = 100      # Pages with less text are skipped (same as before)
+
+_DONE = object()
+
+
+def page_fingerprint(text):
+    """Content hash of a page, used to detect which pages changed between editions"""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def chunk_id(subject, page, offset):
+    """Stable chunk ID derived from subject, page and character offset"""
+    return f"{subject}:{page}:{offset}"
+
+
+class StageStats:
+    """Throughput counters for one pipeline stage"""
+    def __init__(self, name, unit):
+        self.name = name
+        self.unit = unit
+        self.items = 0
+        self.busy_seconds = 0.0
+
+    @property
+    def throughput(self):
+        return self.items / self.busy_seconds if self.busy_seconds else 0.0
+
+    def as_dict(self):
+        return {
+            'items': self.items,
+            'unit': self.unit,
+            'busy_seconds': round(self.busy_seconds, 3),
+            'throughput': round(self.throughput, 1)
+        }
+
+
+class IngestionReport:
+    """Result of one pipeline run"""
+    def __init__(self):
+        self.total_pages = 0
+        self.text_pages = 0
+        self.chunks = 0
+        self.new_pages = 0
+        self.changed_pages = 0
+        self.unchanged_pages = set()
+        self.removed_pages = 0
+        self.deleted_chunks = 0
+        self.elapsed = 0.0
+        self.stages = {
+            'extract': StageStats('extract', 'pages'),
+            'split': StageStats('split', 'pages'),
+            'embed': StageStats('embed', 'chunks'),
+            'write': StageStats('write', 'chunks')
+        }
+
+    def summary(self):
+        parts = [f"{s.name} {s.throughput:.1f} {s.unit}/s" for s in self.stages.values()]
+        return f"{self.elapsed:.1f}s total | " + " | ".join(parts)
+
+    def as_dict(self):
+        return {
+            'total_pages': self.total_pages,
+            'text_pages': self.text_pages,
+            'chunks': self.chunks,
+            'new_pages': self.new_pages,
+            'changed_pages': self.changed_pages,
+            'unchanged_pages': len(self.unchanged_pages),
+            'removed_pages': self.removed_pages,
+            'deleted_chunks': self.deleted_chunks,
+            'elapsed_seconds': round(self.elapsed, 3),
+            'stages': {name: stats.as_dict() for name, stats in self.stages.items()}
+        }
+
+
+class IngestionPipeline:
+    """Staged ingestion: extract (process pool) -> split -> embed -> batched Chroma writes
+
+    Stages run concurrently and are connected by bounded queues, so vectors
+    start landing in Chroma while later pages are still being extracted.
+    """
+    def __init__(self, embeddings, vectorstore, workers=None,
+                 embed_batch_size=EMBED_BATCH_SIZE, write_batch_size=WRITE_BATCH_SIZE,
+                 chunk_size=1000, chunk_overlap=200):
+        self.embeddings = embeddings
+        self.vectorstore = vectorstore
+        self.workers = workers or os.cpu_count() or 1
+        self.embed_batch_size = embed_batch_size
+        self.write_batch_size = write_batch_size
+        self.text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            add_start_index=True  # Character offset within the page, used for stable chunk IDs
+        )
+
+    def run(self, extraction, metadata, existing_pages=None):
+        """Ingest a PDFExtraction, tagging every chunk with `metadata`. Returns an IngestionReport.
+
+        `existing_pages` maps page number -> {'hash', 'ids'} for a book that is
+        already stored. Pages whose fingerprint is unchanged are skipped
+        entirely; changed pages have their old chunks replaced and pages that
+        disappeared have their chunks deleted.
+        """
+        report = IngestionReport()
+        existing_pages = existing_pages or {}
+        self._abort = threading.Event()
+        self._errors = []
+        started = time.perf_counter()
+
+        page_queue = queue.Queue(maxsize=QUEUE_SIZE * PAGES_PER_TASK)
+        chunk_queue = queue.Queue(maxsize=QUEUE_SIZE)
+        vector_queue = queue.Queue(maxsize=QUEUE_SIZE)
+
+        stages = [
+            (self._extract_stage, (extraction, page_queue, report)),
+            (self._split_stage, (extraction.name, metadata, existing_pages, page_queue, chunk_queue, report)),
+            (self._embed_stage, (chunk_queue, vector_queue, report)),
+            (self._write_stage, (existing_pages, vector_queue, report))
+        ]
+        threads = [
+            threading.Thread(target=self._run_stage, args=(target, args), daemon=True)
+            for target, args in stages
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        report.elapsed = time.perf_counter() - started
+        if self._errors:
+            raise self._errors[0]
+
+        print(f"⚡ Ingestion pipeline: {report.summary()}")
+        return report
+
+    # ---- plumbing ----
+
+    def _run_stage(self, target, args):
+        try:
+            target(*args)
+        except Exception as e:
+            self._errors.append(e)
+            self._abort.set()
+
+    def _put(self, q, item):
+        while not self._abort.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while not self._abort.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    # ---- stages ----
+
+    def _extract_stage(self, extraction, out_queue, report):
+        stats = report.stages['extract']
+        started = time.perf_counter()
+        try:
+            report.total_pages = extraction.page_count
+
+            # Pages already pulled by language detection are not parsed again
+            for page in extraction.extracted_pages():
+                stats.items += 1
+                if not self._put(out_queue, page):
+                    return
+
+            pending = extraction.pending_pages()
+            tasks = [pending[i:i + PAGES_PER_TASK] for i in range(0, len(pending), PAGES_PER_TASK)]
+            workers = min(self.workers, len(tasks))
+
+            if workers <= 1:
+                for page_no in pending:
+                    stats.items += 1
+                    if not self._put(out_queue, (page_no, extraction.page_text(page_no))):
+                        return
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    futures = [pool.submit(extract_pages, extraction.path, task) for task in tasks]
+                    for future in as_completed(futures):
+                        for page in future.result():
+                            stats.items += 1
+                            if not self._put(out_queue, page):
+                                for pending_future in futures:
+                                    pending_future.cancel()
+                                return
+        finally:
+            stats.busy_seconds = time.perf_counter() - started
+            self._put(out_queue, _DONE)
+
+    def _split_stage(self, source, metadata, existing_pages, in_queue, out_queue, report):
+        stats = report.stages['split']
+        try:
+            while True:
+                item = self._get(in_queue)
+                if item is _DONE:
+                    return
+                started = time.perf_counter()
+                page_no, text = item
+                stats.items += 1
+                if len(text.strip()) <= MIN_PAGE_CHARS:
+                    stats.busy_seconds += time.perf_counter() - started
+                    continue
+
+                report.text_pages += 1
+                page_hash = page_fingerprint(text)
+                previous = existing_pages.get(page_no)
+                if previous and previous['hash'] == page_hash:
+                    # Unchanged page - its stored vectors are still valid
+                    report.unchanged_pages.add(page_no)
+                    stats.busy_seconds += time.perf_counter() - started
+                    continue
+                if previous:
+                    report.changed_pages += 1
+                else:
+                    report.new_pages += 1
+
+                page = Document(
+                    page_content=text,
+                    metadata={'source': source, 'page': page_no, 'page_hash': page_hash, **metadata}
+                )
+                chunks = self.text_splitter.split_documents([page])
+                stats.busy_seconds += time.perf_counter() - started
+                if chunks and not self._put(out_queue, chunks):
+                    return
+        finally:
+            self._put(out_queue, _DONE)
+
+    def _embed_stage(self, in_queue, out_queue, report):
+        stats = report.stages['embed']
+        batch = []
+
+        def flush():
+            started = time.perf_counter()
+            vectors = self.embeddings.embed_documents([chunk.page_content for chunk in batch])
+            stats.busy_seconds += time.perf_counter() - started
+            stats.items += len(batch)
+            return self._put(out_queue, (list(batch), vectors))
+
+        try:
+            while True:
+                item = self._get(in_queue)
+                if item is _DONE:
+                    break
+                batch.extend(item)
+                if len(batch) >= self.embed_batch_size:
+                    if not flush():
+                        return
+                    batch.clear()
+            if batch and not self._abort.is_set():
+                flush()
+        finally:
+            self._put(out_queue, _DONE)
+
+    def _write_stage(self, existing_pages, in_queue, report):
+        stats = report.stages['write']
+        collection = self.vectorstore._collection
+        replaced_pages = set()
+        chunks, vectors = [], []
+
+        def delete_stale(page_numbers):
+            stale_ids = [i for page_no in page_numbers for i in existing_pages[page_no]['ids']]
+            if stale_ids:
+                collection.delete(ids=stale_ids)
+                report.deleted_chunks += len(stale_ids)
+
+        def flush():
+            started = time.perf_counter()
+            # Old chunks of a changed page go before its new ones are written
+            pages = {chunk.metadata['page'] for chunk in chunks}
+            delete_stale([p for p in pages if p in existing_pages and p not in replaced_pages])
+            replaced_pages.update(pages)
+
+            collection.upsert(
+                ids=[chunk_id(c.metadata['subject'], c.metadata['page'], c.metadata.get('start_index', 0)) for c in chunks],
+                embeddings=vectors,
+                metadatas=[chunk.metadata for chunk in chunks],
+                documents=[chunk.page_content for chunk in chunks]
+            )
+            stats.busy_seconds += time.perf_counter() - started
+            stats.items += len(chunks)
+            report.chunks += len(chunks)
+
+        while True:
+            item = self._get(in_queue)
+            if item is _DONE:
+                break
+            batch_chunks, batch_vectors = item
+            chunks.extend(batch_chunks)
+            vectors.extend(batch_vectors)
+            if len(chunks) >= self.write_batch_size:
+                flush()
+                chunks, vectors = [], []
+        if self._abort.is_set():
+            return
+        if chunks:
+            flush()
+
+        # Pages that vanished or lost their text in the new edition
+        removed = [
+            page_no for page_no in existing_pages
+            if page_no not in replaced_pages and page_no not in report.unchanged_pages
+        ]
+        report.removed_pages = len(removed)
+        delete_stale(removed)
@@ -0,0 +1,219 @@
+import time
+import threading
+from collections import deque
+import numpy as np
+from lexical_index import TOKEN_PATTERN
+
+QUESTION = 'question'
+CONVERSATIONAL_INTENTS = ('greeting', 'small_talk', 'thanks', 'goodbye', 'acknowledgement')
+
+# Whole phrases, matched on word boundaries. An utterance is conversational
+# only when these phrases (plus FILLER_WORDS) cover every word of it, so
+# "no" or "hi" inside a real question don't count.
+INTENT_PHRASES = {
+    'greeting': [
+        "hi", "hii", "hello", "hey", "hey there", "hello there", "good morning", "good afternoon",
+        "good evening", "namaste", "namaskar", "namaskaram",
+        "నమస్కారం", "నమస్తే", "హలో", "హాయ్", "వందనాలు", "శుభోదయం", "శుభ సాయంత్రం"
+    ],
+    'small_talk': [
+        "how are you", "how are you doing", "how r u", "what's up", "whats up", "what is up", "sup",
+        "who are you", "ఎలా ఉన్నారు", "ఎలా ఉన్నావు", "మీరు ఎలా ఉన్నారు", "బాగున్నారా", "మీరు ఎవరు"
+    ],
+    'thanks': [
+        "thanks", "thank you", "thank u", "thanks a lot", "thank you so much", "thx", "ty",
+        "ధన్యవాదాలు", "ధన్యవాదములు", "థాంక్స్", "థాంక్యూ", "చాలా ధన్యవాదాలు"
+    ],
+    'goodbye': [
+        "bye", "goodbye", "good bye", "bye bye", "see you", "see you later", "see you tomorrow", "good night",
+        "బై", "వెళ్ళొస్తాను", "వెళ్తాను", "మళ్ళీ కలుద్దాం", "శుభ రాత్రి"
+    ],
+    'acknowledgement': [
+        "ok", "okay", "yes", "no", "yeah", "yep", "nope", "got it", "i see", "fine", "cool", "great",
+        "సరే", "అవును", "కాదు", "లేదు", "అర్థమైంది", "ఓకే", "బాగుంది"
+    ]
+}
+FILLER_WORDS = {
+    'sir', 'madam', 'mam', 'maam', 'teacher', 'tutor', 'there', 'everyone', 'all', 'friend', 'dear',
+    'again', 'so', 'much', 'very', 'a', 'lot', 'and', 'ai', 'bot', 'buddy',
+    'గారు', 'సార్', 'మేడమ్', 'అండి', 'టీచర్', 'మరియు'
+}
+
+# Example utterances per intent for the embedding tier
+INTENT_PROTOTYPES = {
+    'greeting': ["hello", "hi there", "good morning teacher", "hey, hope you are well", "నమస్కారం అండి"],
+    'small_talk': ["how are you", "how is it going", "how are you doing today", "who are you", "what is your name"],
+    'thanks': ["thank you so much", "thanks for the help", "that was really helpful", "ధన్యవాదాలు"],
+    'goodbye': ["bye", "see you tomorrow", "I have to go now", "talk to you later", "వెళ్ళొస్తాను"],
+    'acknowledgement': ["ok", "got it", "I understand now", "yes", "alright", "సరే"],
+    QUESTION: [
+        "what is photosynthesis", "explain the water cycle", "why is the sky blue", "how do plants make food",
+        "no I don't understand why", "what is the answer to question 3", "define force",
+        "కిరణజన్య సంయోగక్రియ అంటే ఏమిటి"
+    ]
+}
+EMBEDDING_MAX_WORDS = 6      # Longer utterances that the lexical tier didn't claim are questions
+PROTOTYPE_THRESHOLD = 0.6    # Cosine similarity needed to call an utterance conversational
+PROTOTYPE_MARGIN = 0.05      # ...and by how much it must beat the closest question prototype
+
+
+class IntentResult:
+    def __init__(self, intent, tier, confidence, timings, embedding=None):
+        self.intent = intent
+        self.tier = tier              # 'lexical', 'embedding' or 'default'
+        self.confidence = confidence
+        self.timings = timings        # Microseconds per tier that ran
+        self.embedding = embedding    # Query embedding, when the embedding tier computed one
+
+    @property
+    def is_conversational(self):
+        return self.intent != QUESTION
+
+
+class IntentRouter:
+    """Decides whether an utterance is small talk or a question for the textbooks
+
+    Tier 1 is a word-level Aho-Corasick automaton over INTENT_PHRASES
+    (English and Telugu), built once: one pass over the words finds every
+    phrase, and the utterance gets the intent when phrases and fillers
+    cover all of it. Tier 2 only sees short utterances tier 1 couldn't
+    settle, comparing their embedding with INTENT_PROTOTYPES. Everything
+    else is a question.
+    """
+    def __init__(self, phrases=INTENT_PHRASES, prototypes=INTENT_PROTOTYPES):
+        self._goto = [{}]      # state -> {word: next state}
+        self._fail = [0]
+        self._output = [[]]    # state -> [(phrase length, intent)]
+        for intent, intent_phrases in phrases.items():
+            for phrase in intent_phrases:
+                self._add_phrase(self._words(phrase), intent)
+        self._build_failure_links()
+
+        self.prototypes = prototypes
+        self._prototype_matrix = None
+        self._prototype_intents = None
+        self._prototype_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self.counts = {}
+        self.tier_counts = {'lexical': 0, 'embedding': 0, 'default': 0}
+        self.tier_micros = {'lexical': 0.0, 'embedding': 0.0}
+
+    @staticmethod
+    def _words(text):
+        return TOKEN_PATTERN.findall(text.lower().replace("'", ""))
+
+    def _add_phrase(self, words, intent):
+        state = 0
+        for word in words:
+            if word not in self._goto[state]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][word] = len(self._goto) - 1
+            state = self._goto[state][word]
+        self._output[state].append((len(words), intent))
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())  # Depth-1 states fail back to the root
+        while queue:
+            state = queue.popleft()
+            for word, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and word not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(word, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def find_phrases(self, words):
+        """Every phrase occurrence as (start, end, intent)"""
+        matches = []
+        state = 0
+        for position, word in enumerate(words):
+            while state and word not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(word, 0)
+            for length, intent in self._output[state]:
+                matches.append((position + 1 - length, position + 1, intent))
+        return matches
+
+    def lexical_intent(self, words):
+        """(intent, uncovered word count) - intent is None when no phrase matched"""
+        matches = self.find_phrases(words)
+        if not matches:
+            return None, len(words)
+        covered = [word in FILLER_WORDS for word in words]
+        weight = {}
+        for start, end, intent in matches:
+            covered[start:end] = [True] * (end - start)
+            weight[intent] = weight.get(intent, 0) + (end - start)
+        # The intent covering most words wins; on ties the later phrase ("hi, bye") does
+        intent = max(reversed(matches), key=lambda m: weight[m[2]])[2]
+        return intent, covered.count(False)
+
+    def _ensure_prototypes(self, embeddings):
+        with self._prototype_lock:
+            if self._prototype_matrix is None:
+                texts, intents = [], []
+                for intent, examples in self.prototypes.items():
+                    texts.extend(examples)
+                    intents.extend([intent] * len(examples))
+                matrix = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+                matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+                self._prototype_intents = intents
+                self._prototype_matrix = matrix
+        return self._prototype_matrix, self._prototype_intents
+
+    def embedding_intent(self, text, embeddings):
+        """(intent, similarity, embedding) from the nearest prototypes"""
+        matrix, intents = self._ensure_prototypes(embeddings)
+        embedding = embeddings.embed_query(text)
+        query = np.asarray(embedding, dtype=np.float32)
+        similarities = matrix @ (query / max(float(np.linalg.norm(query)), 1e-12))
+        best = {}
+        for intent, similarity in zip(intents, similarities.tolist()):
+            best[intent] = max(best.get(intent, -1.0), similarity)
+        question_similarity = best.pop(QUESTION, -1.0)
+        intent, similarity = max(best.items(), key=lambda item: item[1])
+        if similarity >= PROTOTYPE_THRESHOLD and similarity >= question_similarity + PROTOTYPE_MARGIN:
+            return intent, similarity, embedding
+        return QUESTION, question_similarity, embedding
+
+    def route(self, text, embeddings=None):
+        timings = {}
+        started = time.perf_counter()
+        words = self._words(text)
+        intent, uncovered = self.lexical_intent(words)
+        timings['lexical_us'] = round(1e6 * (time.perf_counter() - started), 1)
+
+        if intent is not None and uncovered == 0:
+            result = IntentResult(intent, 'lexical', 1.0, timings)
+        elif embeddings is not None and 0 < len(words) <= EMBEDDING_MAX_WORDS:
+            started = time.perf_counter()
+            intent, similarity, embedding = self.embedding_intent(text, embeddings)
+            timings['embedding_us'] = round(1e6 * (time.perf_counter() - started), 1)
+            result = IntentResult(intent, 'embedding', similarity, timings, embedding)
+        else:
+            result = IntentResult(QUESTION, 'default', 1.0, timings)
+        self._record(result)
+        return result
+
+    def _record(self, result):
+        with self._stats_lock:
+            self.counts[result.intent] = self.counts.get(result.intent, 0) + 1
+            self.tier_counts[result.tier] += 1
+            self.tier_micros['lexical'] += result.timings['lexical_us']
+            self.tier_micros['embedding'] += result.timings.get('embedding_us', 0.0)
+
+    def get_stats(self):
+        with self._stats_lock:
+            routed = sum(self.tier_counts.values())
+            embedded = self.tier_counts['embedding']
+            return {
+                'routed': routed,
+                'intents': dict(self.counts),
+                'tiers': dict(self.tier_counts),
+                'avg_lexical_us': round(self.tier_micros['lexical'] / routed, 1) if routed else 0.0,
+                'avg_embedding_ms': round(self.tier_micros['embedding'] / embedded / 1000, 2) if embedded else 0.0
+            }
@@ -0,0 +1,208 @@
+import os
+import re
+import json
+import math
+import time
+import heapq
+import hashlib
+import threading
+
+LEXICAL_DIR = "./ai_tutor_lexical"
+
+# Indic blocks are listed explicitly so vowel signs (not \w) stay inside Telugu words
+TOKEN_PATTERN = re.compile(r"[\w\u0900-\u0dff]+")
+STOPWORDS = {
+    'a', 'an', 'the', 'and', 'or', 'of', 'to', 'in', 'on', 'at', 'for', 'by', 'with', 'from',
+    'is', 'are', 'was', 'were', 'be', 'been', 'it', 'its', 'this', 'that', 'these', 'those',
+    'what', 'which', 'who', 'how', 'why', 'when', 'where', 'do', 'does', 'did', 'can', 'i',
+    'me', 'my', 'you', 'your', 'about', 'explain', 'tell', 'please'
+}
+
+
+def tokenize(text):
+    """Lowercased word tokens without stopwords (works for English and Telugu)"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Fuse ranked lists of keys - returns [(key, score)] best first
+
+    Each key scores sum(1 / (k + rank)) over the lists it appears in, so
+    agreement between retrievers matters more than raw score scales.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, 1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class SubjectIndex:
+    """BM25 inverted index over the chunks of one textbook"""
+    def __init__(self, subject, ids, texts, metadatas, postings, k1=1.5, b=0.75):
+        self.subject = subject
+        self.ids = ids
+        self.texts = texts
+        self.metadatas = metadatas
+        self.postings = postings  # term -> [[doc indexes], [term frequencies]]
+        self.k1 = k1
+
+        lengths = [0] * len(ids)
+        for docs, freqs in postings.values():
+            for doc, freq in zip(docs, freqs):
+                lengths[doc] += freq
+        average = (sum(lengths) / len(lengths)) if lengths else 1.0
+        # Length normalization is fixed per document, so fold it in once
+        self.norms = [k1 * (1 - b + b * length / (average or 1.0)) for length in lengths]
+        self.idf = {
+            term: math.log(1 + (len(ids) - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, (docs, _) in postings.items()
+        }
+
+    @classmethod
+    def build(cls, subject, ids, texts, metadatas):
+        postings = {}
+        for doc, text in enumerate(texts):
+            counts = {}
+            for token in tokenize(text):
+                counts[token] = counts.get(token, 0) + 1
+            for term, freq in counts.items():
+                entry = postings.setdefault(term, [[], []])
+                entry[0].append(doc)
+                entry[1].append(freq)
+        return cls(subject, list(ids), list(texts), list(metadatas), postings)
+
+    def score(self, terms):
+        """BM25 score of every chunk matching at least one term - {doc index: score}"""
+        scores = {}
+        k1_plus_1 = self.k1 + 1
+        norms = self.norms
+        for term in terms:
+            entry = self.postings.get(term)
+            if entry is None:
+                continue
+            idf = self.idf[term]
+            for doc, freq in zip(*entry):
+                scores[doc] = scores.get(doc, 0.0) + idf * freq * k1_plus_1 / (freq + norms[doc])
+        return scores
+
+    def to_dict(self):
+        return {
+            'subject': self.subject,
+            'ids': self.ids,
+            'texts': self.texts,
+            'metadatas': self.metadatas,
+            'postings': self.postings
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['subject'], data['ids'], data['texts'], data['metadatas'], data['postings'])
+
+
+class LexicalIndex:
+    """Per-subject keyword indexes persisted next to the vector database
+
+    Built by the admin panel at ingest time (one JSON file per textbook) and
+    loaded by student sessions, which pick up admin changes via refresh().
+    Catches exact textbook terms - names, places, chapter keywords - that
+    MiniLM embeddings blur, and works without the embedding model at all.
+    """
+    def __init__(self, directory=LEXICAL_DIR):
+        self.directory = directory
+        self.subjects = {}
+        self._mtimes = {}  # file path -> mtime it was loaded at
+        self._lock = threading.Lock()
+        self.searches = 0
+        self.search_seconds = 0.0
+        self.refresh()
+
+    def path_for(self, subject):
+        digest = hashlib.sha1(subject.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def refresh(self):
+        """Load index files that are new or changed on disk and forget deleted ones"""
+        if not os.path.isdir(self.directory):
+            with self._lock:
+                self.subjects = {}
+                self._mtimes = {}
+            return
+        current = {}
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                current[entry.path] = entry.stat().st_mtime
+        if current == self._mtimes:
+            return
+
+        with self._lock:
+            subjects = {s: index for s, index in self.subjects.items() if self.path_for(s) in current}
+            for path, mtime in current.items():
+                if self._mtimes.get(path) == mtime:
+                    continue
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        index = SubjectIndex.from_dict(json.load(f))
+                    subjects[index.subject] = index
+                except Exception as e:
+                    print(f"⚠️ Could not load keyword index {path}: {e}")
+            self.subjects = subjects
+            self._mtimes = current
+
+    def build_subject(self, subject, ids, texts, metadatas):
+        """(Re)build and persist the index for one textbook"""
+        index = SubjectIndex.build(subject, ids, texts, metadatas)
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path_for(subject)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(index.to_dict(), f, ensure_ascii=False)
+        os.replace(temp_path, path)
+        with self._lock:
+            self.subjects[subject] = index
+            self._mtimes[path] = os.path.getmtime(path)
+        return index
+
+    def remove_subject(self, subject):
+        path = self.path_for(subject)
+        if os.path.exists(path):
+            os.remove(path)
+        with self._lock:
+            self.subjects.pop(subject, None)
+            self._mtimes.pop(path, None)
+
+    def clear(self):
+        for subject in list(self.subjects):
+            self.remove_subject(subject)
+
+    def search(self, query, subjects=None, k=10):
+        """Top-k BM25 hits - [{'id', 'score', 'text', 'metadata'}] best first"""
+        started = time.perf_counter()
+        terms = set(tokenize(query))
+        with self._lock:
+            indexes = [self.subjects[s] for s in (subjects or self.subjects) if s in self.subjects]
+
+        candidates = []
+        for index in indexes:
+            for doc, score in index.score(terms).items():
+                candidates.append((score, index, doc))
+        best = heapq.nlargest(k, candidates, key=lambda c: c[0])
+        hits = [
+            {'id': index.ids[doc], 'score': score, 'text': index.texts[doc], 'metadata': index.metadatas[doc]}
+            for score, index, doc in best
+        ]
+
+        with self._lock:
+            self.searches += 1
+            self.search_seconds += time.perf_counter() - started
+        return hits
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'subjects': len(self.subjects),
+                'chunks': sum(len(index.ids) for index in self.subjects.values()),
+                'terms': sum(len(index.postings) for index in self.subjects.values()),
+                'searches': self.searches,
+                'avg_search_ms': round(1000 * self.search_seconds / self.searches, 3) if self.searches else 0.0
+            }
@@ -0,0 +1,186 @@
+import os
+import time
+import heapq
+import itertools
+import threading
+
+PRIORITY_INTERACTIVE = 0   # A student is waiting on the answer
+PRIORITY_BACKGROUND = 10   # Housekeeping (summaries etc.) - runs when nobody is waiting
+
+# Ollama's own setting for parallel requests is a sensible default for our slots
+DEFAULT_MAX_CONCURRENT = int(os.environ.get('OLLAMA_NUM_PARALLEL', '1') or 1)
+DEFAULT_MAX_QUEUE = 24
+
+
+class SchedulerBusy(Exception):
+    """Raised instead of queueing when the generation queue is full"""
+    def __init__(self, queue_length, estimated_wait):
+        super().__init__(f"LLM queue full ({queue_length} waiting, ~{estimated_wait:.0f}s)")
+        self.queue_length = queue_length
+        self.estimated_wait = estimated_wait
+
+
+class GenerationTicket:
+    """Handle for one queued generation, shared by every caller of a coalesced prompt
+
+    Tokens are buffered as they arrive, so each subscriber can iterate the
+    full stream from the start no matter when it joined.
+    """
+    def __init__(self, scheduler, key, token_fn, priority, seq, details=None):
+        self.key = key
+        self.details = details if details is not None else {}  # Filled in by token_fn, e.g. Ollama timings
+        self.priority = priority
+        self.seq = seq
+        self.subscribers = 1
+        self.submitted = time.perf_counter()
+        self.started = None
+        self.finished = False
+        self.error = None
+        self.tokens = []
+        self._scheduler = scheduler
+        self._token_fn = token_fn
+        self._cond = threading.Condition()
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    def position(self):
+        """1-based place in the waiting queue, 0 once generation has started"""
+        return self._scheduler.position_of(self)
+
+    def estimated_wait(self):
+        """Rough seconds until this generation starts"""
+        return self._scheduler.estimate_wait(self.position())
+
+    def iter_tokens(self):
+        """Yield tokens as they're generated (raises the generation error, if any)"""
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self.tokens) and not self.finished:
+                    self._cond.wait()
+                if index < len(self.tokens):
+                    token = self.tokens[index]
+                    index += 1
+                elif self.error is not None:
+                    raise self.error
+                else:
+                    return
+            yield token
+
+    def result(self):
+        """Block until done and return the full text"""
+        return "".join(self.iter_tokens())
+
+    def _push(self, token):
+        with self._cond:
+            self.tokens.append(token)
+            self._cond.notify_all()
+
+    def _finish(self, error=None):
+        with self._cond:
+            self.error = error
+            self.finished = True
+            self._cond.notify_all()
+
+
+class GenerationScheduler:
+    """Bounded priority queue in front of the local LLM
+
+    At most `max_concurrent` generations run at once. Identical prompts
+    already queued or running are coalesced onto one ticket, and callers
+    get their queue position and an estimated wait instead of timing out
+    silently. When `max_queue` tickets are waiting, submit() raises
+    SchedulerBusy.
+    """
+    def __init__(self, max_concurrent=DEFAULT_MAX_CONCURRENT, max_queue=DEFAULT_MAX_QUEUE):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._work_ready = threading.Condition(self._lock)
+        self._heap = []
+        self._inflight = {}  # key -> ticket, queued or running
+        self._running = set()
+        self._seq = itertools.count()
+
+        self.avg_generation_seconds = 20.0  # Initial guess, refined as generations finish
+        self.completed = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+        for i in range(self.max_concurrent):
+            threading.Thread(target=self._worker, name=f"llm-slot-{i}", daemon=True).start()
+
+    def submit(self, key, token_fn, priority=PRIORITY_INTERACTIVE, details=None):
+        """Queue `token_fn()` (an iterator of tokens) and return its ticket
+
+        `details` becomes `ticket.details`; a coalesced caller gets the
+        first submitter's ticket, and so its details.
+        """
+        with self._lock:
+            ticket = self._inflight.get(key)
+            if ticket is not None:
+                ticket.subscribers += 1
+                self.coalesced += 1
+                return ticket
+
+            if len(self._heap) >= self.max_queue:
+                self.rejected += 1
+                raise SchedulerBusy(len(self._heap), self.estimate_wait(len(self._heap) + 1))
+
+            ticket = GenerationTicket(self, key, token_fn, priority, next(self._seq), details)
+            heapq.heappush(self._heap, ticket)
+            self._inflight[key] = ticket
+            self._work_ready.notify()
+            return ticket
+
+    def position_of(self, ticket):
+        with self._lock:
+            if ticket.started is not None or ticket.finished:
+                return 0
+            return 1 + sum(1 for other in self._heap if other < ticket)
+
+    def estimate_wait(self, position):
+        if position <= 0:
+            return 0.0
+        # Every slot is busy until our turn comes up
+        rounds = (position - 1) // self.max_concurrent + 1
+        return rounds * self.avg_generation_seconds
+
+    def _worker(self):
+        while True:
+            with self._lock:
+                while not self._heap:
+                    self._work_ready.wait()
+                ticket = heapq.heappop(self._heap)
+                ticket.started = time.perf_counter()
+                self._running.add(ticket)
+
+            error = None
+            try:
+                for token in ticket._token_fn():
+                    ticket._push(token)
+            except Exception as e:
+                error = e
+            finally:
+                elapsed = time.perf_counter() - ticket.started
+                with self._lock:
+                    self._running.discard(ticket)
+                    if self._inflight.get(ticket.key) is ticket:
+                        del self._inflight[ticket.key]
+                    self.completed += 1
+                    # Exponential moving average keeps the wait estimate current
+                    self.avg_generation_seconds = 0.8 * self.avg_generation_seconds + 0.2 * elapsed
+                ticket._finish(error)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'running': len(self._running),
+                'queued': len(self._heap),
+                'completed': self.completed,
+                'coalesced': self.coalesced,
+                'rejected': self.rejected,
+                'avg_generation_seconds': round(self.avg_generation_seconds, 1)
+            }
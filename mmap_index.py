@@ -0,0 +1,249 @@
+import os
+import json
+import math
+import time
+import shutil
+import numpy as np
+from numpy.lib.format import open_memmap
+from langchain_core.documents import Document
+from vector_store import read_records
+from quantized_index import quantize, int8_scale, top_candidates, BLOCK_ROWS, RERANK_FACTOR
+
+INDEX_DIR = "./ai_tutor_index"
+MANIFEST_FILE = "manifest.json"
+IVF_MIN_VECTORS = 20000  # Below this a flat scan is already fast enough
+DEFAULT_NPROBE = 8       # Inverted lists scanned per query
+
+
+def read_manifest(directory=INDEX_DIR):
+    """Manifest of the exported read-only index, or None if there isn't one"""
+    path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _nearest_lists(vectors, centroids):
+    centroid_half_norms = 0.5 * np.einsum('ij,ij->i', centroids, centroids)
+    return np.argmax(vectors @ centroids.T - centroid_half_norms, axis=1)
+
+
+def train_centroids(vectors, nlist, iterations=10, sample_size=100000, seed=0):
+    """k-means centroids for the inverted lists, trained on a sample of rows"""
+    rng = np.random.default_rng(seed)
+    sample_rows = np.sort(rng.choice(len(vectors), min(len(vectors), sample_size), replace=False))
+    sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = _nearest_lists(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        counts = np.bincount(assignment, minlength=nlist)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]  # Empty lists keep their centroid
+    return centroids
+
+
+def export_index(vectorstore, directory=INDEX_DIR, dtype='float32', ivf=None):
+    """Write a read-only, memory-mappable copy of every textbook vector
+
+    Files (all under `directory`):
+      vectors.npy       float32 rows, grouped by subject then inverted list
+      codes.npy         the same rows as int8/float16 (when dtype isn't float32)
+      scale.npy         int8 per-dimension scale
+      half_norms.npy    |x|^2 / 2 per row, for L2 ranking by dot products
+      centroids.npy     IVF centroids (IVF only)
+      list_offsets.npy  first row of every (subject, list) pair
+      records.bin       one JSON [id, metadata, text] per row, back to back
+      record_offsets.npy byte offset of every record
+      manifest.json     dtype, sizes, subject order, export time
+    The index is built in a staging directory and swapped in at the end,
+    so readers never see a half-written export.
+    """
+    started = time.perf_counter()
+    total = vectorstore.count()
+    if total == 0:
+        raise ValueError("No vectors to export")
+
+    staging = f"{directory}.tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    # Pass over the store: float32 rows to a scratch memmap, records to memory
+    ids, metadatas, documents = [], [], []
+    raw = None
+    count = 0
+    for store in vectorstore.collections():
+        for page in read_records(store._collection):
+            block = np.asarray(page['embeddings'], dtype=np.float32)
+            if raw is None:
+                raw = open_memmap(os.path.join(staging, "raw.npy"), mode='w+', dtype=np.float32, shape=(total, block.shape[1]))
+            raw[count:count + len(block)] = block
+            count += len(block)
+            ids.extend(page['ids'])
+            metadatas.extend(page['metadatas'])
+            documents.extend(page['documents'])
+    dimensions = raw.shape[1]
+
+    subjects = sorted({str(m.get('subject')) for m in metadatas})
+    subject_number = {subject: i for i, subject in enumerate(subjects)}
+    subject_of = np.asarray([subject_number[str(m.get('subject'))] for m in metadatas], dtype=np.int64)
+
+    use_ivf = count >= IVF_MIN_VECTORS if ivf is None else ivf
+    nlist = max(1, min(count, int(4 * math.sqrt(count)))) if use_ivf else 1
+    lists = np.zeros(count, dtype=np.int64)
+    centroids = None
+    if use_ivf:
+        centroids = train_centroids(raw[:count], nlist)
+        for start in range(0, count, BLOCK_ROWS):
+            lists[start:start + BLOCK_ROWS] = _nearest_lists(np.asarray(raw[start:start + BLOCK_ROWS]), centroids)
+
+    order = np.lexsort((lists, subject_of))  # Subject first, then inverted list
+
+    vectors = open_memmap(os.path.join(staging, "vectors.npy"), mode='w+', dtype=np.float32, shape=(count, dimensions))
+    abs_max = np.zeros(dimensions, dtype=np.float32)
+    for start in range(0, count, BLOCK_ROWS):
+        block = raw[order[start:start + BLOCK_ROWS]]
+        vectors[start:start + len(block)] = block
+        abs_max = np.maximum(abs_max, np.abs(block).max(axis=0))
+
+    scale = int8_scale(abs_max) if dtype == 'int8' else None
+    codes = vectors
+    if dtype != 'float32':
+        codes = open_memmap(os.path.join(staging, "codes.npy"), mode='w+', dtype=np.dtype(dtype), shape=(count, dimensions))
+    half_norms = np.zeros(count, dtype=np.float32)
+    for start in range(0, count, BLOCK_ROWS):
+        block = np.asarray(vectors[start:start + BLOCK_ROWS])
+        if dtype != 'float32':
+            block_codes, _ = quantize(block, dtype, scale)
+            codes[start:start + len(block)] = block_codes
+            block = block_codes.astype(np.float32) * (scale if scale is not None else 1.0)
+        half_norms[start:start + len(block)] = 0.5 * np.einsum('ij,ij->i', block, block)
+    np.save(os.path.join(staging, "half_norms.npy"), half_norms)
+    if scale is not None:
+        np.save(os.path.join(staging, "scale.npy"), scale)
+    if centroids is not None:
+        np.save(os.path.join(staging, "centroids.npy"), centroids)
+
+    counts = np.zeros((len(subjects), nlist), dtype=np.int64)
+    np.add.at(counts, (subject_of, lists), 1)
+    ends = counts.reshape(-1).cumsum().reshape(len(subjects), nlist)
+    list_offsets = np.concatenate([(ends - counts)[:, :1], ends], axis=1)  # [start, end of list 0, end of list 1, ...]
+    np.save(os.path.join(staging, "list_offsets.npy"), list_offsets)
+
+    record_offsets = np.zeros(count + 1, dtype=np.int64)
+    with open(os.path.join(staging, "records.bin"), 'wb') as f:
+        for row, i in enumerate(order):
+            data = json.dumps([ids[i], metadatas[i], documents[i]], ensure_ascii=False).encode('utf-8')
+            f.write(data)
+            record_offsets[row + 1] = record_offsets[row] + len(data)
+    np.save(os.path.join(staging, "record_offsets.npy"), record_offsets)
+
+    for array in (vectors, codes, raw):
+        array.flush()
+    del raw, vectors, codes
+    os.remove(os.path.join(staging, "raw.npy"))
+
+    manifest = {
+        'dtype': dtype,
+        'count': int(count),
+        'dimensions': int(dimensions),
+        'ivf': bool(use_ivf),
+        'nlist': int(nlist),
+        'ivf_setting': ivf,  # None = automatic, reused when the admin re-exports
+        'subjects': subjects,
+        'created_at': time.time(),
+        'export_seconds': round(time.perf_counter() - started, 2)
+    }
+    with open(os.path.join(staging, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+    previous = f"{directory}.old"
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(directory):
+        os.replace(directory, previous)
+    os.replace(staging, directory)
+    shutil.rmtree(previous, ignore_errors=True)
+    return manifest
+
+
+class MmapIndex:
+    """Read-only textbook index searched with numpy, without Chroma
+
+    Everything is memory-mapped, so opening it is near-instant and every
+    student process on a machine shares the same pages through the OS
+    cache. Flat exports scan the selected subjects' rows; IVF exports scan
+    only the `nprobe` inverted lists nearest to the query. int8/float16
+    exports rank on the compact codes and re-rank with the float32 rows.
+    """
+    def __init__(self, directory=INDEX_DIR, nprobe=DEFAULT_NPROBE):
+        self.directory = directory
+        self.nprobe = nprobe
+        self.manifest = read_manifest(directory)
+        if self.manifest is None:
+            raise FileNotFoundError(f"No exported index in {directory}")
+
+        def path(name):
+            return os.path.join(directory, name)
+
+        self.dtype = self.manifest['dtype']
+        self.vectors = np.load(path("vectors.npy"), mmap_mode='r')
+        self.codes = np.load(path("codes.npy"), mmap_mode='r') if self.dtype != 'float32' else self.vectors
+        self.scale = np.load(path("scale.npy")) if os.path.exists(path("scale.npy")) else None
+        self.half_norms = np.load(path("half_norms.npy"), mmap_mode='r')
+        self.centroids = np.load(path("centroids.npy")) if self.manifest['ivf'] else None
+        self.list_offsets = np.load(path("list_offsets.npy"))
+        self.records = np.memmap(path("records.bin"), dtype=np.uint8, mode='r')
+        self.record_offsets = np.load(path("record_offsets.npy"), mmap_mode='r')
+        self.subject_number = {subject: i for i, subject in enumerate(self.manifest['subjects'])}
+
+    def _ranges(self, query, subjects):
+        numbers = [self.subject_number[s] for s in subjects if s in self.subject_number] if subjects \
+            else range(len(self.subject_number))
+        if self.centroids is None:
+            lists = [0]
+        else:
+            closeness = self.centroids @ query - 0.5 * np.einsum('ij,ij->i', self.centroids, self.centroids)
+            nprobe = min(self.nprobe, len(closeness))
+            lists = np.argpartition(-closeness, nprobe - 1)[:nprobe].tolist()
+        ranges = []
+        for number in numbers:
+            offsets = self.list_offsets[number]
+            for l in lists:
+                if offsets[l + 1] > offsets[l]:
+                    ranges.append((int(offsets[l]), int(offsets[l + 1])))
+        return ranges
+
+    def record(self, row):
+        """(id, metadata, text) of one row"""
+        start, stop = self.record_offsets[row], self.record_offsets[row + 1]
+        return json.loads(self.records[start:stop].tobytes().decode('utf-8'))
+
+    def search(self, embedding, k=3, subjects=None, rerank_factor=RERANK_FACTOR):
+        """Nearest chunks as [(document, squared L2 distance)], best first"""
+        query = np.asarray(embedding, dtype=np.float32)
+        candidates = k * rerank_factor if self.dtype != 'float32' else k
+        rows = top_candidates(self.codes, self.scale, self.half_norms, query, self._ranges(query, subjects), candidates)
+        if not len(rows):
+            return []
+
+        rows = np.sort(rows)  # Sequential reads from the mapped file
+        distances = np.sum((np.asarray(self.vectors[rows]) - query) ** 2, axis=1)
+        results = []
+        for i in np.argsort(distances)[:k]:
+            record_id, metadata, text = self.record(rows[i])
+            results.append((Document(id=record_id, page_content=text, metadata=metadata), float(distances[i])))
+        return results
+
+    def get_stats(self):
+        file_bytes = sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.is_file())
+        return {
+            'dtype': self.dtype,
+            'vectors': self.manifest['count'],
+            'ivf': self.manifest['ivf'],
+            'nlist': self.manifest['nlist'],
+            'nprobe': self.nprobe if self.manifest['ivf'] else None,
+            'size_mb': round(file_bytes / 1024 / 1024, 2),
+            'created_at': self.manifest['created_at']
+        }
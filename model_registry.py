@@ -0,0 +1,60 @@
+import threading
+
+
+class ModelRegistry:
+    """Process-wide, thread-safe home for heavy shared resources
+
+    Streamlit runs every browser session in its own thread but inside one
+    process. Models registered here (embeddings, Whisper, TTS, the Chroma
+    handle) are loaded once per process and handed to every session, so
+    per-session backends only carry language and chat state.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items = {}
+        self._versions = {}
+        self._key_locks = {}
+
+    def lock_for(self, key):
+        """Lock guarding one resource (also used to serialize non thread-safe use)"""
+        with self._lock:
+            if key not in self._key_locks:
+                self._key_locks[key] = threading.RLock()
+            return self._key_locks[key]
+
+    def get(self, key, factory, version=None):
+        """Return the shared resource for `key`, creating it with `factory()` on first use
+
+        Loading happens under a per-key lock, so two sessions asking for
+        Whisper at once load it once, while a slow Whisper load doesn't
+        block sessions that only need embeddings. Failed loads are not
+        cached and will be retried by the next caller. Passing a different
+        `version` (e.g. a file mtime) replaces the cached resource.
+        """
+        with self._lock:
+            if key in self._items and self._versions.get(key) == version:
+                return self._items[key]
+        with self.lock_for(key):
+            with self._lock:
+                if key in self._items and self._versions.get(key) == version:
+                    return self._items[key]
+            item = factory()
+            with self._lock:
+                self._items[key] = item
+                self._versions[key] = version
+            return item
+
+    def reset(self, key):
+        """Forget a resource so the next get() reloads it"""
+        with self._lock:
+            self._items.pop(key, None)
+            self._versions.pop(key, None)
+
+    def loaded(self):
+        """Keys of resources currently loaded"""
+        with self._lock:
+            return list(self._items)
+
+
+# Shared by every session in this process
+registry = ModelRegistry()
@@ -6,6 +6,7 @@ from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Chroma
 import requests
 import json
+from ollama_client import get_client
 
 warnings.filterwarnings('ignore')
 
@@ -27,22 +28,15 @@ class AITextbookTutor:
     def check_llama(self):
         """Check if Llama 3.2 is available"""
         try:
-            response = requests.get("http://localhost:11434/api/tags", timeout=5)
-            if response.status_code == 200:
-                models = response.json().get('models', [])
-                model_names = [model['name'] for model in models]
-                
-                if any('llama3.2' in name for name in model_names):
-                    print("✅ Llama 3.2 found and ready!")
-                    self.llm_available = True
-                    self.model_name = "llama3.2"
-                else:
-                    print("⚠️  Llama 3.2 not found, using available model")
-                    self.llm_available = True if models else False
-                    self.model_name = model_names[0].split(':')[0] if models else ""
+            self.model_name = get_client().detect_model(timeout=5)
+            if self.model_name == "llama3.2":
+                print("✅ Llama 3.2 found and ready!")
             else:
-                print("❌ Ollama not responding")
-                self.llm_available = False
+                print("⚠️  Llama 3.2 not found, using available model")
+            self.llm_available = bool(self.model_name)
+        except requests.exceptions.HTTPError:
+            print("❌ Ollama not responding")
+            self.llm_available = False
         except:
             print("❌ Ollama not running")
             self.llm_available = False
@@ -62,17 +56,13 @@ Student Question: {prompt}
 Provide a clear, friendly explanation. Use simple language and examples when helpful."""
         
         try:
-            response = requests.post(
-                "http://localhost:11434/api/generate",
-                json={
-                    "model": self.model_name,
-                    "prompt": full_prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.3,
-                        "top_p": 0.9,
-                        "num_predict": 500
-                    }
+            response = get_client().generate(
+                self.model_name,
+                full_prompt,
+                options={
+                    "temperature": 0.3,
+                    "top_p": 0.9,
+                    "num_predict": 500
                 },
                 timeout=60
             )
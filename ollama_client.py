@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import random
+import threading
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+DEFAULT_HOST = "http://localhost:11434"
+CONNECT_TIMEOUT = 3  # Seconds - Ollama is local, so a slow connect means it's down
+
+
+def resolve_host(host=None):
+    """Ollama base URL from the argument, $OLLAMA_HOST or the local default"""
+    host = host or os.environ.get('OLLAMA_HOST') or DEFAULT_HOST
+    if "://" not in host:
+        host = f"http://{host}"
+    return host.rstrip('/')
+
+
+def never_reached_server(error):
+    """True when a ConnectionError happened before any of the request was sent"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = error.args[0] if error.args else None
+    reason = getattr(reason, 'reason', reason)  # requests wraps urllib3's MaxRetryError
+    return isinstance(reason, urllib3.exceptions.NewConnectionError)
+
+
+class OllamaClient:
+    """Shared HTTP client for the local Ollama server
+
+    One pooled keep-alive session for every backend, with per-call
+    timeouts, retry with jittered exponential backoff on connection
+    failures, and latency/error counters.
+    """
+    def __init__(self, host=None, pool_size=8, max_retries=2, backoff_seconds=0.5):
+        self.host = resolve_host(host)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.latency_seconds = 0.0
+        self.last_error = None
+
+    def _record(self, latency=None, error=None, retried=False):
+        with self._lock:
+            if retried:
+                self.retries += 1
+            if error is not None:
+                self.errors += 1
+                self.last_error = str(error)
+            if latency is not None:
+                self.requests += 1
+                self.latency_seconds += latency
+
+    def _request(self, method, path, timeout, retries=None, **kwargs):
+        """Send one request, retrying connection failures with jittered backoff
+
+        GETs are retried on any connection failure. Other requests only when
+        the connection was never made (refused or timed out connecting) - a
+        connection dropped mid-request may already have started a generation,
+        and running it twice would take a second scheduler slot. Read timeouts
+        are not retried - the model was busy generating and a second attempt
+        would only double the wait.
+        """
+        retries = self.max_retries if retries is None else retries
+        for attempt in range(retries + 1):
+            started = time.perf_counter()
+            try:
+                response = self.session.request(
+                    method,
+                    f"{self.host}{path}",
+                    timeout=(CONNECT_TIMEOUT, timeout),
+                    **kwargs
+                )
+                self._record(latency=time.perf_counter() - started)
+                return response
+            except requests.exceptions.ConnectionError as e:
+                self._record(error=e)
+                if attempt == retries or (method != "GET" and not never_reached_server(e)):
+                    raise
+                delay = self.backoff_seconds * (2 ** attempt) * random.uniform(0.5, 1.5)
+                self._record(retried=True)
+                time.sleep(delay)
+            except requests.exceptions.RequestException as e:
+                self._record(error=e)
+                raise
+
+    def list_models(self, timeout=3):
+        """Names of the models installed in Ollama"""
+        response = self._request("GET", "/api/tags", timeout=timeout, retries=0)
+        response.raise_for_status()
+        return [model['name'] for model in response.json().get('models', [])]
+
+    def detect_model(self, preferred="llama3.2", timeout=3):
+        """Pick the model to use: `preferred` if installed, else the first one, else ""
+
+        Raises requests exceptions if Ollama isn't reachable.
+        """
+        model_names = self.list_models(timeout=timeout)
+        if any(preferred in name for name in model_names):
+            return preferred
+        if model_names:
+            return model_names[0].split(':')[0]
+        return ""
+
+    def generate(self, model, prompt, options=None, timeout=60, **extra):
+        """Non-streaming /api/generate. Returns the raw response."""
+        payload = {"model": model, "prompt": prompt, "stream": False, "options": options or {}}
+        payload.update(extra)
+        return self._request("POST", "/api/generate", timeout=timeout, json=payload)
+
+    def generate_stream(self, model, prompt, options=None, timeout=60, **extra):
+        """Streaming /api/generate - yields one decoded JSON object per line
+
+        Raises requests.HTTPError on a non-200 status before anything is yielded.
+        """
+        payload = {"model": model, "prompt": prompt, "stream": True, "options": options or {}}
+        payload.update(extra)
+        response = self._request("POST", "/api/generate", timeout=timeout, json=payload, stream=True)
+        with response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                yield data
+                if data.get('done'):
+                    break
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'host': self.host,
+                'requests': self.requests,
+                'errors': self.errors,
+                'retries': self.retries,
+                'avg_latency_ms': round(1000 * self.latency_seconds / self.requests, 1) if self.requests else 0.0,
+                'last_error': self.last_error
+            }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Process-wide OllamaClient shared by all backends"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OllamaClient()
+        return _client
@@ -0,0 +1,77 @@
+import os
+import hashlib
+
+TEMP_DIR = "./temp"
+
+
+def extract_pages(pdf_path, page_numbers):
+    """Extract text of the given pages - runs inside a worker process"""
+    from pypdf import PdfReader
+    reader = PdfReader(pdf_path)
+    return [(page_no, reader.pages[page_no].extract_text() or "") for page_no in page_numbers]
+
+
+class PDFExtraction:
+    """Lazily extracted pages of one uploaded PDF
+
+    The upload is written to disk and parsed once. Pages are only extracted
+    when someone iterates over them, and every extracted page is kept, so
+    language detection can read the first few pages and ingestion carries on
+    from there without parsing them again.
+    """
+    def __init__(self, pdf_file):
+        self._data = pdf_file.getvalue()
+        self.name = getattr(pdf_file, 'name', 'upload.pdf')
+        self.digest = hashlib.md5(self._data).hexdigest()
+        self._path = None
+        self._reader = None
+        self._pages = {}
+
+    @property
+    def path(self):
+        """Temporary copy on disk (written on first use, read by extraction workers)"""
+        if self._path is None:
+            os.makedirs(TEMP_DIR, exist_ok=True)
+            self._path = os.path.join(TEMP_DIR, f"{self.digest}.pdf")
+            with open(self._path, "wb") as f:
+                f.write(self._data)
+        return self._path
+
+    @property
+    def reader(self):
+        if self._reader is None:
+            from pypdf import PdfReader
+            self._reader = PdfReader(self.path)
+        return self._reader
+
+    @property
+    def page_count(self):
+        return len(self.reader.pages)
+
+    def page_text(self, page_no):
+        """Text of one page, extracted on first access"""
+        if page_no not in self._pages:
+            self._pages[page_no] = self.reader.pages[page_no].extract_text() or ""
+        return self._pages[page_no]
+
+    def iter_pages(self, limit=None):
+        """Yield (page_no, text) in page order, extracting only on demand"""
+        end = self.page_count if limit is None else min(limit, self.page_count)
+        for page_no in range(end):
+            yield page_no, self.page_text(page_no)
+
+    def extracted_pages(self):
+        """Pages already extracted, in page order"""
+        return sorted(self._pages.items())
+
+    def pending_pages(self):
+        """Page numbers that have not been extracted yet"""
+        return [page_no for page_no in range(self.page_count) if page_no not in self._pages]
+
+    def close(self):
+        """Drop the parsed state and remove the temporary file"""
+        self._reader = None
+        self._pages = {}
+        if self._path is not None and os.path.exists(self._path):
+            os.remove(self._path)
+        self._path = None
@@ -0,0 +1,296 @@
+import os
+import json
+import time
+import shutil
+import numpy as np
+from numpy.lib.format import open_memmap
+from langchain_core.documents import Document
+from vector_store import read_records
+
+try:
+    import psutil
+except ImportError:  # /proc is read directly instead
+    psutil = None
+
+QUANTIZED_DIR = "./ai_tutor_quantized"
+VECTOR_DTYPES = ('float32', 'float16', 'int8')
+RERANK_FACTOR = 4      # Candidates re-scored in float32 per requested result
+BLOCK_ROWS = 16384     # Rows upcast to float32 at a time while scanning
+
+
+def quantize(vectors, dtype, scale=None):
+    """Encode float32 vectors - returns (codes, per-dimension scale or None)
+
+    int8 uses a symmetric per-dimension scale (max |value| / 127), computed
+    from `vectors` unless one is given.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dtype == 'float32':
+        return vectors, None
+    if dtype == 'float16':
+        return vectors.astype(np.float16), None
+    if dtype == 'int8':
+        if scale is None:
+            scale = int8_scale(np.abs(vectors).max(axis=0))
+        codes = np.clip(np.rint(vectors / scale), -127, 127).astype(np.int8)
+        return codes, scale
+    raise ValueError(f"Unsupported vector dtype: {dtype}")
+
+
+def int8_scale(abs_max):
+    scale = np.asarray(abs_max, dtype=np.float32) / 127.0
+    scale[scale == 0] = 1.0
+    return scale
+
+
+def process_rss_bytes():
+    """Resident memory of this process, or None where it can't be read"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def top_candidates(codes, scale, half_norms, query, ranges, count):
+    """Rows of the `count` best approximate L2 matches within row `ranges`
+
+    `codes` may be float32, float16 or int8 (with `scale`), in memory or
+    memory-mapped; it is upcast BLOCK_ROWS rows at a time.
+    """
+    scaled_query = query * scale if scale is not None else query
+    rows, scores = [], []
+    for start, stop in ranges:
+        for block_start in range(start, stop, BLOCK_ROWS):
+            block_stop = min(block_start + BLOCK_ROWS, stop)
+            block = np.asarray(codes[block_start:block_stop], dtype=np.float32)
+            # Maximizing q.x - |x|^2 / 2 is minimizing |q - x|^2
+            block_scores = block @ scaled_query - half_norms[block_start:block_stop]
+            top = min(count, len(block_scores))
+            best = np.argpartition(-block_scores, top - 1)[:top]
+            rows.extend((best + block_start).tolist())
+            scores.extend(block_scores[best].tolist())
+    rows = np.asarray(rows, dtype=np.int64)
+    if len(rows) > count:
+        rows = rows[np.argpartition(-np.asarray(scores), count - 1)[:count]]
+    return rows
+
+
+class QuantizedIndex:
+    """Brute-force textbook vector index stored as int8 or float16
+
+    Rows are grouped by subject so a subject selection scans contiguous
+    slices only. The compressed matrix ranks RERANK_FACTOR * k candidates,
+    which are then re-scored with their float32 vectors read from
+    `rerank_vectors` - a memory-mapped file written next to the codes - so
+    quality tracks float32 while the resident matrix is 4x (int8) or 2x
+    (float16) smaller and Chroma never has to be open. Distances are squared
+    L2, as in Chroma, so results are interchangeable with
+    TextbookVectorStore.search().
+    """
+    def __init__(self, ids, metadatas, documents, codes, scale, dtype, rerank_vectors=None):
+        # Rows must already be grouped by subject
+        self.ids = ids
+        self.metadatas = metadatas
+        self.documents = documents
+        self.codes = codes
+        self.scale = scale
+        self.dtype = dtype
+        self.rerank_vectors = rerank_vectors
+
+        # Half squared norms of the decoded vectors, for L2 ranking via dot products
+        self.half_norms = np.zeros(len(ids), dtype=np.float32)
+        for start in range(0, len(ids), BLOCK_ROWS):
+            block = self._decode(start, start + BLOCK_ROWS)
+            self.half_norms[start:start + len(block)] = 0.5 * np.einsum('ij,ij->i', block, block)
+
+        self.subject_slices = {}
+        for row, metadata in enumerate(metadatas):
+            subject = metadata.get('subject')
+            start, _ = self.subject_slices.get(subject, (row, row))
+            self.subject_slices[subject] = (start, row + 1)
+
+    @classmethod
+    def from_vectors(cls, ids, vectors, metadatas, documents, dtype='int8'):
+        """In-memory index (re-ranked against `vectors` kept in memory)"""
+        order = sorted(range(len(ids)), key=lambda i: str(metadatas[i].get('subject')))
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)[order]
+        codes, scale = quantize(vectors, dtype)
+        return cls([ids[i] for i in order], [metadatas[i] for i in order], [documents[i] for i in order],
+                   codes, scale, dtype, vectors)
+
+    @staticmethod
+    def export(vectorstore, dtype='int8', directory=QUANTIZED_DIR, version=None):
+        """Write the compressed codes and float32 re-rank rows of a TextbookVectorStore to disk
+
+        Streams the store twice (metadata and scale first, then vectors
+        straight into the files), so a large library never needs a full
+        float32 copy in memory. Built in a staging directory and swapped in
+        at the end; `version` is recorded so stale exports can be detected.
+        """
+        ids, metadatas, documents = [], [], []
+        abs_max = None
+        for store in vectorstore.collections():
+            for page in read_records(store._collection):
+                ids.extend(page['ids'])
+                metadatas.extend(page['metadatas'])
+                documents.extend(page['documents'])
+                page_max = np.abs(np.asarray(page['embeddings'], dtype=np.float32)).max(axis=0)
+                abs_max = page_max if abs_max is None else np.maximum(abs_max, page_max)
+        if abs_max is None:
+            raise ValueError("No vectors to quantize")
+
+        staging = f"{directory}.tmp{os.getpid()}"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        order = sorted(range(len(ids)), key=lambda i: str(metadatas[i].get('subject')))
+        position = {ids[i]: row for row, i in enumerate(order)}
+        scale = int8_scale(abs_max) if dtype == 'int8' else None
+        shape = (len(ids), len(abs_max))
+        vectors = open_memmap(os.path.join(staging, "vectors.npy"), mode='w+', dtype=np.float32, shape=shape)
+        # float32 needs no codes of its own - the re-rank rows are loaded instead
+        codes = None if dtype == 'float32' else open_memmap(
+            os.path.join(staging, "codes.npy"), mode='w+', dtype=np.dtype(dtype), shape=shape)
+        for store in vectorstore.collections():
+            for page in read_records(store._collection):
+                rows = [position[i] for i in page['ids']]
+                vectors[rows] = np.asarray(page['embeddings'], dtype=np.float32)
+                if codes is not None:
+                    codes[rows], _ = quantize(page['embeddings'], dtype, scale)
+        vectors.flush()
+        if codes is not None:
+            codes.flush()
+        del vectors, codes
+        if scale is not None:
+            np.save(os.path.join(staging, "scale.npy"), scale)
+        with open(os.path.join(staging, "records.json"), 'w', encoding='utf-8') as f:
+            json.dump([[ids[i], metadatas[i], documents[i]] for i in order], f, ensure_ascii=False)
+        with open(os.path.join(staging, "manifest.json"), 'w', encoding='utf-8') as f:
+            json.dump({'dtype': dtype, 'count': len(ids), 'version': version, 'created_at': time.time()}, f)
+
+        previous = f"{directory}.old{os.getpid()}"
+        if os.path.exists(directory):
+            os.replace(directory, previous)
+        os.replace(staging, directory)
+        shutil.rmtree(previous, ignore_errors=True)
+
+    @classmethod
+    def load(cls, directory=QUANTIZED_DIR, dtype=None, version=None):
+        """Open an export - None if there is none, or it has another dtype or version
+
+        The codes are read into memory; the float32 rows stay on disk,
+        memory-mapped, and only the re-ranked candidates are ever paged in.
+        """
+        manifest_path = os.path.join(directory, "manifest.json")
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if (dtype and manifest['dtype'] != dtype) or (version is not None and manifest['version'] != version):
+            return None
+        with open(os.path.join(directory, "records.json"), 'r', encoding='utf-8') as f:
+            records = json.load(f)
+        scale_path = os.path.join(directory, "scale.npy")
+        vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode='r')
+        codes = np.load(os.path.join(directory, "vectors.npy" if manifest['dtype'] == 'float32' else "codes.npy"))
+        return cls([r[0] for r in records], [r[1] for r in records], [r[2] for r in records], codes,
+                   np.load(scale_path) if os.path.exists(scale_path) else None, manifest['dtype'], vectors)
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore, dtype='int8', directory=QUANTIZED_DIR, version=None):
+        """Export a TextbookVectorStore and open the result"""
+        cls.export(vectorstore, dtype, directory, version)
+        return cls.load(directory)
+
+    def _decode(self, start, stop):
+        block = self.codes[start:stop].astype(np.float32)
+        return block * self.scale if self.scale is not None else block
+
+    def _slices(self, subjects):
+        if not subjects:
+            return [(0, len(self.ids))]
+        return [self.subject_slices[s] for s in subjects if s in self.subject_slices]
+
+    def _float32_vectors(self, rows):
+        """Exact vectors for candidate rows (decoded codes if there are no float32 rows)"""
+        if self.rerank_vectors is None or self.dtype == 'float32':
+            return np.stack([self._decode(row, row + 1)[0] for row in rows])
+        return np.asarray(self.rerank_vectors[rows], dtype=np.float32)
+
+    def search(self, embedding, k=3, subjects=None, rerank_factor=RERANK_FACTOR):
+        """Nearest chunks as [(document, squared L2 distance)], best first"""
+        query = np.asarray(embedding, dtype=np.float32)
+        candidates = k * rerank_factor if rerank_factor else k
+        rows = top_candidates(self.codes, self.scale, self.half_norms, query, self._slices(subjects), candidates)
+        if not len(rows):
+            return []
+
+        # float32 re-rank of the shortlist
+        exact = self._float32_vectors(rows.tolist())
+        distances = np.sum((exact - query) ** 2, axis=1)
+        ranked = np.argsort(distances)[:k]
+        return [
+            (Document(id=self.ids[rows[i]], page_content=self.documents[rows[i]], metadata=self.metadatas[rows[i]]),
+             float(distances[i]))
+            for i in ranked
+        ]
+
+    def memory_bytes(self):
+        """Resident size of the vector data (codes, scale and norms) - the float32 rows are mapped, not loaded"""
+        return self.codes.nbytes + self.half_norms.nbytes + (self.scale.nbytes if self.scale is not None else 0)
+
+    def get_stats(self):
+        rss = process_rss_bytes()
+        return {
+            'dtype': self.dtype,
+            'vectors': len(self.ids),
+            'memory_mb': round(self.memory_bytes() / 1024 / 1024, 2),
+            'process_rss_mb': round(rss / 1024 / 1024, 1) if rss is not None else None,
+            'rerank': self.rerank_vectors is not None and self.dtype != 'float32'
+        }
+
+
+def _result_key(document):
+    return document.id  # Stored record id - page/offset keys collide for chunks ingested without start_index
+
+
+def quantization_report(vectorstore, queries, k=3, dtypes=VECTOR_DTYPES, directory=QUANTIZED_DIR):
+    """Memory footprint, latency and recall@k of each dtype against Chroma's float32 search
+
+    `queries` are query embeddings. Returns one dict per dtype; memory_mb is
+    the index's own arrays and rss_delta_mb how much the process grew while
+    opening and searching it (Chroma is already loaded for the baseline, so
+    it isn't counted again).
+    """
+    truth = []
+    started = time.perf_counter()
+    for query in queries:
+        truth.append({_result_key(doc) for doc, _ in vectorstore.search(query, k=k)})
+    chroma_ms = 1000 * (time.perf_counter() - started) / max(len(queries), 1)
+
+    rss = process_rss_bytes()
+    rows = [{'dtype': 'chroma (float32)', 'memory_mb': None, 'avg_search_ms': round(chroma_ms, 2), 'recall_at_k': 1.0,
+             'process_rss_mb': round(rss / 1024 / 1024, 1) if rss is not None else None, 'rss_delta_mb': None}]
+    for dtype in dtypes:
+        QuantizedIndex.export(vectorstore, dtype, directory)
+        rss_before = process_rss_bytes()
+        index = QuantizedIndex.load(directory)
+        hits = 0
+        started = time.perf_counter()
+        for query, expected in zip(queries, truth):
+            found = {_result_key(doc) for doc, _ in index.search(query, k=k)}
+            hits += len(found & expected)
+        elapsed = time.perf_counter() - started
+        rss_after = process_rss_bytes()
+        rows.append({
+            'dtype': dtype,
+            'memory_mb': round(index.memory_bytes() / 1024 / 1024, 2),
+            'avg_search_ms': round(1000 * elapsed / max(len(queries), 1), 2),
+            'recall_at_k': round(hits / max(sum(len(t) for t in truth), 1), 3),
+            'process_rss_mb': round(rss_after / 1024 / 1024, 1) if rss_after is not None else None,
+            'rss_delta_mb': round((rss_after - rss_before) / 1024 / 1024, 1) if rss_after is not None else None
+        })
+        del index
+    return rows
@@ -0,0 +1,155 @@
+import os
+import json
+import math
+import time
+import threading
+import numpy as np
+
+RERANKER_MODEL = os.environ.get('TUTOR_RERANKER_MODEL', "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")  # Multilingual (Telugu + English)
+RERANKERS_DIR = "./models/rerankers"
+CALIBRATION_PATH = "./models/rerankers/calibration.json"
+CALIBRATION_FIXTURE = "./reranker_calibration.jsonl"  # Labelled question/passage pairs for calibrate_reranker.py
+DEFAULT_BUDGET_MS = 250
+MAX_PASSAGE_TOKENS = 256  # Truncation keeps the cost per pair bounded
+# Logistic mapping of cosine similarity, used when the cross-encoder is unavailable
+SIMILARITY_MIDPOINT = 0.35
+SIMILARITY_SLOPE = 12.0
+
+
+def sigmoid(x):
+    return 1.0 / (1.0 + math.exp(-max(min(x, 50.0), -50.0)))
+
+
+def load_labelled_pairs(path=CALIBRATION_FIXTURE):
+    """[(question, passage, is_relevant)] from a JSON-lines file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return [(row['question'], row['passage'], bool(row['relevant'])) for row in rows]
+
+
+def similarity_relevance(distance):
+    """Relevance in [0, 1] from a squared L2 distance between unit-length embeddings"""
+    cosine = 1.0 - distance / 2.0
+    return sigmoid(SIMILARITY_SLOPE * (cosine - SIMILARITY_MIDPOINT))
+
+
+class RerankResult:
+    """Re-ranked candidates with calibrated relevance (None where the budget ran out)"""
+    def __init__(self, ranked, elapsed_ms, scored, total):
+        self.ranked = ranked  # [(document, relevance or None)], best first
+        self.elapsed_ms = elapsed_ms
+        self.scored = scored
+        self.total = total
+
+    def as_dict(self):
+        return {'rerank_ms': round(self.elapsed_ms, 1), 'reranked': self.scored, 'candidates': self.total}
+
+
+class CrossEncoderReranker:
+    """Small local cross-encoder that re-scores retrieved chunks against the question
+
+    Candidates are scored in retrieval order, batch by batch, until the
+    millisecond budget would be exceeded; whatever wasn't scored keeps its
+    retrieval order after the scored ones. Raw model outputs are mapped to
+    a relevance probability with Platt scaling (sigmoid(a * logit + b)),
+    whose parameters are fitted on labelled question/passage pairs by
+    calibrate_reranker.py and loaded from CALIBRATION_PATH.
+    """
+    def __init__(self, model_name=RERANKER_MODEL, budget_ms=DEFAULT_BUDGET_MS, batch_size=4,
+                 cache_folder=RERANKERS_DIR):
+        from sentence_transformers import CrossEncoder
+        os.makedirs(cache_folder, exist_ok=True)
+        self.model_name = model_name
+        self.budget_ms = budget_ms
+        self.batch_size = batch_size
+        self.model = CrossEncoder(model_name, max_length=MAX_PASSAGE_TOKENS, device='cpu', cache_folder=cache_folder)
+        self.platt_a, self.platt_b = 1.0, 0.0
+        self.is_calibrated = self.load_calibration()
+
+        self._lock = threading.Lock()  # One forward pass at a time on the shared model
+        self.ms_per_pair = None  # Running estimate used to stay inside the budget
+        self.calls = 0
+        self.pairs_scored = 0
+        self.pairs_skipped = 0
+        self.total_ms = 0.0
+
+    def _logits(self, question, passages):
+        outputs = np.asarray(self.model.predict([(question, p) for p in passages], batch_size=len(passages),
+                                                show_progress_bar=False), dtype=np.float64).reshape(-1)
+        if outputs.min() >= 0.0 and outputs.max() <= 1.0:
+            # Single-label cross-encoders apply a sigmoid by default - undo it
+            outputs = np.clip(outputs, 1e-6, 1 - 1e-6)
+            outputs = np.log(outputs / (1 - outputs))
+        return outputs
+
+    def calibrated(self, logit):
+        return sigmoid(self.platt_a * logit + self.platt_b)
+
+    def rerank(self, question, documents, budget_ms=None):
+        budget_ms = self.budget_ms if budget_ms is None else budget_ms
+        started = time.perf_counter()
+        relevance = [None] * len(documents)
+
+        with self._lock:
+            for start in range(0, len(documents), self.batch_size):
+                batch = documents[start:start + self.batch_size]
+                elapsed = 1000 * (time.perf_counter() - started)
+                # Always score the first batch; later ones only if they fit the budget
+                if start and self.ms_per_pair is not None and elapsed + self.ms_per_pair * len(batch) > budget_ms:
+                    break
+                batch_started = time.perf_counter()
+                logits = self._logits(question, [doc.page_content for doc in batch])
+                per_pair = 1000 * (time.perf_counter() - batch_started) / len(batch)
+                self.ms_per_pair = per_pair if self.ms_per_pair is None else 0.7 * self.ms_per_pair + 0.3 * per_pair
+                for offset, logit in enumerate(logits):
+                    relevance[start + offset] = self.calibrated(float(logit))
+
+        scored = [i for i, score in enumerate(relevance) if score is not None]
+        unscored = [i for i, score in enumerate(relevance) if score is None]
+        order = sorted(scored, key=lambda i: relevance[i], reverse=True) + unscored
+        elapsed_ms = 1000 * (time.perf_counter() - started)
+
+        self.calls += 1
+        self.pairs_scored += len(scored)
+        self.pairs_skipped += len(unscored)
+        self.total_ms += elapsed_ms
+        return RerankResult([(documents[i], relevance[i]) for i in order], elapsed_ms, len(scored), len(documents))
+
+    def calibrate(self, examples, iterations=500, learning_rate=0.1):
+        """Fit Platt scaling on [(question, passage, is_relevant)] and save it"""
+        logits = np.concatenate([self._logits(q, [p]) for q, p, _ in examples])
+        labels = np.asarray([1.0 if relevant else 0.0 for _, _, relevant in examples])
+        a, b = 1.0, 0.0
+        for _ in range(iterations):
+            predictions = 1.0 / (1.0 + np.exp(-(a * logits + b)))
+            error = predictions - labels
+            a -= learning_rate * float(np.mean(error * logits))
+            b -= learning_rate * float(np.mean(error))
+        self.platt_a, self.platt_b = a, b
+        self.is_calibrated = True
+        with open(CALIBRATION_PATH, 'w', encoding='utf-8') as f:
+            json.dump({'model': self.model_name, 'a': a, 'b': b, 'examples': len(examples)}, f)
+        return a, b
+
+    def load_calibration(self):
+        """Use the saved Platt parameters if they were fitted for this model"""
+        if not os.path.exists(CALIBRATION_PATH):
+            return False
+        with open(CALIBRATION_PATH, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('model') != self.model_name:
+            return False
+        self.platt_a, self.platt_b = data['a'], data['b']
+        return True
+
+    def get_stats(self):
+        return {
+            'model': self.model_name,
+            'budget_ms': self.budget_ms,
+            'calibrated': self.is_calibrated,
+            'calls': self.calls,
+            'avg_rerank_ms': round(self.total_ms / self.calls, 1) if self.calls else 0.0,
+            'ms_per_pair': round(self.ms_per_pair, 1) if self.ms_per_pair else None,
+            'pairs_scored': self.pairs_scored,
+            'pairs_skipped': self.pairs_skipped
+        }
@@ -0,0 +1,109 @@
+import random
+import threading
+
+# Canned replies for conversational intents, per language. Variants with
+# {name} are only used when the student's name is known.
+RESPONSE_TEMPLATES = {
+    'english': {
+        'greeting': [
+            "Hello! I'm your AI tutor. What would you like to learn today?",
+            "Hi there! Ask me anything from your textbooks.",
+            "Good to see you! Which topic shall we explore?",
+            "Hello {name}! What would you like to learn today?",
+            "Hi {name}! Ready when you are - ask me any question from your textbooks."
+        ],
+        'small_talk': [
+            "I'm doing great and ready to help! What are you studying right now?",
+            "I'm your offline AI tutor - I answer questions from your textbooks. What would you like to know?",
+            "All good here, {name}! What shall we study?"
+        ],
+        'thanks': [
+            "You're welcome! Feel free to ask another question.",
+            "Happy to help! Anything else you'd like to understand?",
+            "Glad it helped! Keep the questions coming.",
+            "You're welcome, {name}! Ask me anytime."
+        ],
+        'goodbye': [
+            "Goodbye! Keep up the great work.",
+            "See you next time! Happy studying.",
+            "Bye {name}! Keep learning."
+        ],
+        'acknowledgement': [
+            "Great! What would you like to learn next?",
+            "Okay! Ask me another question whenever you're ready."
+        ]
+    },
+    'telugu': {
+        'greeting': [
+            "నమస్కారం! నేను మీ AI ఉపాధ్యాయుడిని. ఈరోజు ఏమి నేర్చుకోవాలనుకుంటున్నారు?",
+            "హలో! మీ పాఠ్యపుస్తకాల నుండి ఏదైనా అడగండి.",
+            "మిమ్మల్ని చూడటం సంతోషం! ఏ అంశం గురించి తెలుసుకుందాం?",
+            "నమస్కారం {name}! ఈరోజు ఏమి నేర్చుకోవాలనుకుంటున్నారు?"
+        ],
+        'small_talk': [
+            "నేను బాగున్నాను, మీకు సహాయం చేయడానికి సిద్ధంగా ఉన్నాను! మీరు ఇప్పుడు ఏమి చదువుతున్నారు?",
+            "నేను మీ ఆఫ్‌లైన్ AI ఉపాధ్యాయుడిని - మీ పాఠ్యపుస్తకాల నుండి ప్రశ్నలకు సమాధానం ఇస్తాను. ఏమి తెలుసుకోవాలనుకుంటున్నారు?",
+            "అంతా బాగుంది {name}! ఏమి చదువుదాం?"
+        ],
+        'thanks': [
+            "మీకు స్వాగతం! మరో ప్రశ్న అడగండి.",
+            "సహాయం చేయడం సంతోషంగా ఉంది! ఇంకా ఏదైనా అర్థం చేసుకోవాలా?",
+            "మీకు స్వాగతం {name}! ఎప్పుడైనా అడగండి."
+        ],
+        'goodbye': [
+            "వెళ్ళిరండి! బాగా చదువుకోండి.",
+            "మళ్ళీ కలుద్దాం! చదువు కొనసాగించండి.",
+            "బై {name}! నేర్చుకోవడం కొనసాగించండి."
+        ],
+        'acknowledgement': [
+            "చాలా బాగుంది! తరువాత ఏమి నేర్చుకోవాలనుకుంటున్నారు?",
+            "సరే! మీరు సిద్ధంగా ఉన్నప్పుడు మరో ప్రశ్న అడగండి."
+        ]
+    }
+}
+
+
+class ResponseTemplates:
+    """Picks a random canned reply for an intent, personalized when a name is known"""
+    def __init__(self, templates=RESPONSE_TEMPLATES, seed=None):
+        self.templates = templates
+        self._random = random.Random(seed)
+
+    def respond(self, language, intent, name=None, avoid=None):
+        """A reply for `intent`, or None if there's no template for it
+
+        `avoid` (e.g. the previous reply) is skipped when there's an alternative.
+        """
+        variants = self.templates.get(language, self.templates['english']).get(intent)
+        if not variants:
+            return None
+        name = (name or "").strip()
+        usable = [v for v in variants if name or "{name}" not in v]
+        if len(usable) > 1 and avoid:
+            usable = [v for v in usable if v.format(name=name) != avoid] or usable
+        return self._random.choice(usable).format(name=name)
+
+
+class ResponseStats:
+    """How many answers were served without the LLM, across every session"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routes = {}
+        self.total = 0
+        self.without_llm = 0
+
+    def record(self, prepared):
+        with self._lock:
+            self.total += 1
+            self.routes[prepared.route] = self.routes.get(prepared.route, 0) + 1
+            if prepared.prompt is None:
+                self.without_llm += 1
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'responses': self.total,
+                'without_llm': self.without_llm,
+                'without_llm_share': self.without_llm / self.total if self.total else 0.0,
+                'routes': dict(self.routes)
+            }
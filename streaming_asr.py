@@ -0,0 +1,182 @@
+import time
+import numpy as np
+from asr_service import SAMPLE_RATE, decode_audio
+
+FRAME_MS = 30
+FRAME_SAMPLES = SAMPLE_RATE * FRAME_MS // 1000
+MIN_SILENCE_MS = 600      # Pause that ends a speech segment
+MIN_SPEECH_MS = 250       # Shorter blips (clicks, coughs) are dropped
+MAX_SEGMENT_SECONDS = 15  # Long monologues are cut so text keeps flowing
+PADDING_MS = 200          # Kept before and after each segment so word edges aren't clipped
+SPEECH_MARGIN_DB = 12     # Speech is this much louder than the noise floor...
+MIN_SPEECH_DB = -50       # ...and at least this loud (dBFS)
+
+
+class EnergyVAD:
+    """Frame-level voice activity detection against an adaptive noise floor
+
+    Fed audio incrementally; returns (start, end, closed_at) sample ranges
+    of speech as soon as a long enough pause closes them. `closed_at` is
+    the wall-clock time the end of speech was detected.
+    """
+    def __init__(self):
+        self.noise_db = None
+        self.position = 0          # Samples seen so far
+        self.speech_start = None
+        self.last_speech = None
+        self._pending = np.zeros(0, dtype=np.float32)
+
+    def _frame_db(self, frame):
+        rms = float(np.sqrt(np.mean(frame * frame))) + 1e-10
+        return 20 * np.log10(rms)
+
+    def feed(self, samples):
+        segments = []
+        samples = np.concatenate([self._pending, samples])
+        usable = len(samples) - len(samples) % FRAME_SAMPLES
+        self._pending = samples[usable:]
+        levels = [self._frame_db(samples[offset:offset + FRAME_SAMPLES]) for offset in range(0, usable, FRAME_SAMPLES)]
+        if self.noise_db is None and levels:
+            # Assume a quiet room until heard otherwise, so speech from the first instant is caught
+            self.noise_db = min(float(np.percentile(levels, 10)), MIN_SPEECH_DB - SPEECH_MARGIN_DB)
+        for level in levels:
+            is_speech = level > max(self.noise_db + SPEECH_MARGIN_DB, MIN_SPEECH_DB)
+            # Noise floor follows quiet frames quickly, loud ones slowly and speech barely
+            rate = 0.005 if is_speech else (0.1 if level > self.noise_db else 0.5)
+            self.noise_db += rate * (level - self.noise_db)
+            frame_start = self.position
+            self.position += FRAME_SAMPLES
+
+            if is_speech:
+                if self.speech_start is None:
+                    self.speech_start = frame_start
+                self.last_speech = self.position
+            if self.speech_start is None:
+                continue
+            silence = self.position - self.last_speech
+            length = self.position - self.speech_start
+            if silence >= MIN_SILENCE_MS * SAMPLE_RATE // 1000 or length >= MAX_SEGMENT_SECONDS * SAMPLE_RATE:
+                segments.extend(self._close())
+        return segments
+
+    def _close(self):
+        start, end = self.speech_start, self.last_speech
+        self.speech_start = self.last_speech = None
+        if end - start < MIN_SPEECH_MS * SAMPLE_RATE // 1000:
+            return []
+        return [(start, end, time.perf_counter())]
+
+    def flush(self):
+        """Close any segment still open (end of the recording)"""
+        if self.speech_start is None:
+            return []
+        return self._close()
+
+
+class PartialTranscript:
+    def __init__(self, text, segments_done, final):
+        self.text = text                    # Stable prefix: segments transcribed so far, in order
+        self.segments_done = segments_done
+        self.final = final
+
+
+class StreamingTranscriber:
+    """Incremental speech recognition over an ASRService
+
+    Audio is fed in chunks (or a whole recording at once); each speech
+    segment found by the VAD goes to the ASR pool as soon as its pause is
+    heard, so segments transcribe in parallel with the rest of the speech.
+    Transcripts are emitted as an ever-growing prefix of finished segments,
+    which never changes once emitted and can be used to start retrieval.
+    The ASR profile is chosen once, when the first segment is submitted, so
+    the whole recording is transcribed by the same model.
+    """
+    def __init__(self, asr, language=None, **options):
+        self.asr = asr
+        self.language = language
+        self.options = options
+        self.vad = EnergyVAD()
+        self.profile = None         # Set when the recording is admitted to the ASR pool
+        self._closed = False
+        self._audio = []            # Received chunks
+        self._futures = []          # (future, speech ended at)
+        self._texts = []
+        self.latencies = []         # Seconds from end of speech to its text, per segment
+        self.first_text_seconds = None
+
+    def _samples(self, start, end):
+        audio = np.concatenate(self._audio) if len(self._audio) > 1 else self._audio[0]
+        self._audio = [audio]
+        padding = PADDING_MS * SAMPLE_RATE // 1000
+        start = max(start - padding, 0)
+        end = min(end + padding, len(audio))
+        return audio[start:end]
+
+    def _submit(self, segments):
+        for start, end, ended_at in segments:
+            if self.profile is None:
+                self.profile = self.asr.start_recording()
+            future = self.asr.submit(self._samples(start, end), self.language, self.profile, **self.options)
+            self._futures.append((future, ended_at))
+
+    def feed(self, samples):
+        """Add 16 kHz float32 samples; returns a PartialTranscript if more text is ready"""
+        self._audio.append(np.asarray(samples, dtype=np.float32))
+        self._submit(self.vad.feed(self._audio[-1]))
+        return self._collect(block=False)
+
+    def _collect(self, block):
+        """Take finished segments in order; with block=True waits for at least one"""
+        grew = False
+        while len(self._texts) < len(self._futures):
+            future, ended_at = self._futures[len(self._texts)]
+            if not future.done() and (grew or not block):
+                break
+            self._texts.append(future.result().text)
+            self.latencies.append(time.perf_counter() - ended_at)
+            if self._texts[-1] and self.first_text_seconds is None:
+                self.first_text_seconds = self.latencies[-1]
+            grew = True
+        return PartialTranscript(self.text(), len(self._texts), False) if grew else None
+
+    def finish(self):
+        """Flush the last segment and yield transcripts until everything is done - always ends with a final one"""
+        self._submit(self.vad.flush())
+        while len(self._texts) < len(self._futures):
+            partial = self._collect(block=True)
+            if partial is not None and len(self._texts) < len(self._futures):
+                yield partial
+        self.close()
+        # Emitted even when nothing changed since the last partial, so callers always see final=True
+        yield PartialTranscript(self.text(), len(self._texts), True)
+
+    def close(self):
+        """Release the recording's place in the ASR queue (safe to call more than once)"""
+        if self.profile is not None and not self._closed:
+            self._closed = True
+            self.asr.end_recording()
+
+    def transcribe_recording(self, data, chunk_seconds=0.5):
+        """Stream a complete recording through the VAD - yields PartialTranscripts, the last one final"""
+        samples = decode_audio(data) if isinstance(data, (bytes, bytearray)) else data
+        step = int(chunk_seconds * SAMPLE_RATE)
+        try:
+            for offset in range(0, len(samples), step):
+                partial = self.feed(samples[offset:offset + step])
+                if partial is not None:
+                    yield partial
+            yield from self.finish()
+        finally:
+            self.close()  # Also when the caller stops early or a segment fails
+
+    def text(self):
+        return " ".join(t for t in self._texts if t).strip()
+
+    def get_stats(self):
+        return {
+            'segments': len(self._futures),
+            'profile': self.profile.name if self.profile is not None else None,
+            'audio_seconds': round(self.vad.position / SAMPLE_RATE, 2),
+            'first_text_after_speech_seconds': round(self.first_text_seconds, 3) if self.first_text_seconds is not None else None,
+            'avg_speech_end_to_text_seconds': round(sum(self.latencies) / len(self.latencies), 3) if self.latencies else None
+        }
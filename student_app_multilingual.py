@@ -1,5 +1,7 @@
 import streamlit as st
 from tutor_backend_multilingual import AITextbookTutorMultilingualBackend
+from model_registry import registry
+from ollama_client import get_client
 import os
 
 # Language configurations
@@ -28,7 +30,9 @@ LANGUAGES = {
         'sources_from': '📚 Sources from textbooks',
         'chat_placeholder': 'Ask me anything about your textbooks...',
         'searching_response': 'Searching textbooks offline and generating response...',
+        'queue_position': '⏳ Other students are ahead of you: you are #{position} in line (about {wait} seconds)',
         'clear_chat': '🗑️ Clear Chat',
+        'your_name': '🙂 Your name (optional)',
         'how_to_use': 'ℹ️ How to Use (Offline Mode)',
         'voice_instructions': '''
         **Using Voice Input (Offline):**
@@ -74,7 +78,9 @@ LANGUAGES = {
         'sources_from': '📚 పాఠ్యపుస్తకాల నుండి మూలాలు',
         'chat_placeholder': 'మీ పాఠ్యపుస్తకాల గురించి ఏదైనా అడగండి...',
         'searching_response': 'పాఠ్యపుస్తకాలను ఆఫ్‌లైన్‌లో శోధిస్తోంది మరియు ప్రతిస్పందనను రూపొందిస్తోంది...',
+        'queue_position': '⏳ మీ ముందు ఇతర విద్యార్థులు ఉన్నారు: మీరు వరుసలో #{position} (సుమారు {wait} సెకన్లు)',
         'clear_chat': '🗑️ చాట్ క్లియర్ చేయండి',
+        'your_name': '🙂 మీ పేరు (ఐచ్ఛికం)',
         'how_to_use': 'ℹ️ ఎలా ఉపయోగించాలి (ఆఫ్‌లైన్ మోడ్)',
         'voice_instructions': '''
         **వాయిస్ ఇన్‌పుట్ ఉపయోగించడం (ఆఫ్‌లైన్):**
@@ -190,6 +196,7 @@ def show_main_interface(lang_config):
     st.markdown(lang_config['subtitle'])
     
     # Enhanced initialization with better error handling
+    # (models come from the process-wide registry, so this is cheap per session)
     if 'tutor' not in st.session_state or st.session_state.get('tutor_language') != st.session_state.selected_language:
         with st.spinner(lang_config['loading']):
             try:
@@ -212,16 +219,61 @@ def show_main_interface(lang_config):
             st.write(f"- Language: {st.session_state.selected_language}")
             st.write(f"- ASR Available: {getattr(tutor, 'asr_available', 'Not Set')}")
             st.write(f"- Whisper Model: {hasattr(tutor, 'whisper_model')}")
+            if getattr(tutor, 'asr', None) is not None:
+                asr_stats = tutor.asr.get_stats()
+                st.write(f"- ASR Pool: {asr_stats['running']}/{asr_stats['workers']} busy, {asr_stats['queued']} queued, RTF {asr_stats['avg_rtf']}")
+                st.write(f"- ASR Profile: {asr_stats['current_profile']} (of {' → '.join(asr_stats['profiles'])}), used {asr_stats['profile_counts']}")
+            streaming_stats = getattr(tutor, 'last_streaming_stats', {})
+            if streaming_stats:
+                st.write(f"- Last Voice Input: {streaming_stats['segments']} segments, speech end → first text {streaming_stats['first_text_after_speech_seconds']}s")
             st.write(f"- LLM Available: {getattr(tutor, 'llm_available', 'Not Set')}")
             if hasattr(tutor, 'model_name'):
                 st.write(f"- AI Model: {tutor.model_name}")
+            ollama_stats = get_client().get_stats()
+            st.write(f"- Ollama: {ollama_stats['requests']} requests, {ollama_stats['avg_latency_ms']} ms avg, {ollama_stats['errors']} errors")
+            if hasattr(tutor, 'scheduler'):
+                queue_stats = tutor.scheduler.get_stats()
+                st.write(f"- LLM Queue: {queue_stats['running']}/{queue_stats['max_concurrent']} running, {queue_stats['queued']} waiting, {queue_stats['coalesced']} coalesced, {queue_stats['rejected']} turned away")
+            last_generation = getattr(tutor, 'last_generation', {})
+            if last_generation:
+                reused = ", chat context reused" if last_generation['reused_context'] else ""
+                st.write(f"- Last Prompt Eval: {last_generation['prompt_eval_count']} tokens in {last_generation['prompt_eval_ms']:.0f} ms{reused}")
             st.write(f"- TTS Available: {getattr(tutor, 'tts_available', 'Not Set')}")
+            st.write(f"- Shared Models: {', '.join(str(key) for key in registry.loaded()) or 'None'}")
         
         with col2:
             st.write("**Data Status:**")
             st.write(f"- Textbooks: {len(tutor.textbooks)}")
             st.write(f"- Vector Store: {tutor.vectorstore is not None}")
+            vector_index = getattr(tutor, 'vector_index', None)
+            if vector_index is not None and vector_index is not tutor.vectorstore:
+                index_stats = vector_index.get_stats()
+                st.write(f"- Vector Index: {type(vector_index).__name__} ({index_stats['vectors']} vectors, {index_stats['dtype']})")
             st.write(f"- Embeddings: {hasattr(tutor, 'embeddings')}")
+            if getattr(tutor, 'reranker', None) is not None:
+                rerank_stats = tutor.reranker.get_stats()
+                st.write(f"- Re-ranker: {rerank_stats['avg_rerank_ms']} ms avg ({rerank_stats['budget_ms']:.0f} ms budget), {rerank_stats['pairs_skipped']} chunks over budget")
+            top_relevance = getattr(tutor, 'last_retrieval', {}).get('top_relevance')
+            if top_relevance is not None:
+                st.write(f"- Last Relevance: {top_relevance:.2f} ({tutor.last_route})")
+            if hasattr(tutor, 'response_stats'):
+                response_stats = tutor.response_stats.get_stats()
+                st.write(f"- Answered Without LLM: {response_stats['without_llm_share']:.0%} ({response_stats['without_llm']}/{response_stats['responses']})")
+            if hasattr(tutor, 'intent_router'):
+                router_stats = tutor.intent_router.get_stats()
+                st.write(f"- Intent Router: {router_stats['avg_lexical_us']} µs lexical, {router_stats['avg_embedding_ms']} ms embedding ({router_stats['tiers']['embedding']} of {router_stats['routed']} needed it)")
+            if hasattr(tutor, 'memory'):
+                memory_stats = tutor.memory.get_stats()
+                st.write(f"- Conversation Memory: {memory_stats['turns']} recent turns, {memory_stats['memory_tokens']} tokens ({memory_stats['llm_summaries']} summaries)")
+            last_context = getattr(tutor, 'last_context', {})
+            if last_context:
+                st.write(f"- Last Context: {last_context['context_tokens']}/{last_context['budget_tokens']} tokens, {last_context['tokens_deduplicated']} deduplicated, {last_context['tokens_cut']} cut for the budget")
+            if hasattr(tutor, 'answer_cache'):
+                cache_stats = tutor.answer_cache.get_stats()
+                st.write(f"- Answer Cache: {cache_stats['entries']} answers, {cache_stats['hit_rate']:.0%} hit rate")
+            if hasattr(tutor, 'embeddings') and hasattr(tutor.embeddings, 'get_stats'):
+                embed_stats = tutor.embeddings.get_stats()
+                st.write(f"- Query Embedding: {embed_stats['avg_query_ms']} ms avg ({embed_stats['queries_embedded']} queries)")
             
             # Show textbook files with more details
             if os.path.exists("textbook_metadata.json"):
@@ -303,7 +355,11 @@ def show_main_interface(lang_config):
                 transcription_placeholder.info(f"🔄 {lang_config['transcribing']}")
                 
                 try:
-                    transcribed_text = tutor.transcribe_audio(audio_input)
+                    # Text appears segment by segment; retrieval starts on each stable prefix
+                    for partial in tutor.transcribe_audio_stream(audio_input, selected_subjects):
+                        transcribed_text = partial.text
+                        if not partial.final:
+                            transcription_placeholder.info(f"🔄 {lang_config['you_said']} {transcribed_text}...")
                     
                     if transcribed_text and not transcribed_text.startswith("❌"):
                         transcription_placeholder.success(f"✅ {lang_config['you_said']} {transcribed_text}")
@@ -322,6 +378,9 @@ def show_main_interface(lang_config):
                     tutor.setup_telugu_asr_offline()
                     st.rerun()
 
+    # Optional name for personalized greetings
+    tutor.student_name = st.sidebar.text_input(lang_config['your_name'], key='student_name').strip() or None
+    
     # Initialize chat history
     if "messages" not in st.session_state:
         st.session_state.messages = []
@@ -371,12 +430,13 @@ def show_main_interface(lang_config):
 
         # Generate assistant response with debugging
         with st.chat_message("assistant"):
+            tokens = None
             with st.spinner(lang_config['searching_response']):
                 try:
                     # Add debug info
                     st.caption(f"🔍 Searching in {len(selected_subjects)} subjects...")
                     
-                    response, sources = tutor.get_response(prompt, selected_subjects)
+                    tokens, sources = tutor.get_response_stream(prompt, selected_subjects)
                     
                     # Debug: Show what was returned
                     st.caption(f"📊 Found {len(sources)} sources" if sources else "📊 No sources found")
@@ -386,9 +446,29 @@ def show_main_interface(lang_config):
                     sources = []
                     st.error(f"Debug: Error in get_response: {str(e)}")
 
-            # Display text response
-            st.markdown(response)
-            st.caption("🔒 Response generated offline")
+            # Tell the student where they are in line instead of spinning silently
+            ticket = getattr(tutor, 'last_ticket', None)
+            if tokens is not None and ticket is not None and ticket.position() > 0:
+                st.info(lang_config['queue_position'].format(
+                    position=ticket.position(),
+                    wait=round(ticket.estimated_wait())
+                ))
+            
+            # Display text response - tokens are rendered as Ollama produces them
+            if tokens is not None:
+                response = st.write_stream(tokens)
+                if not isinstance(response, str):
+                    response = "".join(str(part) for part in response)
+            else:
+                st.markdown(response)
+            
+            first_token = getattr(tutor, 'last_first_token_seconds', None)
+            if getattr(tutor, 'last_route', None) == 'cache':
+                st.caption("🔒 Response generated offline | ⚡ answered from cache")
+            elif first_token is not None:
+                st.caption(f"🔒 Response generated offline | ⚡ first token in {first_token:.1f}s")
+            else:
+                st.caption("🔒 Response generated offline")
 
             # Enhanced sources display - IMMEDIATELY after response
             if sources:
@@ -431,6 +511,7 @@ def show_main_interface(lang_config):
     # Clear chat button
     if st.sidebar.button(lang_config['clear_chat']):
         st.session_state.messages = []
+        tutor.reset_conversation()
         if 'pending_voice_input' in st.session_state:
             del st.session_state.pending_voice_input
         st.rerun()
@@ -0,0 +1,156 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from tutor_backend_multilingual import AITextbookTutorMultilingualBackendOffline
+from model_registry import registry
+
+_DONE = object()
+
+
+class StageTimings:
+    """Wall-clock seconds per pipeline stage for one question"""
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+
+    def mark(self, stage):
+        """Record seconds from the start of the question to `stage` (first call wins)"""
+        self.stages.setdefault(stage, time.perf_counter() - self.started)
+
+    def timed(self, stage):
+        return _StageTimer(self, stage)
+
+    def as_dict(self):
+        return {stage: round(seconds, 3) for stage, seconds in self.stages.items()}
+
+
+class _StageTimer:
+    def __init__(self, timings, stage):
+        self.timings = timings
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timings.stages[self.stage] = self.timings.stages.get(self.stage, 0.0) + time.perf_counter() - self.started
+        return False
+
+
+class AITextbookTutorAsyncBackend(AITextbookTutorMultilingualBackendOffline):
+    """Asyncio API on top of the offline tutor
+
+    Retrieval runs in the default executor, generation tokens are bridged
+    from the shared LLM scheduler onto the event loop, Whisper runs on the
+    shared ASR worker pool and TTS on its own single-worker executor (the
+    engine is shared across sessions and not thread-safe). With speak=True every paragraph is sent
+    to TTS as soon as it is complete while the rest is still generating.
+    Per-stage timings of the last question are kept in `last_timings`.
+    """
+    def __init__(self, language='telugu'):
+        super().__init__(language)
+        self.tts_executor = registry.get('tts_executor', lambda: ThreadPoolExecutor(1, thread_name_prefix='tts'))
+        self.last_timings = {}
+        self.last_sources = []
+        self.last_audio_clips = []
+
+    async def retrieve_async(self, question: str, selected_subjects: list = None):
+        """Embed, check the answer cache and search textbooks - returns a PreparedResponse"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.prepare_response, question, selected_subjects)
+
+    async def stream_llama_async(self, prompt: str):
+        """Async generator over the tokens of one queued generation"""
+        loop = asyncio.get_running_loop()
+        tokens = asyncio.Queue()
+
+        def pump(iterator):
+            try:
+                for token in iterator:
+                    loop.call_soon_threadsafe(tokens.put_nowait, token)
+            finally:
+                loop.call_soon_threadsafe(tokens.put_nowait, _DONE)
+
+        # stream_llama queues the request; the ticket's tokens are read on a helper thread
+        iterator = await loop.run_in_executor(None, self.stream_llama, prompt)
+        threading.Thread(target=pump, args=(iterator,), daemon=True).start()
+        while True:
+            token = await tokens.get()
+            if token is _DONE:
+                return
+            yield token
+
+    async def transcribe_audio_async(self, audio_file):
+        # Only waits on the ASR pool, so the default executor is enough
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.transcribe_audio, audio_file)
+
+    async def speak_text_async(self, text: str):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.tts_executor, self.speak_text, text)
+
+    async def get_response_stream_async(self, question: str, selected_subjects: list = None, speak: bool = False):
+        """Async generator over answer tokens
+
+        Sources are in `last_sources` once the first token is yielded; spoken
+        paragraphs are in `last_audio_clips` (in order) when the generator ends.
+        """
+        timings = StageTimings()
+        self.last_timings = {}
+        self.last_sources = []
+        self.last_audio_clips = []
+
+        with timings.timed('retrieval'):
+            prepared = await self.retrieve_async(question, selected_subjects)
+        self.last_route = prepared.route
+        self.response_stats.record(prepared)
+        self.last_sources = prepared.sources
+
+        speech_tasks = []
+        pending = ""
+        parts = []
+
+        def speak_paragraph(paragraph):
+            if paragraph.strip():
+                task = asyncio.ensure_future(self.speak_text_async(paragraph))
+                task.add_done_callback(lambda _: timings.mark('first_audio'))
+                speech_tasks.append(task)
+
+        with timings.timed('generation'):
+            if prepared.prompt is None:
+                timings.mark('first_token')
+                parts.append(prepared.text)
+                yield prepared.text
+                pending = prepared.text
+                self.remember_turn(question, prepared.text, prepared.route)
+            else:
+                async for token in self.stream_llama_async(prepared.prompt):
+                    timings.mark('first_token')
+                    parts.append(token)
+                    yield token
+                    if speak:
+                        pending += token
+                        # Hand each finished paragraph to TTS while generation continues
+                        while "\n\n" in pending:
+                            paragraph, pending = pending.split("\n\n", 1)
+                            speak_paragraph(paragraph)
+                if not self.last_stream_failed:
+                    self.remember_answer(prepared, "".join(parts))
+                    self.remember_turn(question, "".join(parts))
+
+        if speak:
+            speak_paragraph(pending)
+            with timings.timed('tts_wait'):
+                clips = await asyncio.gather(*speech_tasks)
+            self.last_audio_clips = [clip for clip in clips if clip is not None]
+
+        timings.mark('total')
+        self.last_timings = timings.as_dict()
+        print(f"⏱️ Stage timings: {self.last_timings}")
+
+    async def get_response_async(self, question: str, selected_subjects: list = None, speak: bool = False):
+        """Full answer - returns (response, sources, audio_clips)"""
+        parts = [token async for token in self.get_response_stream_async(question, selected_subjects, speak)]
+        return "".join(parts), self.last_sources, self.last_audio_clips
@@ -3,8 +3,24 @@ import json
 import warnings
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
+from embedding_service import EmbeddingService, EMBEDDINGS_DIR
+from model_registry import registry
+from ollama_client import get_client
+from answer_cache import AnswerCache
+from lexical_index import LexicalIndex, reciprocal_rank_fusion
+from vector_store import TextbookVectorStore, VECTORSTORE_DIR
+from quantized_index import QuantizedIndex
+from mmap_index import MmapIndex, read_manifest
+from llm_scheduler import GenerationScheduler, SchedulerBusy, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from reranker import CrossEncoderReranker, similarity_relevance
+from prompt_templates import system_prompt, SUMMARY_SYSTEM_PROMPT
+from intent_router import IntentRouter
+from response_templates import ResponseTemplates, ResponseStats
+from asr_service import ASRService, ASRBusy, DEFAULT_ASR_PROFILE, profile_chain
+from streaming_asr import StreamingTranscriber, PartialTranscript
+from conversation_memory import ConversationMemory, SUMMARY_TOKENS
+from context_builder import pack_context, estimate_tokens, context_window, MAX_CONTEXT_TOKENS
 import requests
 from faster_whisper import WhisperModel
 import torch
@@ -12,17 +28,65 @@ import torch
 import pyttsx3  # OFFLINE TTS instead of gTTS
 import tempfile
 import io
-import re
+import time
+import hashlib
+import atexit
+from concurrent.futures import ThreadPoolExecutor
 
 warnings.filterwarnings('ignore')
 
+RETRIEVAL_CANDIDATES = 10  # Per retriever, before rank fusion
+NUM_PREDICT = 400  # Answer length cap, reserved out of the model's context window
+KEEP_ALIVE = os.environ.get('TUTOR_KEEP_ALIVE', '30m')  # Keep the model (and its KV cache) loaded between questions
+RERANK_BUDGET_MS = float(os.environ.get('TUTOR_RERANK_BUDGET_MS', 250))
+# Calibrated relevance of the best chunk needed to answer from the textbook
+RELEVANCE_THRESHOLD = float(os.environ.get('TUTOR_RELEVANCE_THRESHOLD', 0.5))
+# Unset: search Chroma directly. int8/float16/float32: search an in-memory copy
+# stored in that dtype, re-ranked with Chroma's float32 vectors
+VECTOR_DTYPE = os.environ.get('TUTOR_VECTOR_DTYPE')
+# auto: search the admin's exported read-only index when it matches the library,
+# else Chroma. chroma / mmap force one or the other.
+VECTOR_INDEX = os.environ.get('TUTOR_VECTOR_INDEX', 'auto')
+PREFETCH_WORKERS = 2  # Retrievals started from partial voice transcripts, shared by all sessions
+
+class PreparedResponse:
+    """Routing decision for one question: the LLM prompt (if any), fallback text and sources"""
+    def __init__(self, prompt=None, text=None, sources=None, route=''):
+        self.prompt = prompt
+        self.text = text
+        self.sources = sources or []
+        self.route = route
+        self.cache_key = None  # Set when the generated answer may be cached
+
 class AITextbookTutorMultilingualBackendOffline:
     def __init__(self, language='telugu'):
         print(f"🚀 Initializing Offline AI Tutor ({language})...")
         self.language = language
         self.textbooks = {}
         self.vectorstore = None
+        self.vector_index = None  # What retrieval searches: the store itself or a quantized copy
+        self.metadata_version = None
+        self.last_route = None
+        self.last_first_token_seconds = None
+        self.last_stream_failed = False  # Set when the last streamed answer ended in an error
+        self.last_prompt_had_history = False  # The last answer was generated with this chat's history
+        self.last_ticket = None
+        self.last_retrieval = {}
+        self.last_context = {}
+        self.ollama_context = None  # Token state after this chat's last answer, for Ollama to continue from
+        self.last_generation = {}
+        self.system_prompt = system_prompt(language)
+        self.memory = ConversationMemory(summarizer=self.summarize_conversation)
+        self.intent_router = registry.get('intent_router', IntentRouter)
+        self.last_intent = None
+        self.templates = registry.get('response_templates', ResponseTemplates)
+        self.response_stats = registry.get('response_stats', ResponseStats)
+        self.student_name = None  # Optional, used to personalize template replies
+        self.last_template_reply = None
+        self.prefetched = None  # (query, subjects, future) of retrieval started while transcribing
+        self.last_streaming_stats = {}
         self.setup_embeddings_offline()
+        self.setup_reranker()
         self.check_llama_offline()
         if self.language == 'telugu':
             self.setup_telugu_asr_offline()
@@ -30,13 +94,48 @@ class AITextbookTutorMultilingualBackendOffline:
             self.asr_available = False
         self.setup_offline_tts()
         self.load_existing_data()
+        self.answer_cache = registry.get('answer_cache', self.load_answer_cache)
+        # One queue in front of Ollama for every session in this process
+        self.scheduler = registry.get('llm_scheduler', GenerationScheduler)
+        if self.llm_available:
+            # Evaluate this language's system prompt once per process so the first student finds it cached
+            try:
+                registry.get(f'prompt_prefix_{language}', lambda: self.submit_generation(
+                    ".", PRIORITY_BACKGROUND, continue_chat=False, max_tokens=1), version=self.model_name)
+            except SchedulerBusy:
+                print("⚠️ Ollama queue full - skipping prompt warm-up")  # Not cached, so the next session retries
         print("✅ Offline AI Tutor Ready!")
     
     def setup_embeddings_offline(self):
-        """Setup embeddings with proper offline caching"""
+        """Setup embeddings (shared by every session in this process)"""
+        try:
+            self.embeddings = registry.get('embeddings', self.load_embeddings_offline)
+        except Exception:
+            # Keyword search still answers from the textbooks without the model
+            self.embeddings = None
+            print("⚠️ Embeddings unavailable - using keyword search only")
+    
+    def setup_reranker(self):
+        """Cross-encoder for re-ranking retrieved chunks (shared by every session)"""
+        self.reranker = registry.get('reranker', self.load_reranker)
+    
+    def load_reranker(self):
+        try:
+            reranker = CrossEncoderReranker(budget_ms=RERANK_BUDGET_MS)
+            print(f"✅ Re-ranker ready ({reranker.model_name})")
+            if not reranker.is_calibrated:
+                print("⚠️ Re-ranker scores are uncalibrated - run calibrate_reranker.py")
+            return reranker
+        except Exception as e:
+            # Cached as None so sessions don't retry; routing then uses vector similarity
+            print(f"⚠️ Re-ranker unavailable - using retrieval scores: {e}")
+            return None
+    
+    def load_embeddings_offline(self):
+        """Load the embedding model with proper offline caching"""
         try:
             print("📥 Ensuring embedding model is fully downloaded...")
-            os.makedirs("./models/embeddings", exist_ok=True)
+            os.makedirs(EMBEDDINGS_DIR, exist_ok=True)
             
             # Set environment variables for offline mode
             os.environ['HF_HUB_OFFLINE'] = '1'
@@ -45,12 +144,9 @@ class AITextbookTutorMultilingualBackendOffline:
             
             try:
                 # First try to load in offline mode
-                self.embeddings = HuggingFaceEmbeddings(
-                    model_name="sentence-transformers/all-MiniLM-L6-v2",
-                    model_kwargs={'device': 'cpu', 'local_files_only': True},
-                    cache_folder="./models/embeddings"
-                )
+                embeddings = EmbeddingService(local_files_only=True)
                 print("✅ Offline embeddings ready!")
+                return embeddings
                 
             except Exception as offline_error:
                 print(f"⚠️ Offline mode failed: {offline_error}")
@@ -62,22 +158,25 @@ class AITextbookTutorMultilingualBackendOffline:
                     del os.environ['TRANSFORMERS_OFFLINE']
                 
                 print("📥 Downloading embedding model for offline use...")
-                self.embeddings = HuggingFaceEmbeddings(
-                    model_name="sentence-transformers/all-MiniLM-L6-v2",
-                    model_kwargs={'device': 'cpu'},
-                    cache_folder="./models/embeddings"
-                )
+                embeddings = EmbeddingService(local_files_only=False)
                 
                 # Set offline mode back
                 os.environ['HF_HUB_OFFLINE'] = '1'
                 os.environ['TRANSFORMERS_OFFLINE'] = '1'
                 
                 print("✅ Embedding model downloaded and cached for offline use!")
+                return embeddings
                 
         except Exception as e:
             print(f"❌ Embeddings setup failed: {e}")
             raise e
         
+    def load_answer_cache(self):
+        """Semantic answer cache shared by all sessions, saved on exit"""
+        cache = AnswerCache()
+        atexit.register(cache.save)
+        return cache
+    
     def setup_telugu_asr_offline(self):
         """Setup Telugu speech recognition with detailed error reporting"""
         try:
@@ -97,56 +196,43 @@ class AITextbookTutorMultilingualBackendOffline:
             os.makedirs("./models/whisper", exist_ok=True)
             print("✅ Models directory created")
             
-            # Try standard models first for testing
-            print("🔄 Loading Whisper base model for testing...")
+            # The configured profile and its cheaper fallbacks (loaded once per process, shared by a worker pool)
+            print(f"🔄 Loading Whisper for ASR profile '{DEFAULT_ASR_PROFILE}'...")
             try:
-                self.whisper_model = WhisperModel(
-                    "base",  # Use standard Whisper base model first
-                    device="cpu",
-                    compute_type="int8",
-                    download_root="./models/whisper"
-                )
+                self.asr = registry.get('asr_service', lambda: ASRService(self.load_whisper_model, profile_chain(DEFAULT_ASR_PROFILE)))
+                self.whisper_model = self.asr.model
                 self.asr_available = True
                 self.asr_error = None
-                print("✅ Whisper base model loaded successfully!")
-                print("💡 Telugu language will be detected automatically")
+                print(f"✅ Whisper loaded! Profiles: {' → '.join(p.name for p in self.asr.profiles)}")
                 
-            except Exception as base_error:
-                print(f"❌ Even base model failed: {base_error}")
+            except Exception as model_error:
+                print(f"❌ Whisper model loading failed: {model_error}")
                 self.asr_available = False
-                self.asr_error = f"Model loading failed: {str(base_error)}"
+                self.asr_error = f"Model loading failed: {str(model_error)}"
                 
         except Exception as e:
             print(f"❌ ASR setup completely failed: {e}")
             self.asr_available = False
             self.asr_error = f"Setup failed: {str(e)}"
-            """Setup Telugu speech recognition - NO FFMPEG NEEDED"""
-            try:
-                print("🎤 Loading Telugu speech recognition (faster-whisper)...")
-                
-                os.makedirs("./models/whisper", exist_ok=True)
-                
-                # faster-whisper doesn't need FFmpeg
-                self.whisper_model = WhisperModel(
-                    "vasista22/whisper-telugu-base", 
-                    device="cpu",
-                    compute_type="int8",  # Optimized for your 8GB RAM
-                    download_root="./models/whisper"
-                )
-                self.asr_available = True
-                print("✅ Telugu Speech Recognition Ready (No FFmpeg needed)!")
-                
-            except ImportError:
-                print("❌ faster-whisper not installed. Run: pip install faster-whisper")
-                self.asr_available = False
-            except Exception as e:
-                print(f"❌ Telugu ASR setup failed: {e}")
+    
+    @staticmethod
+    def load_whisper_model(profile, **pool_options):
+        """faster-whisper model for an ASR profile - no FFmpeg needed"""
+        return WhisperModel(
+            profile.model,
+            device="cpu",
+            compute_type=profile.compute_type,
+            download_root="./models/whisper",
+            **pool_options
+        )
     
     def setup_offline_tts(self):
         """Setup OFFLINE Text-to-Speech using pyttsx3"""
         try:
             print("🔊 Setting up offline text-to-speech...")
-            self.tts_engine = pyttsx3.init()
+            # One engine per process; each session only remembers its voice
+            self.tts_engine = registry.get('tts', pyttsx3.init)
+            self.tts_voice_id = None
             
             # Configure TTS for Telugu/English
             voices = self.tts_engine.getProperty('voices')
@@ -154,18 +240,14 @@ class AITextbookTutorMultilingualBackendOffline:
                 # Try to find appropriate voice
                 for voice in voices:
                     if self.language == 'telugu' and ('telugu' in voice.name.lower() or 'te' in voice.id.lower()):
-                        self.tts_engine.setProperty('voice', voice.id)
+                        self.tts_voice_id = voice.id
                         break
                     elif self.language == 'english' and 'en' in voice.id.lower():
-                        self.tts_engine.setProperty('voice', voice.id)
+                        self.tts_voice_id = voice.id
                         break
                 else:
                     # Use first available voice
-                    self.tts_engine.setProperty('voice', voices[0].id)
-            
-            # Set speech properties
-            self.tts_engine.setProperty('rate', 150)  # Speech rate
-            self.tts_engine.setProperty('volume', 0.9)  # Volume
+                    self.tts_voice_id = voices[0].id
             
             self.tts_available = True
             print("✅ Offline Text-to-Speech Ready!")
@@ -174,45 +256,70 @@ class AITextbookTutorMultilingualBackendOffline:
             self.tts_available = False
 
     def transcribe_audio(self, audio_file):
-        """Telugu transcription with script validation"""
+        """Telugu transcription with script validation (decoded in memory, on the shared ASR pool)"""
         if not self.asr_available:
             return "❌ Telugu speech recognition not available"
         
         try:
             print("🎤 Transcribing with script validation...")
-            
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp_file:
-                tmp_file.write(audio_file.getvalue())
-                tmp_path = tmp_file.name
-            
-            # Transcribe with Telugu language forced
-            print("2hiiiiiii")
-            segments, info = self.whisper_model.transcribe(
-                tmp_path,
-                beam_size=5,
-                language="te",
-                task="transcribe",
-                temperature=0.0  # More deterministic
-            )
-            
-            transcribed_text = " ".join([segment.text for segment in segments])
-            print(transcribed_text)
-            print("3hiiiiiii")
-            # Validate if output contains Telugu script
-            has_telugu_script = any('\u0c00' <= char <= '\u0c7f' for char in transcribed_text)
-            
-            if  not has_telugu_script:
-                print("⚠️ Detected Arabic script instead of Telugu!")
-                return "❌ Model error: Outputting Arabic script instead of Telugu. Please try again or check audio quality."
-            
-            os.unlink(tmp_path)
-            print(f"✅ Transcribed: {transcribed_text[:50]}...")
-            return transcribed_text
-            
+            # Beam size and model come from the ASR profile, cheaper ones when the queue is long
+            result = self.asr.transcribe(audio_file.getvalue(), language="te")  # Telugu forced
+            self.last_transcription = result
+            print(f"🎧 {result.audio_seconds:.1f}s of audio in {result.processing_seconds:.1f}s with '{result.profile}' (RTF {result.rtf:.2f}, queued {result.queued_seconds:.1f}s)")
+            return self.validate_transcription(result.text)
+        
+        except ASRBusy as e:
+            print(f"⚠️ {e}")
+            return "❌ Too many students are speaking at once. Please try again in a few seconds."
         except Exception as e:
             print(f"❌ Transcription error: {e}")
             return f"❌ Transcription error: {str(e)}"
-
+    
+    def validate_transcription(self, transcribed_text: str) -> str:
+        """The text itself, or an error message when it isn't in Telugu script"""
+        has_telugu_script = any('\u0c00' <= char <= '\u0c7f' for char in transcribed_text)
+        
+        if not has_telugu_script:
+            print("⚠️ Detected Arabic script instead of Telugu!")
+            return "❌ Model error: Outputting Arabic script instead of Telugu. Please try again or check audio quality."
+        
+        print(f"✅ Transcribed: {transcribed_text[:50]}...")
+        return transcribed_text
+    
+    def transcribe_audio_stream(self, audio_file, selected_subjects: list = None):
+        """Segment-by-segment transcription - yields PartialTranscripts, the last one final
+        
+        Each pause in the recording closes a segment that is transcribed on
+        the ASR pool while the rest is still being split, and every time the
+        stable prefix grows textbook retrieval for it starts in the background,
+        so by the time the student sends the question its chunks are ready.
+        The final transcript's text is validated like transcribe_audio(); a
+        recording without speech gets its own message.
+        """
+        if not self.asr_available:
+            yield PartialTranscript("❌ Telugu speech recognition not available", 0, True)
+            return
+        
+        transcriber = StreamingTranscriber(self.asr, language="te")
+        try:
+            for partial in transcriber.transcribe_recording(audio_file.getvalue()):
+                if partial.text:
+                    self.prefetch_retrieval(partial.text, selected_subjects)
+                if partial.final and not partial.text:
+                    print("⚠️ No speech detected")
+                    partial.text = "❌ No speech detected. Please speak closer to the microphone and try again."
+                elif partial.final:
+                    partial.text = self.validate_transcription(partial.text)
+                yield partial
+        except ASRBusy as e:
+            print(f"⚠️ {e}")
+            yield PartialTranscript("❌ Too many students are speaking at once. Please try again in a few seconds.", 0, True)
+        except Exception as e:
+            print(f"❌ Transcription error: {e}")
+            yield PartialTranscript(f"❌ Transcription error: {str(e)}", 0, True)
+        finally:
+            self.last_streaming_stats = transcriber.get_stats()
+            print(f"🎧 Streaming ASR: {self.last_streaming_stats}")
         
     def speak_text(self, text: str):
         """OFFLINE text-to-speech generation"""
@@ -226,9 +333,14 @@ class AITextbookTutorMultilingualBackendOffline:
             with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as tmp_file:
                 temp_path = tmp_file.name
             
-            # Generate speech offline
-            self.tts_engine.save_to_file(text, temp_path)
-            self.tts_engine.runAndWait()
+            # Generate speech offline (the shared engine is not thread-safe)
+            with registry.lock_for('tts'):
+                if self.tts_voice_id:
+                    self.tts_engine.setProperty('voice', self.tts_voice_id)
+                self.tts_engine.setProperty('rate', 150)  # Speech rate
+                self.tts_engine.setProperty('volume', 0.9)  # Volume
+                self.tts_engine.save_to_file(text, temp_path)
+                self.tts_engine.runAndWait()
             
             # Read generated audio
             with open(temp_path, 'rb') as audio_file:
@@ -247,270 +359,560 @@ class AITextbookTutorMultilingualBackendOffline:
     def check_llama_offline(self):
         """Check local Ollama availability"""
         print("🤖 Checking local AI availability...")
+        self.model_name = ""
         try:
             # This is localhost communication, not internet
-            response = requests.get("http://localhost:11434/api/tags", timeout=3)
-            if response.status_code == 200:
-                models = response.json().get('models', [])
-                model_names = [model['name'] for model in models]
-                
-                if any('llama3.2' in name for name in model_names):
-                    self.llm_available = True
-                    self.model_name = "llama3.2"
-                    print("✅ Local AI ready: Llama 3.2")
-                elif models:
-                    self.llm_available = True
-                    self.model_name = model_names[0].split(':')[0]
-                    print(f"✅ Local AI ready: {self.model_name}")
-                else:
-                    self.llm_available = False
-                    print("⚠️ Ollama running but no models found")
+            self.model_name = get_client().detect_model()
+            self.llm_available = bool(self.model_name)
+            if self.model_name == "llama3.2":
+                print("✅ Local AI ready: Llama 3.2")
+            elif self.llm_available:
+                print(f"✅ Local AI ready: {self.model_name}")
             else:
-                self.llm_available = False
-                print("⚠️ Ollama not responding properly")
-        except:
+                print("⚠️ Ollama running but no models found")
+        except Exception:
             self.llm_available = False
-            print("⚠️ O  not running - will use basic textbook search")
+            print("⚠️ Ollama not running - will use basic textbook search")
     
     def load_existing_data(self):
         """Load existing textbook data offline"""
         print("📂 Loading textbook data...")
+        metadata_version = None
         if os.path.exists("textbook_metadata.json"):
+            metadata_version = os.path.getmtime("textbook_metadata.json")
             with open("textbook_metadata.json", 'r', encoding='utf-8') as f:
                 self.textbooks = json.load(f)
             print(f"📚 Loaded {len(self.textbooks)} textbooks offline")
+        self.metadata_version = metadata_version
+        self.lexical_index = registry.get('lexical_index', LexicalIndex)
+        self.lexical_index.refresh()
+        
+        self.vectorstore = None
+        self.vector_index = None
+        if self.embeddings is None:
+            return
+        
+        manifest = read_manifest() if VECTOR_INDEX != 'chroma' else None
+        # A stale export (library changed but not re-exported) would miss books
+        if manifest and (VECTOR_INDEX == 'mmap' or set(manifest['subjects']) == set(self.textbooks)):
+            try:
+                # Memory-mapped export: no Chroma runtime, pages shared with other processes
+                self.vector_index = registry.get('vector_index', MmapIndex, version=('mmap', manifest['created_at']))
+                stats = self.vector_index.get_stats()
+                print(f"✅ Read-only index mapped offline! ({stats['vectors']} vectors, {stats['dtype']}, {'IVF' if stats['ivf'] else 'flat'})")
+                return
+            except Exception as e:
+                print(f"⚠️ Could not open exported index: {e}")
         
-        if os.path.exists("./ai_tutor_db"):
+        if VECTOR_DTYPE and os.path.exists(VECTORSTORE_DIR):
             try:
-                self.vectorstore = Chroma(
-                    persist_directory="./ai_tutor_db",
-                    embedding_function=self.embeddings
-                )
-                print("✅ Vector database loaded offline!")
+                # Compressed copy on disk: Chroma is only opened to (re)build it
+                self.vector_index = registry.get('vector_index', lambda: self.load_quantized_index(
+                    metadata_version
+                ), version=('quantized', metadata_version))
+                stats = self.vector_index.get_stats()
+                print(f"🗜️ {stats['vectors']} vectors in memory as {stats['dtype']} ({stats['memory_mb']} MB, process RSS {stats['process_rss_mb']} MB)")
+                return
+            except Exception as e:
+                print(f"⚠️ Could not load quantized index: {e}")
+        
+        if os.path.exists(VECTORSTORE_DIR):
+            try:
+                # Shared handle, reopened when the admin panel changes the library or layout
+                self.vectorstore = registry.get('vectorstore', lambda: TextbookVectorStore(
+                    self.embeddings,
+                    subjects=self.textbooks
+                ), version=metadata_version)
+                print(f"✅ Vector database loaded offline! ({self.vectorstore.layout} layout)")
+                self.vector_index = self.vectorstore
             except Exception as e:
                 print(f"⚠️ Could not load vector database: {e}")
     
+    def load_quantized_index(self, metadata_version):
+        """Open the quantized export, rebuilding it from Chroma if the library changed since"""
+        index = QuantizedIndex.load(dtype=VECTOR_DTYPE, version=metadata_version)
+        if index is None:
+            print(f"🗜️ Exporting vectors as {VECTOR_DTYPE}...")
+            QuantizedIndex.export(TextbookVectorStore(self.embeddings, subjects=self.textbooks), VECTOR_DTYPE, version=metadata_version)
+            index = QuantizedIndex.load(dtype=VECTOR_DTYPE, version=metadata_version)
+        return index
+    
+    def refresh_library(self):
+        """Reload textbook metadata if the admin panel changed it since we loaded it"""
+        current = os.path.getmtime("textbook_metadata.json") if os.path.exists("textbook_metadata.json") else None
+        if current != self.metadata_version:
+            self.load_existing_data()
+        else:
+            self.lexical_index.refresh()
+    
+    def subject_revisions(self, selected_subjects: list = None):
+        """Ingest revision of each textbook in scope (answers cached against other revisions are stale)"""
+        subjects = selected_subjects or list(self.textbooks.keys())
+        return {subject: self.textbooks.get(subject, {}).get('updated_at') for subject in subjects}
+    
     def is_general_conversation(self, question: str) -> bool:
         """Check if question is general conversation (no textbook search needed)"""
-        general_patterns = [
-            # English greetings
-            r'\b(hi|hello|hey|good morning|good afternoon|good evening)\b',
-            r'\bhow are you\b',
-            r'\bwhat\'s up\b',
-            r'\bthanks?( you)?\b',
-            r'\bbye|goodbye\b',
-            
-            # Telugu greetings  
-            r'\b(namaste|namaskar)\b',
-            r'\bhello\b',
-            r'\bhi\b',
-            r'ఎలా ఉన్నారు',
-            r'నమస్కారం',
-            r'వందనాలు',
-            
-            # General conversational
-            r'^\s*ok\s*$',
-            r'^\s*yes\s*$',
-            r'^\s*no\s*$',
-            r'^\s*అవును\s*$',
-            r'^\s*కాదు\s*$'
-        ]
-        
-        question_lower = question.lower().strip()
-        return any(re.search(pattern, question_lower, re.IGNORECASE) for pattern in general_patterns)
+        return self.intent_router.route(question, self.embeddings).is_conversational
     
-    def chat_with_ai_directly(self, question: str) -> str:
-        """Direct AI chat without textbook search"""
+    def template_reply(self, intent):
+        """Canned reply for clear-cut small talk, or None when the LLM should answer"""
+        if intent.tier != 'lexical':
+            return None  # Only a likely match - let the model handle it
+        if intent.intent == 'acknowledgement' and len(self.memory):
+            return None  # "yes"/"no" may answer the tutor's last question
+        reply = self.templates.respond(self.language, intent.intent, self.student_name, avoid=self.last_template_reply)
+        if reply:
+            self.last_template_reply = reply
+        return reply
+    
+    def direct_chat_prompt(self, question: str):
+        """Prompt for direct AI chat without textbook search. Returns (prompt, fallback_text)"""
         if not self.llm_available:
             if self.language == 'telugu':
-                return "నమస్కారం! నేను మీ AI ఉపాధ్యాయుడిని. మీకు ఏదైనా ప్రశ్నలు ఉంటే అడగండి!"
+                return None, "నమస్కారం! నేను మీ AI ఉపాధ్యాయుడిని. మీకు ఏదైనా ప్రశ్నలు ఉంటే అడగండి!"
             else:
-                return "Hello! I'm your AI tutor. Ask me any questions about your studies!"
-        
-        if self.language == 'telugu':
-            prompt = f"""You are a friendly AI tutor having a conversation with a Telugu student.
-    The student said: "{question}"
-
-    Respond naturally in Telugu. Be warm, encouraging, and helpful. If it's a greeting, greet back and ask how you can help with their studies.
-
-    Respond in Telugu only."""
-        else:
-            prompt = f"""You are a friendly AI tutor having a conversation with a student.
-    The student said: "{question}"
-
-    Respond naturally in English. Be warm, encouraging, and helpful. If it's a greeting, greet back and ask how you can help with their studies.
-
-    Respond in English only."""
+                return None, "Hello! I'm your AI tutor. Ask me any questions about your studies!"
         
-        return self.call_llama(prompt, "")
+        # Instructions live in the shared system prompt - only the student's words vary
+        return question, None
 
-    def chat_with_textbook_context(self, question: str, context: str) -> str:
-        """AI response with textbook context - SMART GENERATION"""
+    def textbook_context_prompt(self, question: str, context: str):
+        """Prompt for an AI response with textbook context. Returns (prompt, fallback_text)"""
         if not self.llm_available:
             if self.language == 'telugu':
-                return f"పాఠ్యపుస్తక సమాచారం:\n\n{context}\n\nమరింత వివరాలు కావాలంటే దయచేసి నిర్దిష్ట ప్రశ్న అడగండి."
+                return None, f"పాఠ్యపుస్తక సమాచారం:\n\n{context}\n\nమరింత వివరాలు కావాలంటే దయచేసి నిర్దిష్ట ప్రశ్న అడగండి."
             else:
-                return f"From your textbook:\n\n{context}\n\nAsk a specific question if you need more details."
+                return None, f"From your textbook:\n\n{context}\n\nAsk a specific question if you need more details."
         
         if self.language == 'telugu':
-            prompt = f"""మీరు ఒక తెలివైన మరియు ప్రోత్సాహకరమైన తెలుగు ట్యూటర్. విద్యార్థికి ఒక అంశం గురించి లోతుగా అర్థం చేసుకోవడానికి సహాయం చేయడం మీ లక్ష్యం. దీని కోసం మీరు పాఠ్యపుస్తకం నుండి సేకరించిన సమాచారాన్ని ఉపయోగిస్తున్నారు.
-
-    విద్యార్థి ప్రశ్న: "{question}"
-
-    సంబంధిత పాఠ్యపుస్తక సమాచారం:
-    {context}
-
-    మీ పని:
-    1.  **ప్రత్యక్ష సమాధానం:** మొదట, విద్యార్థి ప్రశ్నకు స్పష్టమైన, ప్రత్యక్ష సమాధానం ఇవ్వండి. సమాధానం కోసం మీరు పైన ఇచ్చిన పాఠ్యపుస్తకంలోని సమాచారాన్ని ఉపయోగించండి.
-    2.  **వివరమైన వివరణ:** సంక్లిష్టమైన ఆలోచనలను సులభంగా అర్థమయ్యేలా, సాధారణ పదాలలో విడదీసి వివరించండి.
-    3.  **నిజ జీవిత ఉదాహరణలు:** విద్యార్థికి ఆ అంశం సులభంగా అర్థం కావడానికి, కనీసం ఒక నిజ జీవిత ఉదాహరణ లేదా పోలికను జోడించండి.
-    4.  **కీలక అంశాల సారాంశం:** ప్రధాన అంశాలను ఒక చిన్న జాబితాలో లేదా ఒక పేరాగ్రాఫ్‌లో సంక్షిప్తంగా చెప్పండి.
-    5.  **ఆలోచింపజేసే ప్రశ్న:** విద్యార్థి అవగాహనను పరీక్షించడానికి, లేదా వారు ఆ అంశాన్ని కొత్త కోణంలో ఆలోచించేలా ప్రోత్సహించడానికి ఒక ఆలోచింపజేసే ప్రశ్నతో ముగించండి.
-    6.  **శైలి:** మొత్తం సమాధానంలో స్నేహపూర్వక, ప్రోత్సాహకరమైన శైలిని కొనసాగించండి.
-
-    సమాధానం తెలుగులో మాత్రమే ఇవ్వండి. మొత్తం సమాధానం ఒకే, స్పష్టమైన మరియు చక్కని నిర్మాణం గల వ్యాసంగా ఉండాలి.
-    """
+            prompt = f'పాఠ్యపుస్తక సమాచారం:\n{context}\n\nవిద్యార్థి ప్రశ్న: "{question}"'
         else:
-            prompt = f"""You are an intelligent and encouraging tutor. Your goal is to help a student deeply understand a topic by using a provided textbook excerpt.
-
-    Student Question: "{question}"
-
-    Relevant Textbook Content:
-    {context}
-
-    Your task:
-    1.  **Direct Answer:** Start with a clear, direct answer to the student's question, drawing from the provided text.
-    2.  **Detailed Explanation:** Expand on the answer by explaining the core concepts in your own words. Break down complex ideas into simple, digestible parts.
-    3.  **Real-World Application:** Provide at least one clear, real-world example or analogy that helps the student connect the abstract concept to something familiar.
-    4.  **Key Takeaways:** Summarize the main points in a simple list or a concise paragraph to reinforce learning.
-    5.  **Critical Thinking Follow-Up:** End with a thought-provoking question that prompts the student to think about the topic in a new way or apply the concept. This should go beyond simple recall.
-    6.  **Tone:** Maintain a warm, encouraging, and easy-to-read tone throughout the response.
-
-    Respond ONLY in English. Make the entire response a single, coherent, and well-structured piece of text.
-    """
+            prompt = f'Relevant Textbook Content:\n{context}\n\nStudent Question: "{question}"'
         
-        return self.call_llama(prompt, "")
+        return prompt, None
 
-    def chat_with_general_knowledge(self, question: str) -> str:
-        """AI response using general knowledge when textbook doesn't have info"""
+    def general_knowledge_prompt(self, question: str):
+        """Prompt for a general-knowledge answer when the textbook lacks it. Returns (prompt, fallback_text)"""
         if not self.llm_available:
             if self.language == 'telugu':
-                return "ఈ విషయం మీ పాఠ్యపుస్తకంలో లేదు. దయచేసి మీ ఉపాధ్యాయుడిని అడగండి."
+                return None, "ఈ విషయం మీ పాఠ్యపుస్తకంలో లేదు. దయచేసి మీ ఉపాధ్యాయుడిని అడగండి."
             else:
-                return "This topic is not in your textbook. Please ask your teacher."
+                return None, "This topic is not in your textbook. Please ask your teacher."
         
         if self.language == 'telugu':
-            prompt = f"""A Telugu student asked: "{question}"
-
-    This question is not covered in their textbook. Use your general knowledge to provide a helpful educational response in Telugu.
-
-    Start with: "ఈ విషయం మీ పాఠ్యపుస్తకంలో లేదు, కానీ నేను వివరించగలను..."
-
-    Then, structure your response to be as helpful as possible:
-    1.  **స్పష్టమైన వివరణ:** ఆ అంశం గురించి స్పష్టమైన, కానీ సంక్షిప్తమైన వివరణ ఇవ్వండి.
-    2.  **సాధారణ ఉదాహరణలు:** ఒకటి లేదా రెండు సులభంగా అర్థమయ్యే ఉదాహరణలను ఉపయోగించి భావనను వివరించండి.
-    3.  **పాఠాలకు అనుసంధానం:** ఈ అంశం వారి సాధారణ అధ్యయనాలకు లేదా ప్రపంచానికి ఎలా సంబంధం కలిగి ఉంటుందో క్లుప్తంగా వివరించండి.
-    4.  **ఉపాధ్యాయుని సూచన:** మరింత లోతైన వివరణ కోసం వారి ఉపాధ్యాయుడితో చర్చించమని సున్నితంగా సూచించండి.
-    5.  **తదుపరి ప్రశ్న:** మీకు ఇంకా ఏమైనా ప్రశ్నలు ఉన్నాయా అని అడగండి.
-
-    సమాధానం తెలుగులో మాత్రమే ఇవ్వండి.
-    """
+            prompt = f'ఈ ప్రశ్న విద్యార్థి పాఠ్యపుస్తకంలో లేదు.\n\nవిద్యార్థి ప్రశ్న: "{question}"'
         else:
-            prompt = f"""A student asked: "{question}"
-
-    This question is not covered in their textbook. Use your general knowledge to provide a helpful educational response.
-
-    Start with: "This topic isn't in your textbook, but I can help explain..."
+            prompt = f'This question is not covered in the student\'s textbook.\n\nStudent Question: "{question}"'
+        
+        return prompt, None
+    
+    def chat_with_ai_directly(self, question: str) -> str:
+        """Direct AI chat without textbook search"""
+        prompt, fallback = self.direct_chat_prompt(question)
+        return self.call_llama(prompt, "") if prompt else fallback
 
-    Then, structure your response to be as helpful as possible:
-    1.  **Clear Explanation:** Provide a concise but comprehensive explanation of the topic.
-    2.  **Simple Examples:** Use 1-2 easy-to-understand examples to illustrate the concept.
-    3.  **Connection to Studies:** Briefly explain why this topic is relevant to their general studies or the world around them.
-    4.  **Teacher Recommendation:** Gently suggest they discuss this with their teacher for a deeper, more tailored explanation.
-    5.  **Follow-Up:** End by asking if they have any other questions.
+    def chat_with_textbook_context(self, question: str, context: str) -> str:
+        """AI response with textbook context - SMART GENERATION"""
+        prompt, fallback = self.textbook_context_prompt(question, context)
+        return self.call_llama(prompt, "") if prompt else fallback
 
-    Respond ONLY in English.
-    """
+    def chat_with_general_knowledge(self, question: str) -> str:
+        """AI response using general knowledge when textbook doesn't have info"""
+        prompt, fallback = self.general_knowledge_prompt(question)
+        return self.call_llama(prompt, "") if prompt else fallback
+    
+    def _generation_tokens(self, prompt: str, context=None, outcome=None, max_tokens=NUM_PREDICT, system=None):
+        """Raw token stream from local Ollama (runs on a scheduler slot)
         
-        return self.call_llama(prompt, "")
+        Without `context` the fixed system prompt goes first, so Ollama can
+        reuse its cached KV state for that prefix. With `context` (the state
+        returned after this chat's previous answer) Ollama continues from it
+        and only evaluates the new turn. Timings and the new context are
+        written to `outcome` when the answer is complete. `system` replaces
+        the tutor's system prompt for work that isn't a tutoring answer.
+        """
+        extra = {'keep_alive': KEEP_ALIVE}
+        if context:
+            extra['context'] = context
+        else:
+            extra['system'] = system or self.system_prompt
+        for data in get_client().generate_stream(
+            self.model_name,
+            prompt,
+            options={
+                "temperature": 0.7,  # More creative
+                "top_p": 0.9,
+                "num_predict": max_tokens,
+                "num_ctx": context_window(self.model_name)
+            },
+            timeout=60,
+            **extra
+        ):
+            token = data.get('response', '')
+            if token:
+                yield token
+            if data.get('done') and outcome is not None:
+                outcome.update({
+                    'context': data.get('context'),
+                    'prompt_eval_count': data.get('prompt_eval_count', 0),
+                    'prompt_eval_ms': round(data.get('prompt_eval_duration', 0) / 1e6, 1),
+                    'eval_count': data.get('eval_count', 0),
+                    'eval_ms': round(data.get('eval_duration', 0) / 1e6, 1),
+                    'load_ms': round(data.get('load_duration', 0) / 1e6, 1)
+                })
     
-    def call_llama(self, prompt: str, context: str = "") -> str:
-        """Make API call to local Ollama"""
+    def reusable_context(self, prompt: str):
+        """This chat's Ollama context if the next turn still fits in num_ctx, else None"""
+        if not self.ollama_context:
+            return None
+        needed = len(self.ollama_context) + estimate_tokens(prompt) + NUM_PREDICT
+        if needed > context_window(self.model_name):
+            print("♻️ Chat context full - starting again from the system prompt")
+            self.ollama_context = None
+            return None
+        return self.ollama_context
+    
+    def reset_conversation(self):
+        """Forget this chat's history and Ollama context (e.g. when the chat is cleared)"""
+        self.ollama_context = None
+        self.memory.clear()
+    
+    def conversation_history(self) -> str:
+        """Bounded history block (recent turns + summary) for prompts that start afresh"""
+        if self.language == 'telugu':
+            return self.memory.render(labels=("విద్యార్థి", "ట్యూటర్"), heading="ఇప్పటివరకు సంభాషణ")
+        return self.memory.render()
+    
+    def summarize_conversation(self, summary: str, turns: list):
+        """Background LLM summary of turns leaving the memory window - returns a ticket or None"""
+        if not self.llm_available:
+            return None
+        lines = [f"Student: {q}\nTutor: {a}" for q, a in turns]
+        prompt = (
+            f"Summarize this tutoring conversation in at most {SUMMARY_TOKENS // 2} words, keeping the topics "
+            f"and facts the student learned. Reply with the summary only.\n\n"
+            + (f"Earlier summary: {summary}\n\n" if summary else "")
+            + "\n".join(lines)
+        )
         try:
-            response = requests.post(
-                "http://localhost:11434/api/generate",
-                json={
-                    "model": self.model_name,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.7,  # More creative
-                        "top_p": 0.9,
-                        "num_predict": 400
-                    }
-                },
-                timeout=60
-            )
-            
-            if response.status_code == 200:
-                return response.json()['response']
-            else:
-                return f"❌ AI Error: {response.status_code}"
+            return self.submit_generation(prompt, PRIORITY_BACKGROUND, continue_chat=False, max_tokens=SUMMARY_TOKENS,
+                                          system=SUMMARY_SYSTEM_PROMPT)
+        except SchedulerBusy:
+            return None
+    
+    def remember_turn(self, question: str, response: str, route: str = None):
+        # Canned small-talk replies carry nothing worth remembering
+        if route != 'template' and response and not response.startswith("❌"):
+            self.memory.add_turn(question, response)
+    
+    def submit_generation(self, prompt: str, priority: int = PRIORITY_INTERACTIVE, continue_chat: bool = True,
+                          max_tokens: int = NUM_PREDICT, system: str = None):
+        """Queue a generation; identical prompts already in flight share one ticket
         
+        `continue_chat` turns continue from (and then advance) this chat's
+        Ollama context; other generations start from the system prompt and
+        leave the chat untouched.
+        """
+        context = self.reusable_context(prompt) if continue_chat else None
+        history = ""
+        if continue_chat and not context:
+            # Ollama doesn't hold this chat - bring the bounded history along instead
+            history = self.conversation_history()
+            if history:
+                prompt = f"{history}\n\n{prompt}"
+        outcome = {'reused_context': bool(context)}
+        fingerprint = hashlib.sha1(json.dumps(context).encode('utf-8')).hexdigest() if context else ""
+        key = hashlib.sha1(f"{self.model_name}\n{system or ''}\n{fingerprint}\n{max_tokens}\n{prompt}".encode('utf-8')).hexdigest()
+        ticket = self.scheduler.submit(key, lambda: self._generation_tokens(prompt, context, outcome, max_tokens, system),
+                                       priority, details=outcome)
+        if priority == PRIORITY_INTERACTIVE:
+            self.last_ticket = ticket
+            self.last_prompt_had_history = bool(context or history)
+        return ticket
+    
+    def record_generation(self, ticket, continue_chat: bool = True):
+        """Keep the finished answer's context for the next turn and note its prompt-eval cost"""
+        outcome = ticket.details
+        if 'prompt_eval_count' not in outcome:
+            return
+        if continue_chat and outcome.get('context'):
+            self.ollama_context = outcome['context']
+        self.last_generation = {k: v for k, v in outcome.items() if k != 'context'}
+        reused = " (continued chat context)" if outcome['reused_context'] else ""
+        print(f"🧮 Prompt eval: {outcome['prompt_eval_count']} tokens in {outcome['prompt_eval_ms']:.0f} ms{reused}")
+    
+    def busy_message(self, busy: SchedulerBusy) -> str:
+        if self.language == 'telugu':
+            return f"❌ AI ప్రస్తుతం చాలా బిజీగా ఉంది ({busy.queue_length} ప్రశ్నలు వేచి ఉన్నాయి). దయచేసి సుమారు {busy.estimated_wait:.0f} సెకన్ల తర్వాత మళ్లీ ప్రయత్నించండి."
+        return f"❌ The AI is very busy right now ({busy.queue_length} questions waiting). Please try again in about {busy.estimated_wait:.0f} seconds."
+    
+    def call_llama(self, prompt: str, context: str = "") -> str:
+        """Make API call to local Ollama (through the shared generation queue)"""
+        self.last_ticket = None
+        try:
+            ticket = self.submit_generation(prompt)
+            response = ticket.result()
+            self.record_generation(ticket)
+            return response
+        except SchedulerBusy as e:
+            return self.busy_message(e)
+        except requests.exceptions.HTTPError as e:
+            return f"❌ AI Error: {e.response.status_code}"
         except Exception as e:
             return f"❌ AI Error: {str(e)}"
     
-    def get_response(self, question: str, selected_subjects: list = None):
-        """SMART response routing - This fixes your main issue!"""
+    def stream_llama(self, prompt: str):
+        """Queue a generation and return an iterator over its tokens
+        
+        The request is queued before this returns, so `last_ticket` can
+        report the queue position while the caller waits for tokens.
+        """
+        self.last_first_token_seconds = None
+        self.last_ticket = None
+        self.last_stream_failed = False
+        try:
+            ticket = self.submit_generation(prompt)
+        except SchedulerBusy as e:
+            self.last_stream_failed = True
+            return iter([self.busy_message(e)])
+        return self._iter_ticket(ticket, time.perf_counter())
+    
+    def _iter_ticket(self, ticket, started):
+        try:
+            for token in ticket.iter_tokens():
+                if self.last_first_token_seconds is None:
+                    self.last_first_token_seconds = time.perf_counter() - started
+                    print(f"⚡ First token after {self.last_first_token_seconds:.2f}s")
+                yield token
+            self.record_generation(ticket)
+        
+        except requests.exceptions.HTTPError as e:
+            self.last_stream_failed = True
+            yield f"❌ AI Error: {e.response.status_code}"
+        except Exception as e:
+            self.last_stream_failed = True
+            yield f"❌ AI Error: {str(e)}"
+    
+    def retrieve_candidates(self, question: str, question_embedding=None, selected_subjects: list = None):
+        """Hybrid retrieval: vector and keyword rankings fused with reciprocal-rank fusion
+        
+        Returns [(document, relevance or None)] in fused order, where relevance
+        is the calibrated vector similarity. Either side may be missing (no
+        embedding model, no keyword index yet); the other one then ranks alone.
+        """
+        documents = {}
+        relevance = {}
+        rankings = []
+        
+        if question_embedding is not None and self.vector_index:
+            ranking = []
+            for doc, distance in self.vector_index.search(question_embedding, k=RETRIEVAL_CANDIDATES, subjects=selected_subjects):
+                key = doc.id  # Stored record id, the same key the keyword index uses
+                documents.setdefault(key, doc)
+                relevance.setdefault(key, similarity_relevance(distance))
+                ranking.append(key)
+            rankings.append(ranking)
+        
+        ranking = []
+        for hit in self.lexical_index.search(question, selected_subjects, k=RETRIEVAL_CANDIDATES):
+            documents.setdefault(hit['id'], Document(id=hit['id'], page_content=hit['text'], metadata=hit['metadata']))
+            ranking.append(hit['id'])
+        rankings.append(ranking)
+        
+        return [(documents[key], relevance.get(key)) for key, _ in reciprocal_rank_fusion(rankings)]
+    
+    def retrieve_documents(self, question: str, question_embedding=None, selected_subjects: list = None, k: int = 3):
+        """Top-k chunks as [(document, relevance or None)], best first
+        
+        Fused candidates are re-ranked by the cross-encoder within its latency
+        budget; relevance is then its calibrated score. Without a re-ranker
+        the fused order and vector similarities are kept.
+        """
+        candidates = self.retrieve_candidates(question, question_embedding, selected_subjects)
+        self.last_retrieval = {'candidates': len(candidates), 'reranked': 0, 'rerank_ms': 0.0}
+        if self.reranker is None or not candidates:
+            return candidates[:k]
+        
+        result = self.reranker.rerank(question, [doc for doc, _ in candidates])
+        self.last_retrieval = result.as_dict()
+        print(f"🎯 Re-ranked {result.scored}/{result.total} chunks in {result.elapsed_ms:.0f} ms")
+        return result.ranked[:k]
+    
+    def context_budget(self, question: str) -> int:
+        """Tokens left for textbook context once the instructions and the answer fit in num_ctx"""
+        template, _ = self.textbook_context_prompt(question, "")
+        fixed = estimate_tokens(self.system_prompt) + estimate_tokens(template or "") + estimate_tokens(self.conversation_history())
+        available = context_window(self.model_name) - NUM_PREDICT - fixed
+        return max(0, min(MAX_CONTEXT_TOKENS, available))
+    
+    def is_textbook_answer(self, relevant_docs) -> bool:
+        """Route to the textbook when the best chunk's calibrated relevance clears the threshold"""
+        if not relevant_docs:
+            return False
+        best_doc, relevance = relevant_docs[0]
+        self.last_retrieval['top_relevance'] = relevance
+        if relevance is None:
+            # Keyword-only hit with no score to calibrate - fall back to "has real content"
+            return len(best_doc.page_content.strip()) > 100
+        return relevance >= RELEVANCE_THRESHOLD
+    
+    def search_textbooks(self, query: str, selected_subjects: list = None):
+        """(query embedding or None, ranked documents) for a standalone query"""
+        question_embedding = self.embeddings.embed_query(query) if self.embeddings is not None else None
+        return question_embedding, self.retrieve_documents(query, question_embedding, selected_subjects)
+    
+    def prefetch_retrieval(self, text: str, selected_subjects: list = None):
+        """Start retrieving for a (partial) voice transcript before the student sends it"""
+        if not self.vector_index and not self.lexical_index.subjects:
+            return
+        query = self.memory.rewrite(text, self.embeddings.embed_query if self.embeddings is not None else None)
+        subjects = tuple(selected_subjects) if selected_subjects else None
+        if self.prefetched and self.prefetched[:2] == (query, subjects):
+            return
+        executor = registry.get('retrieval_prefetch', lambda: ThreadPoolExecutor(PREFETCH_WORKERS, thread_name_prefix='prefetch'))
+        self.prefetched = (query, subjects, executor.submit(self.search_textbooks, query, selected_subjects))
+    
+    def take_prefetched(self, query: str, selected_subjects: list = None):
+        """Result of a prefetch for exactly this query and subjects, or None"""
+        prefetched, self.prefetched = self.prefetched, None
+        subjects = tuple(selected_subjects) if selected_subjects else None
+        if prefetched is None or prefetched[:2] != (query, subjects):
+            return None
+        try:
+            return prefetched[2].result()
+        except Exception as e:
+            print(f"⚠️ Prefetched retrieval failed: {e}")
+            return None
+    
+    def prepare_response(self, question: str, selected_subjects: list = None):
+        """SMART response routing - returns a PreparedResponse
+        
+        `prompt` is None when no LLM call is needed; `text` is then the answer.
+        """
         print(f"🧠 Processing question: {question[:50]}...")
+        self.last_context = {}
         
+        # STEP 1: Small talk is answered without touching the textbooks
+        intent = self.intent_router.route(question, self.embeddings)
+        self.last_intent = intent
+        if intent.is_conversational:
+            print(f"💬 Detected {intent.intent} ({intent.tier} tier, {intent.timings}) - no textbook search")
+            reply = self.template_reply(intent)
+            if reply:
+                return PreparedResponse(text=reply, route='template')
+            prompt, fallback = self.direct_chat_prompt(question)
+            return PreparedResponse(prompt, fallback, route='conversation')
+        
+        self.refresh_library()
         no_textbook_msg = "పాఠ్యపుస్తకాలు లోడ్ చేయబడలేదు!" if self.language == 'telugu' else "No textbooks loaded!"
+        if not self.vector_index and not self.lexical_index.subjects:
+            return PreparedResponse(text=no_textbook_msg, route='no_textbooks')
         
-        if not self.vectorstore:
-            return no_textbook_msg, []
+        # Follow-ups ("why is it green?") are searched together with the previous topic
+        query = self.memory.standalone_query(question, self.embeddings.embed_query if self.embeddings is not None else None)
+        if query != question:
+            print(f"🔗 Follow-up searched as: {query[:80]}")
         
-        # STEP 1: Check if it's general conversation (no textbook search needed)
-        if self.is_general_conversation(question):
-            print("💬 Detected general conversation - no textbook search")
-            response = self.chat_with_ai_directly(question)
-            return response, []
+        # STEP 2: Answer from the semantic cache if a classmate asked the same thing
+        question_embedding, ranked_docs = None, None
+        revisions = self.subject_revisions(selected_subjects)
+        prefetched = self.take_prefetched(query, selected_subjects)
+        if prefetched is not None:
+            print("⚡ Using retrieval started while transcribing")
+            question_embedding, ranked_docs = prefetched
+        elif intent.embedding is not None and query == question:
+            question_embedding = intent.embedding  # Already embedded by the router
+        elif self.embeddings is not None:
+            question_embedding = self.embeddings.embed_query(query)
+        if question_embedding is not None:
+            cached = self.answer_cache.lookup(self.language, selected_subjects, question_embedding, revisions)
+            if cached:
+                print(f"⚡ Answer cache hit ({cached['similarity']:.2f} similar to: {cached['question'][:50]})")
+                return PreparedResponse(text=cached['response'], sources=cached['sources'], route='cache')
         
-        # STEP 2: Search textbook for subject-specific questions
-        print("🔍 Searching textbook for relevant content...")
-        filter_dict = None
-        if selected_subjects:
-            filter_dict = {"subject": {"$in": selected_subjects}}
+        # STEP 3: Search textbook for subject-specific questions
+        if ranked_docs is None:
+            print("🔍 Searching textbook for relevant content...")
+            ranked_docs = self.retrieve_documents(query, question_embedding, selected_subjects)
+        relevant_docs = [doc for doc, _ in ranked_docs]
         
-        try:
-            relevant_docs = self.vectorstore.similarity_search(
-                question, 
-                k=3,
-                filter=filter_dict
-            )
-        except:
-            relevant_docs = self.vectorstore.similarity_search(question, k=3)
-        
-        # STEP 3: Smart routing based on search results
-        if relevant_docs and len(relevant_docs[0].page_content.strip()) > 100:
+        # STEP 4: Smart routing based on how relevant the best chunk is
+        if self.is_textbook_answer(ranked_docs):
             # Found good textbook content - use AI to process it
             print("📚 Found textbook content - generating AI analysis...")
-            context = "\n\n".join([doc.page_content for doc in relevant_docs])
-            ai_response = self.chat_with_textbook_context(question, context)
+            packed = pack_context(relevant_docs, self.context_budget(question))
+            self.last_context = packed.as_dict()
+            print(f"✂️ Context: {packed.raw_tokens} → {packed.tokens} tokens ({packed.tokens_deduplicated} deduplicated, {packed.tokens_cut} cut for the budget)")
+            prompt, fallback = self.textbook_context_prompt(question, packed.text)
             
-            sources = []
             page_text = "పేజీ" if self.language == 'telugu' else "Page"
-            for doc in relevant_docs:
-                page_num = doc.metadata.get('page', 'Unknown')
-                subject = doc.metadata.get('subject', 'Unknown')
-                sources.append(f"{subject} - {page_text} {page_num}")
+            sources = packed.sources(page_text)
             
-            return ai_response, sources
+            prepared = PreparedResponse(prompt, fallback, sources, route='textbook')
         
         else:
             # No relevant textbook content - use AI general knowledge
             print("🧠 No textbook content found - using AI general knowledge...")
-            ai_response = self.chat_with_general_knowledge(question)
-            return ai_response, []
+            prompt, fallback = self.general_knowledge_prompt(question)
+            prepared = PreparedResponse(prompt, fallback, route='general_knowledge')
+        
+        if question_embedding is not None:
+            prepared.cache_key = (query, selected_subjects, question_embedding, revisions)
+        return prepared
+    
+    def remember_answer(self, prepared, response: str):
+        """Store a freshly generated answer in the semantic cache"""
+        if prepared.cache_key is None or not response or response.startswith("❌"):
+            return
+        if self.last_prompt_had_history:
+            return  # Written for this chat's history - classmates asking the same thing don't share it
+        question, selected_subjects, question_embedding, revisions = prepared.cache_key
+        self.answer_cache.store(
+            self.language, selected_subjects, question, question_embedding,
+            response, prepared.sources, revisions
+        )
+    
+    def get_response(self, question: str, selected_subjects: list = None):
+        """Full answer in one piece - returns (response, sources)"""
+        prepared = self.prepare_response(question, selected_subjects)
+        self.last_route = prepared.route
+        self.response_stats.record(prepared)
+        if prepared.prompt is None:
+            self.remember_turn(question, prepared.text, prepared.route)
+            return prepared.text, prepared.sources
+        response = self.call_llama(prepared.prompt, "")
+        self.remember_answer(prepared, response)
+        self.remember_turn(question, response)
+        return response, prepared.sources
+    
+    def get_response_stream(self, question: str, selected_subjects: list = None):
+        """Streaming answer - returns (token_generator, sources)
+        
+        Retrieval happens before this returns, so sources are known up front
+        and the UI can render tokens as soon as Ollama produces them.
+        """
+        self.last_first_token_seconds = None
+        self.last_ticket = None
+        prepared = self.prepare_response(question, selected_subjects)
+        self.last_route = prepared.route
+        self.response_stats.record(prepared)
+        if prepared.prompt is None:
+            self.remember_turn(question, prepared.text, prepared.route)
+            return iter([prepared.text]), prepared.sources
+        # Queue now so the caller can show the queue position while waiting
+        tokens = self.stream_llama(prepared.prompt)
+        return self._stream_and_remember(question, prepared, tokens), prepared.sources
+    
+    def _stream_and_remember(self, question, prepared, tokens):
+        parts = []
+        for token in tokens:
+            parts.append(token)
+            yield token
+        if self.last_stream_failed:
+            return  # A half-written answer ending in an error is neither cached nor remembered
+        response = "".join(parts)
+        self.remember_answer(prepared, response)
+        self.remember_turn(question, response)
 
 # For backward compatibility with your existing UI files
 AITextbookTutorMultilingualBackend = AITextbookTutorMultilingualBackendOffline
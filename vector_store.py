@@ -0,0 +1,278 @@
+import os
+import json
+import heapq
+import hashlib
+import threading
+import chromadb
+from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
+
+VECTORSTORE_DIR = "./ai_tutor_db"
+LAYOUT_FILE = "layout.json"
+
+LAYOUT_GLOBAL = 'global'            # One collection, filtered by subject metadata
+LAYOUT_PARTITIONED = 'partitioned'  # One collection per textbook
+LAYOUTS = (LAYOUT_GLOBAL, LAYOUT_PARTITIONED)
+
+# Layout for a brand-new database; existing ones keep what layout.json says
+DEFAULT_LAYOUT = os.environ.get('TUTOR_VECTOR_LAYOUT', LAYOUT_GLOBAL)
+
+PARTITION_PREFIX = "subject_"
+COPY_BATCH_SIZE = 5000
+COMPACT_SUFFIX = "_compact"  # Collection a compaction copies into before the swap
+
+
+def read_layout(directory=VECTORSTORE_DIR):
+    path = os.path.join(directory, LAYOUT_FILE)
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('layout', LAYOUT_GLOBAL)
+    # A database without layout.json predates partitions, so it's global
+    if os.path.exists(os.path.join(directory, "chroma.sqlite3")):
+        return LAYOUT_GLOBAL
+    return DEFAULT_LAYOUT
+
+
+def write_layout(layout, directory=VECTORSTORE_DIR):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, LAYOUT_FILE), 'w', encoding='utf-8') as f:
+        json.dump({'layout': layout}, f)
+
+
+def partition_name(subject):
+    """Chroma collection name for a textbook (names are restricted to [a-zA-Z0-9._-])"""
+    return PARTITION_PREFIX + hashlib.sha1(subject.encode('utf-8')).hexdigest()[:16]
+
+
+def read_records(collection):
+    """Yield pages of full records (embeddings included) from a Chroma collection"""
+    total = collection.count()
+    for offset in range(0, total, COPY_BATCH_SIZE):
+        yield collection.get(include=["embeddings", "metadatas", "documents"], limit=COPY_BATCH_SIZE, offset=offset)
+
+
+class TextbookVectorStore:
+    """Textbook vectors in Chroma, in either storage layout
+
+    'global' keeps every textbook in one collection and narrows searches
+    with a subject filter. 'partitioned' gives every textbook its own
+    collection, so a search only touches the selected books and latency
+    stays flat as the library grows; hits from several partitions are
+    merged by distance. The layout is recorded in layout.json so the admin
+    and student apps always agree on it.
+    """
+    def __init__(self, embeddings, directory=VECTORSTORE_DIR, layout=None, subjects=()):
+        self.embeddings = embeddings
+        self.directory = directory
+        self.layout = layout or read_layout(directory)
+        self.subjects = list(subjects)  # Searched when no subjects are selected
+        self._stores = {}
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def partitioned(self):
+        return self.layout == LAYOUT_PARTITIONED
+
+    def client(self):
+        """The Chroma client every store of this database shares"""
+        with self._lock:
+            if self._client is None:
+                self._client = chromadb.PersistentClient(path=self.directory)
+            return self._client
+
+    def _open(self, collection_name=None, subject=None):
+        key = collection_name or '__global__'
+        client = self.client()
+        with self._lock:
+            if key not in self._stores:
+                kwargs = {'client': client, 'embedding_function': self.embeddings}
+                if collection_name:
+                    kwargs['collection_name'] = collection_name
+                    kwargs['collection_metadata'] = {'subject': subject}
+                self._stores[key] = Chroma(**kwargs)
+            return self._stores[key]
+
+    def store_for(self, subject):
+        """Chroma store that holds (or will hold) a textbook's vectors"""
+        if self.partitioned:
+            return self._open(partition_name(subject), subject)
+        return self._open()
+
+    def subject_records(self, subject, include=("metadatas",)):
+        """Stored ids (plus `include` fields) for one textbook"""
+        return self.store_for(subject)._collection.get(where={"subject": subject}, include=list(include))
+
+    
+    def count_subject(self, subject):
+        return len(self.subject_records(subject, include=())['ids'])
+
+    def delete_subject(self, subject):
+        """Drop a textbook's vectors - returns how many were removed"""
+        removed = self.count_subject(subject)
+        if self.partitioned:
+            self.store_for(subject).delete_collection()
+            with self._lock:
+                self._stores.pop(partition_name(subject), None)
+        elif removed:
+            self.store_for(subject)._collection.delete(where={"subject": subject})
+        return removed
+
+    def collections(self):
+        """Every Chroma store of this layout that exists on disk"""
+        if not self.partitioned:
+            return [self._open()]
+        client = self.client()
+        return [self._open(name, (client.get_collection(name).metadata or {}).get('subject'))
+                for name in sorted(self.partition_names())]
+
+    def partition_names(self):
+        """Names of the textbook partitions that exist on disk"""
+        names = (getattr(c, 'name', c) for c in self.client().list_collections())  # Older chromadb returns objects
+        return {name for name in names if name.startswith(PARTITION_PREFIX) and not name.endswith(COMPACT_SUFFIX)}
+
+    def count(self):
+        return sum(store._collection.count() for store in self.collections())
+
+    @staticmethod
+    def _query(store, embedding, k, where=None):
+        """[(document, distance)] from one collection, with each document's id set to its record id"""
+        results = store._collection.query(query_embeddings=[list(embedding)], n_results=k, where=where,
+                                          include=["documents", "metadatas", "distances"])
+        return [
+            (Document(id=record_id, page_content=text, metadata=metadata or {}), distance)
+            for record_id, text, metadata, distance in zip(
+                results['ids'][0], results['documents'][0], results['metadatas'][0], results['distances'][0])
+        ]
+
+    def search(self, embedding, k=3, subjects=None):
+        """Nearest chunks as [(document, distance)], best first"""
+        if not self.partitioned:
+            store = self._open()
+            filter_dict = {"subject": {"$in": list(subjects)}} if subjects else None
+            try:
+                return self._query(store, embedding, k, filter_dict)
+            except Exception as e:
+                # Never widen to unselected books - no vector hits beats wrong ones
+                print(f"⚠️ Filtered search failed: {e}")
+                return []
+
+        hits = []
+        existing = None
+        for subject in subjects or self.subjects:
+            name = partition_name(subject)
+            with self._lock:
+                store = self._stores.get(name)
+            if store is None:
+                # Only open partitions that exist - opening creates them, even on read-only nodes
+                existing = self.partition_names() if existing is None else existing
+                if name not in existing:
+                    print(f"⚠️ No vectors stored for {subject}")
+                    continue
+                store = self._open(name, subject)
+            try:
+                hits.extend(self._query(store, embedding, k))
+            except Exception as e:
+                print(f"⚠️ Search in {subject} failed: {e}")
+        return heapq.nsmallest(k, hits, key=lambda hit: hit[1])
+
+    def _recover_compaction(self, client):
+        """Finish or discard the copies of a compaction that was interrupted"""
+        names = {getattr(c, 'name', c) for c in client.list_collections()}
+        for name in names:
+            if not name.endswith(COMPACT_SUFFIX):
+                continue
+            original = name[:-len(COMPACT_SUFFIX)]
+            if original in names:
+                client.delete_collection(name)  # Copy never finished - the original is intact
+            else:
+                client.get_collection(name).modify(name=original)  # Copy finished, swap didn't
+                print(f"♻️ Restored {original} from an interrupted compaction")
+
+    def compact(self, live_subjects):
+        """Rebuild every collection with only the vectors of `live_subjects` - returns (removed, kept)
+
+        Kept records are streamed page by page into a new collection, and
+        the old one is only dropped once the copy's count checks out, so a
+        crash part-way leaves the library as it was.
+        """
+        live_subjects = set(live_subjects)
+        removed = kept = 0
+        client = self.client()
+        self._recover_compaction(client)
+        for store in self.collections():
+            collection = store._collection
+            name, metadata = collection.name, collection.metadata
+            copy = client.create_collection(name + COMPACT_SUFFIX, metadata=metadata)
+            collection_kept = 0
+            for page in read_records(collection):
+                rows = [i for i, m in enumerate(page['metadatas']) if m.get('subject') in live_subjects]
+                removed += len(page['ids']) - len(rows)
+                if rows:
+                    copy.add(
+                        ids=[page['ids'][i] for i in rows],
+                        embeddings=[page['embeddings'][i] for i in rows],
+                        metadatas=[page['metadatas'][i] for i in rows],
+                        documents=[page['documents'][i] for i in rows]
+                    )
+                    collection_kept += len(rows)
+            if copy.count() != collection_kept:
+                client.delete_collection(copy.name)
+                raise RuntimeError(f"Compacted copy of {name} has {copy.count()} vectors, expected {collection_kept}")
+            kept += collection_kept
+
+            store.delete_collection()
+            with self._lock:
+                self._stores = {key: s for key, s in self._stores.items() if s is not store}
+            if not collection_kept and self.partitioned:
+                client.delete_collection(copy.name)  # Partition of a removed textbook
+                continue
+            copy.modify(name=name)
+        return removed, kept
+
+    def delete_all(self):
+        """Delete every collection - returns how many vectors were removed"""
+        removed = 0
+        for store in self.collections():
+            removed += store._collection.count()
+            store.delete_collection()
+        with self._lock:
+            self._stores = {}
+        return removed
+
+    def migrate(self, layout):
+        """Move every vector into `layout` and return the new store
+
+        Vectors are copied as they are (no re-embedding), then the old
+        collections are dropped and layout.json is updated.
+        """
+        if layout == self.layout:
+            return self
+        target = TextbookVectorStore(self.embeddings, self.directory, layout, self.subjects)
+        moved = 0
+        sources = self.collections()
+        for store in sources:
+            for page in read_records(store._collection):
+                by_subject = {}
+                for i, metadata in enumerate(page['metadatas']):
+                    by_subject.setdefault(metadata.get('subject'), []).append(i)
+                for subject, rows in by_subject.items():
+                    target.store_for(subject)._collection.upsert(
+                        ids=[page['ids'][i] for i in rows],
+                        embeddings=[page['embeddings'][i] for i in rows],
+                        metadatas=[page['metadatas'][i] for i in rows],
+                        documents=[page['documents'][i] for i in rows]
+                    )
+                    moved += len(rows)
+        for store in sources:
+            store.delete_collection()
+        write_layout(layout, self.directory)
+        print(f"🔀 Moved {moved} vectors to the {layout} layout")
+        return target
+
+    def get_stats(self):
+        return {
+            'layout': self.layout,
+            'collections': len(self.collections()),
+            'vectors': self.count()
+        }